@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# سرعة دمج سجلات البروتوكولات المختلفة في أجهزة، ودقته: كل طابعة فعلية يجب أن تصبح جهازاً واحداً
+# Usage: python benchmarks/bench_device_merge.py [--devices 20000] [--seed 1]
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from printer_inventory import merge_devices
+
+MODELS = ["HP LaserJet Pro M404dn", "Brother HL-L2340D", "Canon PIXMA iP2700", "Kyocera ECOSYS P2135dn", "Epson WF-2830 Series",
+          "Xerox Phaser 3020", "Lexmark MS310dn", "Ricoh SP 3600DN"]
+
+def make_records(n, rng):
+    # كل طابعة تظهر في بعض البروتوكولات فقط، وبعض السجلات بلا MAC أو رقم تسلسلي كما في الواقع
+    records, truth = [], []
+    for i in range(n):
+        ip = f"10.{i // 65536}.{i // 256 % 256}.{i % 256}"
+        model = rng.choice(MODELS)
+        serial = f"SN{i:08d}"
+        mac = f"00:11:{i >> 24 & 255:02x}:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}"
+        sources = []
+        if rng.random() < 0.9:
+            sources.append({"type": "network", "driver_id": ip, "printer_name": f"Network Printer ({ip})", "driver_name": "Generic",
+                            "download_url": "", "mac": mac})
+        if rng.random() < 0.6:
+            sources.append({"type": "snmp", "driver_id": ip, "printer_name": model, "model": model, "driver_name": "Generic",
+                            "download_url": "", "serial": serial})
+        if rng.random() < 0.5:
+            sources.append({"type": "mdns", "driver_id": ip, "printer_name": model, "model": model, "driver_name": "Generic",
+                            "download_url": "", "services": ["ipp"]})
+        if rng.random() < 0.02:
+            sources.append({"type": "usb", "driver_id": f"03f0:{i % 65536:04x}", "printer_name": model, "driver_name": "Generic",
+                            "download_url": "", "serial": serial})
+        if not sources:
+            sources.append({"type": "network", "driver_id": ip, "printer_name": f"Network Printer ({ip})", "driver_name": "Generic",
+                            "download_url": ""})
+        records += sources
+        truth += [i] * len(sources)
+    order = list(range(len(records)))
+    rng.shuffle(order)
+    return [records[k] for k in order], [truth[k] for k in order]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    for n in (args.devices // 4, args.devices // 2, args.devices):
+        records, truth = make_records(n, rng)
+        t0 = time.perf_counter()
+        devices = merge_devices(records)
+        elapsed = time.perf_counter() - t0
+        print(f"devices={n:6d} records={len(records):6d} merged={len(devices):6d}  {elapsed * 1000:8.1f} ms  "
+              f"({elapsed / len(records) * 1e6:.1f} us/record)")
+        # كل جهاز مدمج يجب أن يضم سجلات طابعة واحدة فقط؛ الزيادة عن عدد الطابعات سجلات USB لا يشاركها أي بروتوكول آخر رقمها التسلسلي
+        owner = {(p["type"], p["driver_id"]): t for p, t in zip(records, truth)}
+        mixed = sum(1 for d in devices if len({owner[(s["type"], s["driver_id"])] for s in d["sources"]}) > 1)
+        print(f"  physical printers={n} mixed devices={mixed}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# سرعة تصدير مخزن الأجهزة واستيراده بكل صيغة، وذروة الذاكرة أثناء التصدير (يجب ألا تكبر مع حجم المخزن)
+# Usage: python benchmarks/bench_export.py [--devices 20000] [--seed 1]
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_device_merge import make_records
+from printer_discovery import DeviceCache, device_key
+from printer_inventory import ChangeTracker
+from printer_export import EXPORT_FORMATS, export_cache, import_inventory
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    records, _ = make_records(args.devices, random.Random(args.seed))
+    unique = {device_key(p): p for p in records}
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DeviceCache(os.path.join(directory, "cache.db"))
+        cache.put_many(list(unique.values()))
+        for fmt in EXPORT_FORMATS:
+            path = os.path.join(directory, "inventory." + fmt)
+            try:
+                t0 = time.perf_counter()
+                count = export_cache(cache, path)
+            except ImportError as e:
+                print(f"{fmt:8s} skipped: {e}")
+                continue
+            exported = time.perf_counter() - t0
+            # الذاكرة في تمرير ثان حتى لا يبطئ tracemalloc القياس الأول
+            tracemalloc.start()
+            export_cache(cache, path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            target = DeviceCache(os.path.join(directory, fmt + "-cache.db"))
+            tracker = ChangeTracker(os.path.join(directory, fmt + "-snapshot.db"))
+            t0 = time.perf_counter()
+            imported = import_inventory(path, target, tracker)
+            elapsed = time.perf_counter() - t0
+            same = {device_key(p): p for p in target.load()} == unique
+            print(f"{fmt:8s} records={count:6d} size={os.path.getsize(path) / 1e6:6.1f} MB  export {exported * 1000:7.1f} ms "
+                  f"(peak {peak / 1e6:4.1f} MB)  import {elapsed * 1000:7.1f} ms ({imported / elapsed:7.0f}/s)  "
+                  f"round trip {'ok' if same else 'MISMATCH'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# كلفة المراقبة مقارنة بإعادة الفحص الكامل في كل دورة، على شبكة الطابعات الوهمية في bench_scanners
+# يقاس لكل دورة: صفوف SQLite المكتوبة (المخزن واللقطة والسجل)، وصفوف الجدول التي أبلغ عنها، ووقت المعالج
+# Usage: python benchmarks/bench_monitor.py [--hosts 254] [--printers 40] [--cycles 3] [--prefix 26]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_scanners import FakePrinters, PREFIX
+from printer_discovery import TargetSet, DeviceCache, HistoryStore, ScanScheduler, ScanMonitor, run_scan, merge_devices
+from printer_inventory import ChangeTracker
+
+def stores(directory, name):
+    return (DeviceCache(os.path.join(directory, name + "-cache.db")), ChangeTracker(os.path.join(directory, name + "-snapshot.db")),
+            HistoryStore(os.path.join(directory, name + "-history.db"), legacy=None))
+
+def writes(*stores):
+    return sum(store.db.total_changes for store in stores)
+
+def report(label, cycle, written, touched, cpu):
+    print(f"{label:8s} cycle {cycle}: db rows written={written:5d}  table rows touched={touched:4d}  cpu={cpu * 1000:7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hosts", type=int, default=254)
+    parser.add_argument("--printers", type=int, default=40)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--prefix", type=int, default=26)
+    args = parser.parse_args()
+    FakePrinters(args.hosts, args.printers, 1161).start()
+    targets = TargetSet(f"{PREFIX}.1-{PREFIX}.{args.hosts}")
+    protocols = ["network"]
+    scheduler = ScanScheduler()
+    with tempfile.TemporaryDirectory() as directory:
+        # إعادة الفحص الكامل: كل دورة تكتب كل جهاز في المخزن والسجل وتعيد بناء الجدول كله
+        cache, tracker, history = stores(directory, "full")
+        for cycle in range(args.cycles):
+            before, cpu = writes(cache, tracker, history), time.process_time()
+            started = time.time()
+            printers = run_scan(protocols, targets, cache, True, scheduler=scheduler, tracker=tracker)
+            history.record_session(printers, started, protocols=protocols, targets=targets)
+            rows = len(merge_devices(printers))
+            report("full", cycle, writes(cache, tracker, history) - before, rows, time.process_time() - cpu)
+        # المراقبة: نفس الأهداف على أجزاء، والدورة الأولى وحدها تكتب كل شيء
+        cache, tracker, history = stores(directory, "monitor")
+        monitor = ScanMonitor(protocols, targets, 0, cache, tracker, history, scheduler, prefix=args.prefix)
+        for cycle in range(args.cycles):
+            before, cpu = writes(cache, tracker, history), time.process_time()
+            rows = 0
+            for index in range(len(monitor.parts)):
+                sweep = monitor.sweep(index)
+                rows += len(sweep["updated"]) + len(sweep["removed"])
+            report("monitor", cycle, writes(cache, tracker, history) - before, rows, time.process_time() - cpu)
+        print(f"monitor: {len(monitor.parts)} parts per cycle, {monitor.stats()['devices']} devices")
+    scheduler.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# مقارنة سرعة فحص الشبكة: الفحص التسلسلي القديم، الفحص المتوازي بمهلة ثابتة، والمتوازي بمهلة من RTT المقاس
+# Usage: python benchmarks/bench_network_scan.py [--hosts 254] [--live 10] [--timeout 0.12]
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from printer_discovery import tcp_sweep, RTTEstimator, TCP_RTO_INITIAL, TCP_RTO_MIN, TCP_RTO_MAX
+
+PREFIX = "127.0.0"
+PORT = 9100
+
+class FakeNetwork:
+    # طابعات وهمية على عناوين loopback (لينكس يقبل كامل 127.0.0.0/8)
+    # العناوين "الميتة" مستمعون بقائمة انتظار ممتلئة فيتجاهل النظام طلبات SYN وتنتهي المهلة كما في الشبكة الحقيقية
+    def __init__(self, hosts, live):
+        self.ips = [f"{PREFIX}.{i}" for i in range(1, hosts + 1)]
+        step = max(1, hosts // max(1, live))
+        self.live = set(self.ips[::step][:live])
+        self.sockets = []
+
+    def start(self):
+        for ip in self.ips:
+            srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            srv.bind((ip, PORT))
+            if ip in self.live:
+                srv.listen(64)
+            else:
+                srv.listen(0)
+                for _ in range(3):
+                    filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    filler.setblocking(False)
+                    filler.connect_ex((ip, PORT))
+                    self.sockets.append(filler)
+            self.sockets.append(srv)
+        time.sleep(0.2)
+        return self
+
+    def stop(self):
+        for sock in self.sockets:
+            sock.close()
+
+def serial_sweep(ips, timeout):
+    found = []
+    for ip in ips:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        if sock.connect_ex((ip, PORT)) == 0:
+            found.append(ip)
+        sock.close()
+    return found
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hosts", type=int, default=254)
+    parser.add_argument("--live", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=0.12)
+    parser.add_argument("--concurrency", type=int, default=256)
+    args = parser.parse_args()
+    net = FakeNetwork(args.hosts, args.live).start()
+    try:
+        t0 = time.perf_counter()
+        serial = serial_sweep(net.ips, args.timeout)
+        t_serial = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        concurrent = asyncio.run(tcp_sweep(net.ips, PORT, args.timeout, args.concurrency))
+        t_async = time.perf_counter() - t0
+        rtt = RTTEstimator(TCP_RTO_INITIAL, TCP_RTO_MIN, TCP_RTO_MAX)
+        t0 = time.perf_counter()
+        adaptive = asyncio.run(tcp_sweep(net.ips, PORT, concurrency=args.concurrency, rtt=rtt))
+        t_adaptive = time.perf_counter() - t0
+    finally:
+        net.stop()
+    print(f"hosts={args.hosts} live={len(net.live)} timeout={args.timeout}s")
+    print(f"serial:     {t_serial:7.3f}s  found={len(serial)}")
+    print(f"concurrent: {t_async:7.3f}s  found={len(concurrent)}")
+    print(f"adaptive:   {t_adaptive:7.3f}s  found={len(adaptive)}")
+    print(f"speedup:    {t_serial / t_async:7.1f}x fixed, {t_serial / t_adaptive:7.1f}x adaptive")
+    for s in rtt.stats():
+        print(f"  {s['subnet']}: srtt {s['srtt_ms']} ms  rttvar {s['rttvar_ms']} ms  rto {s['rto_ms']} ms  retries {s['retries']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# الفحص الموزع على عدة وكلاء في نفس الجهاز مقارنة بفحص محلي واحد، على شبكة الطابعات الوهمية في bench_scanners
+# كل وكيل وشبكة الطابعات في عملية مستقلة حتى لا تتقاسم قفل GIL مع المنسق
+# Usage: python benchmarks/bench_remote_scan.py [--agents 3] [--hosts 254] [--printers 40] [--protocols network,snmp] [--kill 1]
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import threading
+import argparse
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_scanners import FakePrinters, PREFIX, use_snmp_port
+from printer_discovery import TargetSet, run_scan
+from printer_remote import ScanAgent, Coordinator
+
+BASE_PORT = 9760
+
+def printers_process(hosts, printers, snmp_port, ready):
+    FakePrinters(hosts, printers, snmp_port).start()
+    ready.set()
+    signal.pause()
+
+def agent_process(name, port, snmp_port, ready):
+    use_snmp_port(snmp_port)
+    async def main():
+        await ScanAgent(name).serve("127.0.0.1", port)
+        ready.set()
+        await asyncio.Event().wait()
+    asyncio.run(main())
+
+def start(target, *args):
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=target, args=args + (ready,), daemon=True)
+    process.start()
+    ready.wait(10)
+    return process
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, default=3)
+    parser.add_argument("--hosts", type=int, default=254)
+    parser.add_argument("--printers", type=int, default=40)
+    parser.add_argument("--snmp-port", type=int, default=1161)
+    parser.add_argument("--protocols", default="network,snmp")
+    parser.add_argument("--kill", type=int, default=0, help="stop this many agents 0.2 s into the scan to exercise reassignment")
+    args = parser.parse_args()
+    protocols = [name for name in args.protocols.split(",") if name]
+    targets = TargetSet(f"{PREFIX}.1-{PREFIX}.{args.hosts}")
+    use_snmp_port(args.snmp_port)
+    start(printers_process, args.hosts, args.printers, args.snmp_port)
+    agents = [start(agent_process, f"site{i}", BASE_PORT + i, args.snmp_port) for i in range(args.agents)]
+    t0 = time.perf_counter()
+    local = run_scan(protocols, targets, force=True)
+    t_local = time.perf_counter() - t0
+    coordinator = Coordinator([("127.0.0.1", BASE_PORT + i) for i in range(args.agents)])
+    first = []
+    for process in agents[:args.kill]:
+        threading.Timer(0.2, os.kill, (process.pid, signal.SIGKILL)).start()
+    t0 = time.perf_counter()
+    remote = asyncio.run(coordinator.scan(targets, protocols, on_found=lambda p: first or first.append(time.perf_counter() - t0)))
+    t_remote = time.perf_counter() - t0
+    print(f"hosts={args.hosts} printers={args.printers} agents={args.agents} protocols={','.join(protocols)}")
+    print(f"local:       {t_local:7.3f}s  records={len(local)}")
+    print(f"distributed: {t_remote:7.3f}s  records={len(remote)}  devices={len(coordinator.devices())}  "
+          f"first result {first[0] * 1000 if first else 0:.1f} ms")
+    for stats in coordinator.stats():
+        print(f"  {stats['agent']:8s} {stats['status']:40s} found={stats['found']:4d} targets={stats['targets']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# قياس الماسحات المسجلة على شبكة وهمية: طابعات TCP 9100/IPP و SNMP على عناوين loopback، وطابعات USB محاكاة
+# لكل ماسح: معدل الفحص، زمن أول نتيجة، وذروة الذاكرة؛ مع --json تضاف النتائج سطراً لكل قياس لمقارنة الإصدارات
+# Usage: python benchmarks/bench_scanners.py [--hosts 254] [--printers 40] [--usb 8] [--runs 3] [--json results.ndjson]
+
+import os
+import sys
+import time
+import json
+import types
+import struct
+import asyncio
+import argparse
+import platform
+import threading
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from printer_discovery import (scanner_class, register_scanner, run_scan, SNMPScanner, TargetSet, RTTEstimator, USBPrinterRegistry,
+                               ber_read, ber_tlv, ber_int, ber_oid, ipp_attribute, SNMP_OIDS, IPP_PORT, NETWORK_PORT, TCP_RTO_INITIAL, TCP_RTO_MIN, TCP_RTO_MAX, SNMP_TIMEOUT,
+                               SNMP_RTO_MIN, SNMP_RTO_MAX, SNMP_RETRIES)
+
+PREFIX = "127.0.3"
+MODELS = ["HP LaserJet Pro M404dn", "Brother HL-L2340D", "Kyocera ECOSYS P2135dn", "Xerox Phaser 3020", "Lexmark MS310dn",
+          "Canon imageCLASS MF4450", "Ricoh SP 3600DN", "Epson WF-2830 Series"]
+USB_MODELS = [(0x03f0, 0x2b17, "HP", "LaserJet 1020"), (0x04a9, 0x2676, "Canon", "LBP2900"), (0x04f9, 0x0042, "Brother", "HL-2270DW"),
+              (0x04b8, 0x1101, "EPSON", "L3150 Series")]
+
+class FakePrinters:
+    # كل طابعة وهمية تسمع على 9100 (رد PJL INFO ID) و 631 (IPP Get-Printer-Attributes) وعلى منفذ SNMP
+    # العناوين الأخرى في النطاق لا يسمع عليها شيء فيرد النظام بـ RST، مثل أجهزة حية ليست طابعات
+    def __init__(self, hosts, printers, snmp_port):
+        self.ips = [f"{PREFIX}.{i}" for i in range(1, hosts + 1)]
+        step = max(1, hosts // max(1, printers))
+        self.printers = {ip: MODELS[i % len(MODELS)] for i, ip in enumerate(self.ips[::step][:printers])}
+        self.snmp_port = snmp_port
+        self.ipp = True
+        self.loop = None
+        self.ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=lambda: asyncio.run(self.serve()), name="fake-printers", daemon=True).start()
+        self.ready.wait(10)
+        return self
+
+    def stop(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        servers = []
+        for ip, model in self.printers.items():
+            servers.append(await asyncio.start_server(lambda r, w, m=model: self.pjl(r, w, m), ip, NETWORK_PORT))
+            if self.ipp:
+                try:
+                    servers.append(await asyncio.start_server(lambda r, w, m=model: self.ipp_reply(r, w, m), ip, IPP_PORT))
+                except PermissionError:
+                    # المنفذ 631 يحتاج صلاحيات؛ بدونها يعرف الموديل من PJL على 9100
+                    self.ipp = False
+            transport, _ = await self.loop.create_datagram_endpoint(lambda m=model, a=ip: SNMPAgent(m, a), local_addr=(ip, self.snmp_port))
+            servers.append(transport)
+        self.ready.set()
+        await self.stopped.wait()
+        for server in servers:
+            server.close()
+
+    async def pjl(self, reader, writer, model):
+        try:
+            await asyncio.wait_for(reader.readuntil(b"INFO ID\r\n"), 2)
+            writer.write(f'@PJL INFO ID\r\n"{model}"\r\n\x0c'.encode())
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, OSError):
+            pass
+        writer.close()
+
+    async def ipp_reply(self, reader, writer, model):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 2)
+            length = int(next((line.split(b":")[1] for line in head.split(b"\r\n") if line.lower().startswith(b"content-length")), b"0"))
+            body = await reader.readexactly(length)
+            request_id = struct.unpack_from(">I", body, 4)[0]
+            payload = struct.pack(">BBHI", 1, 1, 0, request_id) + b"\x01" + ipp_attribute(0x47, b"attributes-charset", b"utf-8")
+            payload += b"\x04" + ipp_attribute(0x41, b"printer-make-and-model", model.encode()) + b"\x03"
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/ipp\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % len(payload)
+                         + payload)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, OSError, ValueError, struct.error):
+            pass
+        writer.close()
+
+class SNMPAgent(asyncio.DatagramProtocol):
+    # وكيل SNMPv1 صغير: يرد على GetRequest بوصف الطابعة وموديلها ورقمها التسلسلي
+    def __init__(self, model, ip):
+        values = {"Description": model, "Model": model, "Product": model, "Serial": "SN" + ip.replace(".", "")}
+        self.varbinds = b"".join(ber_tlv(0x30, ber_oid(oid) + ber_tlv(0x04, values[name].encode())) for oid, name in SNMP_OIDS)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            _, message, _ = ber_read(data, 0)
+            _, version, pos = ber_read(message, 0)
+            _, community, pos = ber_read(message, pos)
+            _, pdu, _ = ber_read(message, pos)
+            _, request_id, _ = ber_read(pdu, 0)
+        except (IndexError, ValueError):
+            return
+        response = ber_tlv(0xA2, ber_tlv(0x02, request_id) + ber_int(0) + ber_int(0) + ber_tlv(0x30, self.varbinds))
+        self.transport.sendto(ber_tlv(0x30, ber_tlv(0x02, version) + ber_tlv(0x04, community) + response), addr)
+
+class FakeUSBConfig(list):
+    index = 0
+
+class FakeUSBDevice:
+    # واجهة pyusb التي يستعملها الماسح: الواصفات، السلاسل النصية، وطلب GET_DEVICE_ID بزمن نقل قريب من الجهاز الحقيقي
+    def __init__(self, n, latency):
+        vid, pid, maker, model = USB_MODELS[n % len(USB_MODELS)]
+        self.idVendor, self.idProduct = vid, pid + n // len(USB_MODELS)
+        self.bus, self.address = 1, n + 2
+        self.bDeviceClass = 0
+        self.iManufacturer, self.iProduct, self.iSerialNumber = 1, 2, 3
+        self.strings = {1: maker, 2: model, 3: f"USB{n:06d}"}
+        self.device_id = f"MFG:{maker};MDL:{model};CMD:PCL,PJL;CLS:PRINTER;SN:USB{n:06d};".encode()
+        self.latency = latency
+        self.configs = [FakeUSBConfig([types.SimpleNamespace(bInterfaceClass=7, bInterfaceNumber=0, bAlternateSetting=0)])]
+
+    def __iter__(self):
+        return iter(self.configs)
+
+    def ctrl_transfer(self, request_type, request, value, index, length, timeout=None):
+        time.sleep(self.latency)
+        data = self.device_id[:length - 2]
+        return bytes([(len(data) + 2) >> 8, (len(data) + 2) & 0xFF]) + data
+
+def install_fake_usb(count, latency):
+    # وحدات usb و usb.core و usb.util بديلة حتى يعمل الماسح الحقيقي بدون أجهزة أو pyusb
+    devices = [FakeUSBDevice(n, latency) for n in range(count)]
+    usb = types.ModuleType("usb")
+    usb.core = types.ModuleType("usb.core")
+    usb.util = types.ModuleType("usb.util")
+    usb.core.find = lambda find_all=False, **kw: list(devices) if find_all else (devices[0] if devices else None)
+    usb.util.get_string = lambda device, idx: device.strings.get(idx)
+    sys.modules.update({"usb": usb, "usb.core": usb.core, "usb.util": usb.util})
+    return devices
+
+def use_snmp_port(port):
+    # الوكيل الوهمي على منفذ غير قياسي: ماسح SNMP يسجل بنفس الاسم فيستعمله ScanJob أيضاً، كما تفعل أي إضافة
+    class LocalSNMPScanner(SNMPScanner):
+        def __init__(self, *args, **kwargs):
+            kwargs.setdefault("port", port)
+            super().__init__(*args, **kwargs)
+    register_scanner(LocalSNMPScanner)
+
+def make_scanner(name, net):
+    # الماسحات تبنى من السجل بالاسم، بنفس الخيارات التي يعطيها ScanJob لكل بروتوكول
+    cls = scanner_class(name)
+    if name == "network":
+        return cls(net.ips, rtt=RTTEstimator(TCP_RTO_INITIAL, TCP_RTO_MIN, TCP_RTO_MAX))
+    if name == "snmp":
+        return cls(net.ips, rtt=RTTEstimator(SNMP_TIMEOUT, SNMP_RTO_MIN, SNMP_RTO_MAX, SNMP_RETRIES))
+    if name == "usb":
+        registry = USBPrinterRegistry()
+        registry.watcher = False  # بدون خيط مراقبة التوصيل أثناء القياس
+        return cls(registry=registry)
+    return cls()
+
+async def measure(scanner):
+    t0 = time.perf_counter()
+    first = None
+    found = 0
+    async for p in scanner:
+        if first is None:
+            first = time.perf_counter() - t0
+        found += 1
+    return found, first, time.perf_counter() - t0
+
+def measure_memory(name, net):
+    # tracemalloc يبطئ الفحص، فالذاكرة تقاس في تشغيل منفصل عن التوقيت
+    tracemalloc.start()
+    try:
+        asyncio.run(measure(make_scanner(name, net)))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def measure_job(net, protocols):
+    # البحث الكامل عبر المجدول: اكتشاف الأجهزة الحية ثم كل البروتوكولات معاً
+    t0 = time.perf_counter()
+    first = []
+    def on_found(p):
+        if not first:
+            first.append(time.perf_counter() - t0)
+    printers = run_scan(protocols, TargetSet(f"{net.ips[0]}-{net.ips[-1]}"), force=True, on_found=on_found)
+    return len(printers), first[0] if first else None, time.perf_counter() - t0
+
+def report(rows, name, targets, found, first, seconds, peak=None):
+    rate = targets / seconds if targets and seconds else None
+    row = {"scanner": name, "targets": targets, "found": found, "seconds": round(seconds, 4),
+           "first_result": round(first, 4) if first is not None else None, "targets_per_s": round(rate, 1) if rate else None,
+           "peak_kib": round(peak / 1024, 1) if peak is not None else None}
+    rows.append(row)
+    first_text = f"{first * 1000:8.1f}" if first is not None else "       -"
+    rate_text = f"{rate:9.0f}" if rate else "        -"
+    peak_text = f"{peak / 1024:9.1f}" if peak is not None else "        -"
+    print(f"{name:10s} {found:6d} {seconds * 1000:10.1f} {first_text} {rate_text} {peak_text}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hosts", type=int, default=254)
+    parser.add_argument("--printers", type=int, default=40)
+    parser.add_argument("--usb", type=int, default=8)
+    parser.add_argument("--usb-latency", type=float, default=0.002, help="seconds per USB control transfer")
+    parser.add_argument("--snmp-port", type=int, default=1161, help="UDP port of the fake SNMP agents (161 needs root)")
+    parser.add_argument("--scanners", default="network,snmp,usb")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="append one JSON line per measurement to this file")
+    args = parser.parse_args()
+    names = [name for name in args.scanners.split(",") if name]
+    install_fake_usb(args.usb, args.usb_latency)
+    net = FakePrinters(args.hosts, args.printers, args.snmp_port).start()
+    use_snmp_port(args.snmp_port)
+    rows = []
+    try:
+        print(f"hosts={args.hosts} printers={len(net.printers)} usb={args.usb} ipp={'yes' if net.ipp else 'no (port 631 needs root)'}")
+        print(f"{'scanner':10s} {'found':>6s} {'total ms':>10s} {'first ms':>8s} {'targets/s':>9s} {'peak KiB':>9s}")
+        for name in names:
+            targets = len(net.ips) if scanner_class(name).needs_hosts else args.usb if name == "usb" else None
+            for _ in range(args.runs):
+                found, first, seconds = asyncio.run(measure(make_scanner(name, net)))
+                report(rows, name, targets, found, first, seconds)
+            found, first, seconds = asyncio.run(measure(make_scanner(name, net)))
+            report(rows, name, targets, found, first, seconds, measure_memory(name, net))
+        for _ in range(args.runs):
+            found, first, seconds = measure_job(net, names)
+            report(rows, "job", len(net.ips), found, first, seconds)
+    finally:
+        net.stop()
+    if args.json:
+        meta = {"time": time.time(), "python": platform.python_version(), "hosts": args.hosts, "printers": len(net.printers), "usb": args.usb}
+        with open(args.json, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps({**meta, **row}) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# قياس زمن بدء التشغيل: استيراد المحرك، استيراد الواجهة، وحتى ظهور النافذة الرئيسية
+# كل قياس في عملية Python جديدة حتى لا تؤثر الوحدات المحملة مسبقاً على النتيجة
+# Usage: python benchmarks/bench_startup.py [--runs 7] [--budget-ms 800]
+
+import os
+import sys
+import time
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBES = {
+    "import printer_discovery": """
+import time
+t0 = time.perf_counter()
+import printer_discovery
+print(time.perf_counter() - t0)
+""",
+    "import printer_driver_finder": """
+import time
+t0 = time.perf_counter()
+import printer_driver_finder
+print(time.perf_counter() - t0)
+""",
+    # main() كما هو، وتنتهي العملية لحظة دخول حلقة الأحداث بعد رسم النافذة
+    "window shown": """
+import sys, time
+t0 = time.perf_counter()
+import printer_driver_finder
+def exec_(app):
+    app.processEvents()
+    print(time.perf_counter() - t0)
+    return 0
+printer_driver_finder.QApplication.exec_ = exec_
+sys.argv = [sys.argv[0]]
+try:
+    printer_driver_finder.main()
+except SystemExit:
+    pass
+""",
+}
+
+def run_probe(code):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    wall = time.perf_counter() - t0
+    return float(out.strip().splitlines()[-1]), wall
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, help="exit with status 1 if the median time to window shown exceeds this")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+    results = {}
+    for name, code in PROBES.items():
+        samples = [run_probe(code) for _ in range(args.runs)]
+        inner = [s[0] * 1000 for s in samples]
+        wall = [s[1] * 1000 for s in samples]
+        results[name] = {"median_ms": round(statistics.median(inner), 1), "min_ms": round(min(inner), 1),
+                         "process_median_ms": round(statistics.median(wall), 1)}
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"runs={args.runs}")
+        for name, r in results.items():
+            print(f"{name:30s} median {r['median_ms']:7.1f} ms  min {r['min_ms']:7.1f} ms  whole process {r['process_median_ms']:7.1f} ms")
+    if args.budget_ms and results["window shown"]["median_ms"] > args.budget_ms:
+        print(f"window shown took longer than the {args.budget_ms:.0f} ms budget", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+# Printer Driver Finder - فهرس التعريفات المحلي
+# جميع الحقوق محفوظة © khalid aldawish 2025
+
+import os
+import re
+import sys
+import json
+import gzip
+import glob
+import sqlite3
+import argparse
+import tempfile
+import threading
+import subprocess
+
+from printer_models import PLACEHOLDER_NAME, canonical_manufacturer, model_matcher
+
+CATALOG_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "driver_catalog.json")
+CATALOG_INDEX = "driver_catalog.db"
+CATALOG_VERSION = "2"
+PPD_DIRS = ("/usr/share/ppd", "/usr/share/cups/model", "/usr/local/share/ppd")
+PPD_HEADER_BYTES = 64 * 1024
+NGRAM = 3
+FUZZY_THRESHOLD = 0.4
+FUZZY_CANDIDATES = 8
+MEMO_SIZE = 4096
+
+def model_key(text, manufacturer=None):
+    # نفس توحيد الأسماء المستعمل في التجميع: HEWLETT-PACKARD LJ M401dne -> "hp laserjet m401"
+    sig = model_matcher().signature(text, manufacturer)
+    return sig.manufacturer, sig.key
+
+def ngrams(key, n=NGRAM):
+    padded = f" {key} "
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+def normalize_usb_id(driver_id):
+    # "0x3f0:0x2b17" كما في سجلات USB إلى "03f0:2b17"
+    try:
+        vid, pid = (int(part, 16) for part in str(driver_id).split(":"))
+    except ValueError:
+        return None
+    return f"{vid:04x}:{pid:04x}"
+
+def read_ppd_header(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    fields = {}
+    try:
+        with opener(path, "rb") as f:
+            data = f.read(PPD_HEADER_BYTES).decode("latin-1", "replace")
+    except OSError:
+        return fields
+    for key in ("Manufacturer", "ModelName", "NickName", "ShortNickName", "1284DeviceID"):
+        match = re.search(rf'^\*{key}:\s*"([^"]*)"', data, re.M)
+        if match:
+            fields[key] = match.group(1).strip()
+    return fields
+
+def ppd_entries(dirs=PPD_DIRS):
+    for root in dirs:
+        for path in glob.glob(os.path.join(root, "**", "*.ppd*"), recursive=True):
+            fields = read_ppd_header(path)
+            model = fields.get("ModelName") or fields.get("ShortNickName")
+            if model:
+                yield {"manufacturer": fields.get("Manufacturer"), "model": model,
+                       "driver": fields.get("NickName") or model, "device_id": fields.get("1284DeviceID"), "source": "ppd"}
+
+def lpinfo_entries():
+    # "drv:///hpcups.drv/hp-laserjet_1020.ppd HP LaserJet 1020, hpcups 3.22.10"
+    try:
+        out = subprocess.run(["lpinfo", "-m"], capture_output=True, text=True, timeout=60).stdout
+    except (OSError, subprocess.SubprocessError):
+        return
+    for line in out.splitlines():
+        parts = line.split(" ", 1)
+        if len(parts) == 2 and parts[1].strip():
+            yield {"model": parts[1].split(",", 1)[0].strip(), "driver": parts[1].strip(), "source": "cups"}
+
+def build_index(path=CATALOG_INDEX, source=CATALOG_SOURCE, ppd_dirs=PPD_DIRS, use_lpinfo=False):
+    with open(source, encoding="utf-8") as f:
+        catalog = json.load(f)
+    vendors = {m["name"]: m for m in catalog["manufacturers"]}
+    entries = [dict(e, source="catalog") for e in catalog["models"]]
+    entries += list(ppd_entries(ppd_dirs))
+    if use_lpinfo:
+        entries += list(lpinfo_entries())
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    db = sqlite3.connect(tmp)
+    with db:
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        db.execute("CREATE TABLE drivers (id INTEGER PRIMARY KEY, manufacturer TEXT, model TEXT, key TEXT, driver TEXT, url TEXT, "
+                   "source TEXT, grams INTEGER)")
+        db.execute("CREATE TABLE usb_ids (usb_id TEXT PRIMARY KEY, driver INTEGER) WITHOUT ROWID")
+        db.execute("CREATE TABLE grams (gram TEXT, driver INTEGER, PRIMARY KEY (gram, driver)) WITHOUT ROWID")
+        seen = set()
+        for entry in entries:
+            hint = entry.get("manufacturer")
+            if not hint and entry.get("device_id"):
+                fields = dict(part.split(":", 1) for part in entry["device_id"].split(";") if ":" in part)
+                hint = fields.get("MFG")
+            manufacturer, key = model_key(entry["model"], hint)
+            if not key or (key, entry["driver"]) in seen:
+                continue
+            seen.add((key, entry["driver"]))
+            vendor = vendors.get(manufacturer, {})
+            grams = ngrams(key)
+            model = entry["model"] if not manufacturer or model_key(entry["model"])[0] else f"{manufacturer} {entry['model']}"
+            cur = db.execute("INSERT INTO drivers (manufacturer, model, key, driver, url, source, grams) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (manufacturer, model, key, entry["driver"], entry.get("url") or vendor.get("url"), entry["source"], len(grams)))
+            db.executemany("INSERT OR IGNORE INTO grams VALUES (?, ?)", [(g, cur.lastrowid) for g in grams])
+            db.executemany("INSERT OR IGNORE INTO usb_ids VALUES (?, ?)", [(usb_id.lower(), cur.lastrowid) for usb_id in entry.get("usb", [])])
+        db.execute("CREATE INDEX drivers_key ON drivers (key)")
+        meta = {"version": CATALOG_VERSION, "source_mtime": str(os.path.getmtime(source)),
+                "manufacturers": json.dumps(catalog["manufacturers"]), "command_sets": json.dumps(catalog["command_sets"])}
+        db.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+    db.close()
+    os.replace(tmp, path)
+    return path
+
+class DriverCatalog:
+    # فهرس SQLite مبني مسبقاً: معرفات USB، اسم الشركة والموديل من IEEE 1284، أنماط sysDescr وأسماء PPD
+    # البحث: تطابق تام أولاً، ثم تقريبي بالمقاطع الثلاثية بشرط تطابق أرقام الموديل، ثم تعريف الشركة العام
+    def __init__(self, path=CATALOG_INDEX, source=CATALOG_SOURCE):
+        self.path = path
+        self.source = source
+        self.lock = threading.Lock()
+        self.db = None
+        self.memo = {}
+
+    def open(self):
+        with self.lock:
+            if self.db is not None:
+                return self.db
+            if self.is_stale():
+                try:
+                    build_index(self.path, self.source)
+                except (OSError, sqlite3.Error):
+                    # مجلد البرنامج غير قابل للكتابة: الفهرس يبنى في مجلد المؤقتات
+                    self.path = os.path.join(tempfile.gettempdir(), os.path.basename(self.path))
+                    if self.is_stale():
+                        build_index(self.path, self.source)
+            self.db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            meta = dict(self.db.execute("SELECT key, value FROM meta"))
+            manufacturers = json.loads(meta["manufacturers"])
+            self.vendors = {m["name"]: m for m in manufacturers}
+            self.usb_vendors = {m["usb_vendor"]: m["name"] for m in manufacturers if m.get("usb_vendor")}
+            self.sysdescr = [(re.compile(p, re.I), m["name"]) for m in manufacturers for p in m.get("sysdescr", [])]
+            self.command_sets = json.loads(meta["command_sets"])
+            return self.db
+
+    def is_stale(self):
+        if not os.path.exists(self.path):
+            return True
+        try:
+            db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+            db.close()
+        except sqlite3.Error:
+            return True
+        return meta.get("version") != CATALOG_VERSION or meta.get("source_mtime") != str(os.path.getmtime(self.source))
+
+    def query(self, sql, args=()):
+        with self.lock:
+            return self.db.execute(sql, args).fetchall()
+
+    def match_row(self, row, kind, score=1.0):
+        id_, manufacturer, model, driver, url = row
+        return {"manufacturer": manufacturer, "model": model, "driver": driver, "url": url, "match": kind, "score": round(score, 3)}
+
+    def by_usb_id(self, usb_id):
+        rows = self.query("SELECT d.id, d.manufacturer, d.model, d.driver, d.url FROM usb_ids u JOIN drivers d ON d.id = u.driver "
+                          "WHERE u.usb_id = ?", (usb_id,))
+        return self.match_row(rows[0], "usb") if rows else None
+
+    def by_model(self, text, manufacturer=None):
+        matcher = model_matcher()
+        sig = matcher.signature(text, manufacturer)
+        manufacturer, key = sig.manufacturer, sig.key
+        if not key:
+            return None
+        rows = self.query("SELECT id, manufacturer, model, driver, url FROM drivers WHERE key = ? LIMIT 1", (key,))
+        if rows:
+            return self.match_row(rows[0], "model")
+        grams = ngrams(key)
+        marks = ",".join("?" * len(grams))
+        candidates = self.query(f"SELECT d.id, d.manufacturer, d.model, d.driver, d.url, d.key, d.grams, COUNT(*) AS common "
+                                f"FROM grams g JOIN drivers d ON d.id = g.driver WHERE g.gram IN ({marks}) "
+                                f"GROUP BY d.id ORDER BY common DESC LIMIT {FUZZY_CANDIDATES}", tuple(grams))
+        best, best_score = None, FUZZY_THRESHOLD
+        for id_, cand_manufacturer, model, driver, url, cand_key, cand_grams, common in candidates:
+            # نفس قاعدة التجميع: الشركة والعائلة متوافقتان ورموز الموديل متطابقة، فـ LaserJet 1018 ليست LaserJet 1020
+            if not matcher.compatible(sig, matcher.signature(model, cand_manufacturer)):
+                continue
+            score = 2 * common / (len(grams) + cand_grams)
+            if score > best_score:
+                best, best_score = (id_, cand_manufacturer, model, driver, url), score
+        return self.match_row(best, "fuzzy", best_score) if best else None
+
+    def by_manufacturer(self, manufacturer, kind="manufacturer"):
+        vendor = self.vendors.get(manufacturer)
+        if not vendor:
+            return None
+        return {"manufacturer": manufacturer, "model": None, "driver": vendor["driver"], "url": vendor["url"], "match": kind, "score": 0.0}
+
+    def by_command_set(self, commands):
+        commands = {c.strip().upper() for c in commands.split(",") if c.strip()}
+        for entry in self.command_sets:
+            if commands & set(entry["match"]):
+                return {"manufacturer": None, "model": None, "driver": entry["driver"], "url": entry["url"], "match": "command_set", "score": 0.0}
+        return None
+
+    def resolve(self, record):
+        self.open()
+        memo_key = (record.get("type"), record.get("driver_id"), record.get("model"), record.get("device_id"), record.get("printer_name"))
+        if memo_key in self.memo:
+            return self.memo[memo_key]
+        match = self.lookup(record)
+        if len(self.memo) >= MEMO_SIZE:
+            self.memo.clear()
+        self.memo[memo_key] = match
+        return match
+
+    def lookup(self, record):
+        manufacturer = None
+        fields = {}
+        if record.get("type") == "usb":
+            usb_id = normalize_usb_id(record.get("driver_id"))
+            if usb_id:
+                match = self.by_usb_id(usb_id)
+                if match:
+                    return match
+                manufacturer = self.usb_vendors.get(usb_id.split(":")[0])
+        if record.get("device_id"):
+            fields = dict((k.strip().upper(), v.strip()) for k, v in
+                          (part.split(":", 1) for part in record["device_id"].split(";") if ":" in part))
+            manufacturer = canonical_manufacturer(fields.get("MFG", fields.get("MANUFACTURER", ""))) or manufacturer
+        texts = [fields.get("MDL", fields.get("MODEL")), record.get("model")]
+        if not PLACEHOLDER_NAME.match(record.get("printer_name") or ""):
+            texts.append(record.get("printer_name"))
+        for text in filter(None, texts):
+            match = self.by_model(text, manufacturer)
+            if match:
+                return match
+        description = record.get("printer_name") or ""
+        for pattern, name in self.sysdescr:
+            if pattern.search(description):
+                manufacturer = manufacturer or name
+                break
+        for text in filter(None, texts):
+            manufacturer = manufacturer or model_key(text)[0]
+        commands = fields.get("CMD", fields.get("COMMAND SET", ""))
+        return self.by_manufacturer(manufacturer) or (self.by_command_set(commands) if commands else None)
+
+    def enrich(self, record):
+        # يستبدل التعريف الافتراضي ورابط البحث بالتعريف المطابق، ويبقي السجل كما هو إذا لم يطابق شيء
+        if record.get("driver_match"):
+            return record
+        match = self.resolve(record)
+        if match:
+            record["driver_name"] = match["driver"]
+            if match["url"]:
+                record["download_url"] = match["url"]
+            record["driver_match"] = match["match"]
+            if match["model"] and not record.get("model"):
+                record["model"] = match["model"]
+        return record
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def driver_catalog():
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = DriverCatalog()
+        return _catalog
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="driver_catalog", description="Build or query the offline printer driver index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="rebuild the index from driver_catalog.json and the installed PPD files")
+    build.add_argument("--index", default=CATALOG_INDEX)
+    build.add_argument("--ppd-dir", action="append", help="PPD directory to index (default: the usual CUPS locations)")
+    build.add_argument("--lpinfo", action="store_true", help="also index the drivers CUPS reports with lpinfo -m")
+    lookup = sub.add_parser("lookup", help="resolve a USB id (vid:pid), IEEE 1284 id or model name")
+    lookup.add_argument("query")
+    lookup.add_argument("--index", default=CATALOG_INDEX)
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build_index(args.index, ppd_dirs=args.ppd_dir or PPD_DIRS, use_lpinfo=args.lpinfo)
+        db = sqlite3.connect(args.index)
+        print(f"{args.index}: {db.execute('SELECT COUNT(*) FROM drivers').fetchone()[0]} drivers")
+        return 0
+    catalog = DriverCatalog(args.index)
+    if re.fullmatch(r"(0x)?[0-9a-fA-F]{1,4}:(0x)?[0-9a-fA-F]{1,4}", args.query):
+        record = {"type": "usb", "driver_id": args.query}
+    elif "MDL:" in args.query.upper() or "MODEL:" in args.query.upper():
+        record = {"device_id": args.query}
+    else:
+        record = {"model": args.query}
+    print(json.dumps(catalog.resolve(record), ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2390 @@
+# -*- coding: utf-8 -*-
+# Printer Driver Finder - محرك الاكتشاف بدون واجهة
+# جميع الحقوق محفوظة © khalid aldawish 2025
+
+import os
+import sys
+import abc
+import socket
+import threading
+import asyncio
+import struct
+import random
+import re
+import subprocess
+import ipaddress
+import time
+import json
+import signal
+import argparse
+import sqlite3
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+from driver_catalog import driver_catalog
+from printer_models import model_matcher
+from printer_inventory import ChangeTracker, DeviceResolver, merge_devices, record_fingerprint, source_key
+from printer_metrics import ScanMetrics, bind_metrics, count, swallowed, total_metrics
+
+CACHE_FILE = "printer_cache.db"
+CACHE_TTL = 15 * 60
+
+def device_key(p):
+    return f"{p.get('type', '-')}:{p['driver_id']}"
+
+class DeviceCache:
+    # ذاكرة محلية للأجهزة المكتشفة حتى يظهر البحث المتكرر فوراً
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS devices (key TEXT PRIMARY KEY, type TEXT, driver_id TEXT, "
+                            "record TEXT, fingerprint TEXT, last_seen REAL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS devices_type ON devices (type, last_seen)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS sweeps (scope TEXT PRIMARY KEY, last_run REAL)")
+
+    def load(self, types=None, targets=None):
+        # مع targets: أجهزة ماسحات العناوين تعاد فقط إذا كانت داخل النطاق، فحداثة نطاق لا تعرض أجهزة نطاقات فحصت قبله
+        with self.lock:
+            rows = self.db.execute("SELECT type, driver_id, record FROM devices ORDER BY rowid").fetchall()
+        return [json.loads(record) for type_, driver_id, record in rows if (types is None or type_ in types)
+                and (targets is None or not uses_targets(type_) or driver_id in targets)]
+
+    def iter_records(self, batch=1000):
+        # للتصدير: دفعة بعد دفعة بترتيب rowid، فلا يحمل المخزن كله في الذاكرة ولا يبقى القفل طوال التصدير؛ (السجل، آخر ظهور)
+        last = 0
+        while True:
+            with self.lock:
+                rows = self.db.execute("SELECT rowid, record, last_seen FROM devices WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                       (last, batch)).fetchall()
+            for last, record, last_seen in rows:
+                yield json.loads(record), last_seen
+            if len(rows) < batch:
+                return
+
+    def put_many(self, printers, now=None):
+        now = now or time.time()
+        rows = [(device_key(p), p.get('type'), str(p['driver_id']), json.dumps(p), p.get('model'), now) for p in printers]
+        with self.lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO devices VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def prune(self, type_, before, targets=None):
+        # حذف الأجهزة التي لم تظهر في آخر فحص كامل لنفس النطاق
+        with self.lock, self.db:
+            rows = self.db.execute("SELECT key, driver_id FROM devices WHERE type = ? AND last_seen < ?", (type_, before)).fetchall()
+            stale = [(key,) for key, driver_id in rows if targets is None or driver_id in targets]
+            self.db.executemany("DELETE FROM devices WHERE key = ?", stale)
+
+    def is_fresh(self, scope, now=None):
+        now = now or time.time()
+        with self.lock:
+            row = self.db.execute("SELECT last_run FROM sweeps WHERE scope = ?", (scope,)).fetchone()
+        return bool(row) and now - row[0] < self.ttl
+
+    def mark_swept(self, scope, now=None):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO sweeps VALUES (?, ?)", (scope, now or time.time()))
+
+    def record_sweep(self, type_, printers, started, scope, targets=None):
+        # نتيجة فحص كامل: حفظ ما وجد، حذف ما اختفى من نفس النطاق، وتسجيل وقت الفحص
+        self.put_many(printers)
+        self.prune(type_, started, targets)
+        self.mark_swept(scope, started)
+
+    def record_changes(self, changed, gone, started, scopes=()):
+        # فحص جزئي من المراقبة: يكتب فقط الجديد والمتغير ويحذف ما اختفى، فالكتابة على القرص بقدر التغير لا بحجم الشبكة
+        if changed:
+            self.put_many(changed, started)
+        with self.lock, self.db:
+            self.db.executemany("DELETE FROM devices WHERE key = ?", [(device_key(p),) for p in gone])
+            self.db.executemany("INSERT OR REPLACE INTO sweeps VALUES (?, ?)", [(scope, started) for scope in scopes])
+
+    def known_models(self, now=None):
+        # بصمات حديثة فقط، والأقدم من TTL يعاد فحصها
+        now = now or time.time()
+        with self.lock:
+            rows = self.db.execute("SELECT driver_id, fingerprint FROM devices WHERE type = 'network' AND fingerprint IS NOT NULL "
+                                   "AND last_seen >= ?", (now - self.ttl,)).fetchall()
+        return dict(rows)
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM devices")
+            self.db.execute("DELETE FROM sweeps")
+
+HISTORY_FILE = "printer_history.txt"  # الصيغة القديمة، تنقل مرة واحدة إلى HISTORY_DB
+HISTORY_DB = "printer_history.db"
+HISTORY_PAGE_SIZE = 200
+HISTORY_REFRESH = 60 * 60  # وضع المراقبة: جهاز لم يتغير يعاد تسجيله مرة كل ساعة فقط لتحديث آخر ظهور
+
+def history_entry(p):
+    return f"{p['printer_name']} | {p['driver_name']} | {p['driver_id']} | {p.get('type', '-')}"
+
+class HistoryStore:
+    # سجل دائم لكل ما ظهر في كل بحث: جلسة لكل بحث وصف واحد لكل جهاز في الجلسة، يكتب دفعة واحدة عند انتهاء البحث
+    # جدول devices ملخص بلا تكرار (أول وآخر ظهور وعدد المرات) تقرأ منه نافذة السجل صفحة بعد صفحة
+    def __init__(self, path=HISTORY_DB, legacy=HISTORY_FILE):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            # WAL: القراءة من نافذة السجل لا تنتظر كتابة بحث جار، والكتابة لا تعيد نسخ الصفحات
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            with self.db:
+                self.db.execute("CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, started REAL, finished REAL, "
+                                "protocols TEXT, targets TEXT, devices INTEGER)")
+                self.db.execute("CREATE TABLE IF NOT EXISTS sightings (session INTEGER, key TEXT, seen REAL, record TEXT, "
+                                "PRIMARY KEY (session, key)) WITHOUT ROWID")
+                self.db.execute("CREATE INDEX IF NOT EXISTS sightings_key ON sightings (key, seen)")
+                self.db.execute("CREATE INDEX IF NOT EXISTS sightings_seen ON sightings (seen)")
+                self.db.execute("CREATE TABLE IF NOT EXISTS devices (key TEXT PRIMARY KEY, entry TEXT, first_seen REAL, "
+                                "last_seen REAL, times INTEGER)")
+                self.db.execute("CREATE INDEX IF NOT EXISTS devices_last_seen ON devices (last_seen)")
+        self.written = None  # key -> (النص، آخر ظهور مسجل)، يقرأ عند أول جلسة تغييرات فقط
+        if legacy:
+            self.migrate(legacy)
+
+    def record_session(self, printers, started, finished=None, protocols=(), targets=None, changed_only=False, refresh=HISTORY_REFRESH):
+        # جلسة كاملة في معاملة واحدة؛ الجهاز المكرر داخل نفس الجلسة يسجل مرة واحدة
+        # changed_only (المراقبة): يكتب فقط الجديد وما تغير نصه وما مر على آخر تسجيل له refresh ثانية، ولا جلسة إن لم يبق شيء
+        finished = finished or time.time()
+        unique = {}
+        for p in printers:
+            unique.setdefault(device_key(p), p)
+        with self.lock:
+            if changed_only:
+                if self.written is None:
+                    self.written = {key: (entry, last_seen) for key, entry, last_seen in
+                                    self.db.execute("SELECT key, entry, last_seen FROM devices")}
+                unique = {key: p for key, p in unique.items()
+                          if self.written.get(key, ("", -refresh))[0] != history_entry(p) or finished - self.written[key][1] >= refresh}
+                if not unique:
+                    return None
+            with self.db:
+                session = self.db.execute("INSERT INTO sessions (started, finished, protocols, targets, devices) VALUES (?, ?, ?, ?, ?)",
+                                          (started, finished, ",".join(protocols), str(targets) if targets else None,
+                                           len(unique))).lastrowid
+                self.db.executemany("INSERT OR IGNORE INTO sightings VALUES (?, ?, ?, ?)",
+                                    [(session, key, finished, json.dumps(p)) for key, p in unique.items()])
+                self.db.executemany("INSERT INTO devices VALUES (?, ?, ?, ?, 1) ON CONFLICT (key) DO UPDATE SET "
+                                    "entry = excluded.entry, last_seen = max(last_seen, excluded.last_seen), "
+                                    "first_seen = min(first_seen, excluded.first_seen), times = times + 1",
+                                    [(key, history_entry(p), finished, finished) for key, p in unique.items()])
+            if self.written is not None:
+                self.written.update((key, (history_entry(p), finished)) for key, p in unique.items())
+        return session
+
+    def migrate(self, path):
+        # كل سطر "الاسم | التعريف | المعرف | النوع" يصبح جهازاً في جلسة واحدة بتاريخ آخر تعديل للملف
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = [line.strip() for line in f if line.strip()]
+            when = os.path.getmtime(path)
+        except OSError:
+            return 0
+        printers = []
+        for line in lines:
+            parts = [part.strip() for part in line.split(" | ")]
+            if len(parts) != 4:
+                continue
+            printers.append({"printer_name": parts[0], "driver_name": parts[1], "driver_id": parts[2], "type": parts[3]})
+        if printers:
+            self.record_session(printers, when, when, ("legacy",))
+        try:
+            os.replace(path, path + ".migrated")
+        except OSError:
+            pass
+        return len(printers)
+
+    @staticmethod
+    def range_filter(since=None, until=None, column="last_seen"):
+        clauses, params = [], []
+        if since is not None:
+            clauses.append(f"{column} >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append(f"{column} < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, since=None, until=None):
+        where, params = self.range_filter(since, until)
+        with self.lock:
+            return self.db.execute("SELECT count(*) FROM devices" + where, params).fetchone()[0]
+
+    def page(self, offset=0, limit=HISTORY_PAGE_SIZE, since=None, until=None):
+        # الأحدث أولاً عبر فهرس last_seen؛ كل صف: (المفتاح، النص، أول ظهور، آخر ظهور، عدد المرات)
+        where, params = self.range_filter(since, until)
+        with self.lock:
+            return self.db.execute("SELECT key, entry, first_seen, last_seen, times FROM devices" + where +
+                                   " ORDER BY last_seen DESC, key LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+
+    def device_history(self, key, since=None, until=None):
+        # كل ظهور لجهاز واحد في فترة زمنية: [(الوقت، الجلسة، السجل)]
+        where, params = self.range_filter(since, until, "seen")
+        where = (where + " AND" if where else " WHERE") + " key = ?"
+        with self.lock:
+            rows = self.db.execute("SELECT seen, session, record FROM sightings" + where + " ORDER BY seen",
+                                   params + [key]).fetchall()
+        return [(seen, session, json.loads(record)) for seen, session, record in rows]
+
+    def iter_sightings(self, since=None, until=None, batch=1000):
+        # كل ظهور بترتيب الجلسة ثم المفتاح، دفعة بعد دفعة كما في DeviceCache.iter_records؛ (الوقت، المفتاح، السجل)
+        where, params = self.range_filter(since, until, "seen")
+        where = (where + " AND" if where else " WHERE") + " (session, key) > (?, ?)"
+        last = (0, "")
+        while True:
+            with self.lock:
+                rows = self.db.execute("SELECT session, key, seen, record FROM sightings" + where + " ORDER BY session, key LIMIT ?",
+                                       params + list(last) + [batch]).fetchall()
+            for session, key, seen, record in rows:
+                yield seen, key, json.loads(record)
+            if len(rows) < batch:
+                return
+            last = rows[-1][:2]
+
+    def sessions(self, since=None, until=None):
+        where, params = self.range_filter(since, until, "started")
+        with self.lock:
+            return self.db.execute("SELECT id, started, finished, protocols, devices FROM sessions" + where +
+                                   " ORDER BY started DESC", params).fetchall()
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM sightings")
+            self.db.execute("DELETE FROM sessions")
+            self.db.execute("DELETE FROM devices")
+            self.written = None
+
+_history = None
+_history_lock = threading.Lock()
+
+def history_store():
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = HistoryStore()
+        return _history
+
+USB_PRINTER_CLASS = 7
+USB_GET_DEVICE_ID = 0  # طلب فئة الطابعة في IEEE 1284 / USB Printer Class 1.1
+USB_DEVICE_ID_LENGTH = 1024
+USB_TIMEOUT = 500  # ms لكل طلب تحكم حتى لا يعلق جهاز معطوب البحث كله
+USB_SYSFS_DEVICE_IDS = "/sys/class/usbmisc/lp*/device/ieee1284_id"
+
+def safe_usb_string(device, idx):
+    if not idx:
+        return None
+    try:
+        import usb.util
+        return usb.util.get_string(device, idx)
+    except Exception:
+        swallowed("usb.string")
+        return None
+
+def get_printer_name_from_usb(device):
+    manufacturer = safe_usb_string(device, getattr(device, 'iManufacturer', 0)) or f"Vendor:{hex(getattr(device, 'idVendor', 0))}"
+    product = safe_usb_string(device, getattr(device, 'iProduct', 0)) or f"Product:{hex(getattr(device, 'idProduct', 0))}"
+    return f"{manufacturer} {product}".strip()
+
+def usb_printer_interfaces(device):
+    # من الواصفات المخزنة عند التعداد، بدون أي طلب إلى الجهاز
+    found = []
+    try:
+        for cfg in device:
+            for intf in cfg:
+                if getattr(device, 'bDeviceClass', 0) == USB_PRINTER_CLASS or intf.bInterfaceClass == USB_PRINTER_CLASS:
+                    found.append((getattr(cfg, 'index', 0), intf.bInterfaceNumber, intf.bAlternateSetting))
+    except Exception:
+        swallowed("usb.descriptors")
+    return found
+
+def read_usb_device_id(device, interfaces, timeout=USB_TIMEOUT):
+    # GET_DEVICE_ID: bmRequestType=0xA1، wValue=رقم الإعداد، wIndex=(الواجهة << 8) | الإعداد البديل
+    for config, interface, alt in interfaces:
+        count("probes")
+        try:
+            data = device.ctrl_transfer(0xA1, USB_GET_DEVICE_ID, config, (interface << 8) | alt, USB_DEVICE_ID_LENGTH, timeout)
+        except Exception:
+            swallowed("usb.device_id")
+            continue
+        if len(data) > 2:
+            length = min(len(data), (data[0] << 8) | data[1])
+            device_id = bytes(data[2:length]).decode("latin-1", "replace").strip("\x00 ")
+            if device_id:
+                return device_id
+    return None
+
+def read_sysfs_device_ids(pattern=USB_SYSFS_DEVICE_IDS):
+    # إذا كان usblp يملك الواجهة يرفض لينكس طلبات التحكم، لكن النواة تعرض المعرف نفسه هنا
+    import glob
+    ids = {}
+    for path in glob.glob(pattern):
+        usb_device = os.path.dirname(os.path.dirname(os.path.realpath(path)))
+        try:
+            with open(path, encoding="latin-1") as f:
+                device_id = f.read().strip()
+            with open(os.path.join(usb_device, "busnum")) as f:
+                bus = int(f.read())
+            with open(os.path.join(usb_device, "devnum")) as f:
+                address = int(f.read())
+        except (OSError, ValueError):
+            continue
+        if device_id:
+            ids[(bus, address)] = device_id
+    return ids
+
+def usb_printer_record(device, interfaces, sysfs_ids=None, timeout=USB_TIMEOUT):
+    vid, pid = getattr(device, 'idVendor', 0), getattr(device, 'idProduct', 0)
+    device_id = (sysfs_ids or {}).get((getattr(device, 'bus', None), getattr(device, 'address', None)))
+    device_id = device_id or read_usb_device_id(device, interfaces, timeout)
+    model = model_from_device_id(device_id)
+    try:
+        device.default_timeout = timeout
+    except Exception:
+        swallowed("usb.timeout")
+    printer_name = model or get_printer_name_from_usb(device)
+    search_q = f"{printer_name} printer driver"
+    record = {
+        "printer_name": printer_name,
+        "driver_name": f"{printer_name} Driver",
+        "driver_id": f"{hex(vid)}:{hex(pid)}",
+        "download_url": f"https://www.google.com/search?q={search_q.replace(' ', '+')}",
+        "type": "usb"
+    }
+    if model:
+        record["model"] = model
+        record["device_id"] = device_id
+    serial = safe_usb_string(device, getattr(device, 'iSerialNumber', 0))
+    if serial:
+        record["serial"] = serial
+    return record
+
+class USBPrinterRegistry:
+    # الأجهزة تفحص مرة واحدة لكل (ناقل، عنوان، VID، PID)؛ البحث المتكرر لا يرسل أي طلب USB
+    # مراقب التوصيل udev (إن وجد) يبقي القائمة محدثة في الخلفية، وبدونه يعاد التعداد عند كل بحث فقط
+    def __init__(self, timeout=USB_TIMEOUT):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.refreshing = threading.Lock()
+        self.devices = {}  # key -> record أو None لغير الطابعات
+        self.dirty = True
+        self.watcher = None
+
+    @staticmethod
+    def device_key(device):
+        return (getattr(device, 'bus', None), getattr(device, 'address', None), getattr(device, 'idVendor', 0), getattr(device, 'idProduct', 0))
+
+    def refresh(self):
+        with self.refreshing:
+            return self.rescan()
+
+    def rescan(self):
+        try:
+            import usb.core
+            devices = list(usb.core.find(find_all=True))
+        except Exception:
+            swallowed("usb.enumerate")
+            return self.printers()
+        with self.lock:
+            known = dict(self.devices)
+            self.dirty = False
+        current = {}
+        sysfs_ids = None
+        for device in devices:
+            key = self.device_key(device)
+            if key in known:
+                current[key] = known[key]
+                continue
+            interfaces = usb_printer_interfaces(device)
+            if not interfaces:
+                current[key] = None
+                continue
+            if sysfs_ids is None:
+                sysfs_ids = read_sysfs_device_ids()
+            try:
+                current[key] = usb_printer_record(device, interfaces, sysfs_ids, self.timeout)
+            except Exception:
+                swallowed("usb.record")
+                continue
+        with self.lock:
+            self.devices = current
+        return self.printers()
+
+    def printers(self):
+        with self.lock:
+            records = [r for r in self.devices.values() if r]
+        seen = set()
+        unique = []
+        for record in records:
+            if (record["printer_name"], record["driver_id"]) not in seen:
+                seen.add((record["printer_name"], record["driver_id"]))
+                unique.append(record)
+        return unique
+
+    def find(self):
+        if self.watcher is None:
+            self.watch()
+        with self.lock:
+            dirty = self.dirty or not self.watcher
+        return self.refresh() if dirty else self.printers()
+
+    def watch(self):
+        # udev يبلغ عن التوصيل والفصل فوراً؛ بدونه لا خيط استطلاع بين عمليات البحث، والتعداد وحده لا يلمس الأجهزة المعروفة
+        try:
+            import pyudev
+            context = pyudev.Context()
+            monitor = pyudev.Monitor.from_netlink(context)
+            monitor.filter_by(subsystem="usb", device_type="usb_device")
+            self.watcher = pyudev.MonitorObserver(monitor, lambda action, device: self.refresh(), name="usb-hotplug", daemon=True)
+            self.watcher.start()
+        except Exception:
+            swallowed("usb.hotplug")
+            self.watcher = False
+
+_usb_registry = None
+_usb_registry_lock = threading.Lock()
+
+def usb_registry():
+    global _usb_registry
+    with _usb_registry_lock:
+        if _usb_registry is None:
+            _usb_registry = USBPrinterRegistry()
+        return _usb_registry
+
+def find_usb_printers_safe():
+    # pyusb يحمل عند أول فحص USB فقط، ويصبح اختيارياً مثل zeroconf
+    try:
+        import usb.core
+    except ImportError:
+        return []
+    return usb_registry().find()
+
+DEFAULT_TARGETS = "192.168.1.0/24"
+MAX_SCAN_HOSTS = 1 << 18
+SCAN_CHUNK_SIZE = 1024
+
+class TargetSet:
+    # قائمة نطاقات IPv4 بصيغة CIDR أو a-b أو عنوان مفرد، تولد العناوين عند الحاجة فقط
+    def __init__(self, spec=DEFAULT_TARGETS):
+        self.spec = spec.strip()
+        ranges = []
+        for item in re.split(r"[,;\s]+", self.spec):
+            if item:
+                ranges.append(self.parse_item(item))
+        if not ranges:
+            raise ValueError("Empty IP range")
+        ranges.sort()
+        merged = [list(ranges[0])]
+        for first, last in ranges[1:]:
+            if first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        self.ranges = [tuple(r) for r in merged]
+        if len(self) > MAX_SCAN_HOSTS:
+            raise ValueError("IP range too large")
+
+    @staticmethod
+    def parse_item(item):
+        if "/" in item:
+            net = ipaddress.IPv4Network(item, strict=False)
+            first, last = int(net.network_address), int(net.broadcast_address)
+            if net.prefixlen < 31:
+                first, last = first + 1, last - 1
+            return first, last
+        if "-" in item:
+            start, end = item.split("-", 1)
+            first = ipaddress.IPv4Address(start.strip())
+            end = end.strip()
+            if "." not in end:
+                end = str(first).rsplit(".", 1)[0] + "." + end
+            first, last = int(first), int(ipaddress.IPv4Address(end))
+            return min(first, last), max(first, last)
+        addr = int(ipaddress.IPv4Address(item))
+        return addr, addr
+
+    def __len__(self):
+        return sum(last - first + 1 for first, last in self.ranges)
+
+    def __iter__(self):
+        for first, last in self.ranges:
+            for n in range(first, last + 1):
+                yield str(ipaddress.IPv4Address(n))
+
+    def __contains__(self, ip):
+        try:
+            n = int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return False
+        return any(first <= n <= last for first, last in self.ranges)
+
+    def __str__(self):
+        return self.spec
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        # None بدل مجموعة فارغة، لأن النطاق الفارغ ليس هدفاً صالحاً
+        merged = []
+        for first, last in sorted(r for r in ranges if r[0] <= r[1]):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        items = [str(ipaddress.IPv4Address(first)) if first == last else
+                 f"{ipaddress.IPv4Address(first)}-{ipaddress.IPv4Address(last)}" for first, last in merged]
+        return cls(",".join(items)) if items else None
+
+    def intersection(self, other):
+        return self.from_ranges([(max(a, c), min(b, d)) for a, b in self.ranges for c, d in other.ranges if max(a, c) <= min(b, d)])
+
+    def difference(self, other):
+        ranges = []
+        for first, last in self.ranges:
+            for c, d in other.ranges:
+                if d < first or c > last:
+                    continue
+                if c > first:
+                    ranges.append((first, c - 1))
+                first = d + 1
+                if first > last:
+                    break
+            if first <= last:
+                ranges.append((first, last))
+        return self.from_ranges(ranges)
+
+    def subnets(self, prefix=24):
+        # قطع بحدود الشبكات الفرعية، مثلاً /24، لتوزيع الفحص على الوكلاء أو على دورات المراقبة
+        size = 1 << (32 - prefix)
+        for first, last in self.ranges:
+            while first <= last:
+                end = min(last, (first // size + 1) * size - 1)
+                yield self.from_ranges([(first, end)])
+                first = end + 1
+
+class CancelToken:
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def wait(self, timeout):
+        return self.event.wait(timeout)
+
+async def for_each_bounded(items, worker, limit=SCAN_CHUNK_SIZE, cancel=None):
+    # لا يوجد أكثر من limit مهمة في نفس الوقت مهما كان حجم النطاق
+    # خطأ مهمة لا يوقف الباقي، لكنه يقرأ ويحسب في الإحصاءات بدل "Task exception was never retrieved"
+    where = f"bounded.{getattr(worker, '__name__', 'worker')}"
+    async def reap(tasks):
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                swallowed(where)
+    pending = set()
+    for item in items:
+        if cancel and cancel.cancelled:
+            break
+        if len(pending) >= limit:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            await reap(done)
+        pending.add(asyncio.ensure_future(worker(item)))
+    while pending and not (cancel and cancel.cancelled):
+        done, pending = await asyncio.wait(pending, timeout=0.1)
+        await reap(done)
+    # عند الإلغاء لا ننتظر المهلات المتبقية
+    for task in pending:
+        task.cancel()
+    if pending:
+        await reap(pending)
+
+class ProgressCounter:
+    def __init__(self, total, emit=None):
+        self.total = total
+        self.emit = emit or (lambda value: None)
+        self.done = 0
+        self.last = -1
+        if not total:
+            self.emit(100)
+
+    def step(self):
+        self.done += 1
+        value = int(self.done / self.total * 100)
+        if value != self.last:
+            self.last = value
+            self.emit(value)
+
+SCANNERS = {}
+SCANNER_PLUGINS_ENV = "PRINTER_SCANNER_PLUGINS"
+
+def register_scanner(cls):
+    # الماسحات المدمجة والإضافات تسجل بنفس الطريقة، و ScanJob يشغل أي اسم مسجل
+    SCANNERS[cls.name] = cls
+    return cls
+
+def scanner_class(name):
+    return SCANNERS[name]
+
+def uses_targets(name):
+    # ماسحات العناوين نطاقها في المخزن وفي مقارنة اللقطات هو الأهداف المفحوصة
+    cls = SCANNERS.get(name)
+    return bool(cls and cls.needs_hosts)
+
+def load_scanner_plugins(modules=()):
+    # وحدة الإضافة تسجل ماسحها عند الاستيراد: @register_scanner class MyScanner(Scanner)
+    names = list(modules) + [name.strip() for name in os.environ.get(SCANNER_PLUGINS_ENV, "").split(",") if name.strip()]
+    for name in names:
+        importlib.import_module(name)
+    return sorted(SCANNERS)
+
+class Scanner(abc.ABC):
+    # واجهة موحدة لطرق الاكتشاف: scan() يعيد القائمة ويبث كل جهاز عبر emit،
+    # و async for يعطي السجلات كما تصل، و cancel() و stats() متاحة لكل الماسحات
+    name = None
+    needs_hosts = False  # يفحص فقط الأجهزة الحية التي وجدها HostDiscovery داخل الأهداف
+    streaming = True  # يبث النتائج أثناء الفحص؛ غيره تبث نتائجه دفعة واحدة عند انتهائه
+
+    def __init__(self, targets=None, cancel=None, on_found=None, on_progress=None):
+        self.targets = targets
+        self.token = cancel or CancelToken()
+        self.on_found = on_found
+        self.on_progress = on_progress
+        self.sinks = []
+        self.started = None
+        self.finished = None
+        self.first_result = None
+        self.found = 0
+
+    @classmethod
+    def job_options(cls, scheduler, generation, known_models=None):
+        # خيارات الماسح من المجدول عند تشغيله ضمن ScanJob (حد الحزم، التوازي، مقدر RTT)
+        return {}
+
+    @abc.abstractmethod
+    def scan(self):
+        # يعيد قائمة السجلات؛ الماسح المتدفق يبث كل سجل عبر emit عند وصوله
+        ...
+
+    def emit(self, p):
+        if self.first_result is None:
+            self.first_result = time.time()
+        self.found += 1
+        if self.on_found:
+            self.on_found(p)
+        for sink in list(self.sinks):
+            sink(p)
+
+    def run(self):
+        self.started = time.time()
+        try:
+            printers = self.scan()
+            if not self.streaming and not self.token.cancelled:
+                for p in printers:
+                    self.emit(p)
+            return printers
+        finally:
+            self.finished = time.time()
+
+    def cancel(self):
+        self.token.cancel()
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    def stats(self):
+        started = self.started
+        end = self.finished or time.time()
+        return {"name": self.name, "targets": len(self.targets) if self.targets is not None else None, "found": self.found,
+                "seconds": round(end - started, 4) if started else None,
+                "first_result": round(self.first_result - started, 4) if started and self.first_result else None,
+                "cancelled": self.cancelled}
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        # الفحص نفسه يعمل في خيط (الماسحات تشغل حلقة asyncio خاصة بها)، والسجلات تعبر إلى هذه الحلقة عبر طابور
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        end = object()
+        def sink(p):
+            loop.call_soon_threadsafe(queue.put_nowait, p)
+        self.sinks.append(sink)
+        future = loop.run_in_executor(None, self.run)
+        future.add_done_callback(lambda f: queue.put_nowait(end))
+        try:
+            while True:
+                p = await queue.get()
+                if p is end:
+                    break
+                yield p
+            future.result()
+        finally:
+            self.sinks.remove(sink)
+            if not future.done():
+                # خروج مبكر من async for يلغي الفحص وينتظر انتهاءه
+                self.cancel()
+                await asyncio.wait([future])
+
+@register_scanner
+class USBScanner(Scanner):
+    name = "usb"
+    streaming = False
+
+    def __init__(self, targets=None, cancel=None, on_found=None, on_progress=None, registry=None):
+        super().__init__(targets, cancel, on_found, on_progress)
+        self.registry = registry
+
+    def scan(self):
+        if self.token.cancelled:
+            return []
+        printers = self.registry.find() if self.registry else find_usb_printers_safe()
+        if self.on_progress:
+            self.on_progress(100)
+        return printers
+
+class RateLimiter:
+    # دلو رموز مشترك بين الخيوط؛ rate=None يعني بدون حد
+    def __init__(self, rate=None, burst=None):
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        with self.lock:
+            self.rate = rate
+            self.burst = burst if burst is not None else max(1.0, (rate or 0) / 10)
+
+    def reserve(self, n=1):
+        with self.lock:
+            if not self.rate:
+                return 0.0
+            now = time.monotonic()
+            self.next_time = max(self.next_time, now - self.burst / self.rate)
+            at = self.next_time
+            self.next_time += n / self.rate
+            return max(0.0, at - now)
+
+    async def acquire(self, n=1):
+        delay = self.reserve(n)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+RTT_ALPHA = 1 / 8  # RFC 6298
+RTT_BETA = 1 / 4
+RTT_K = 4
+RTT_GRANULARITY = 0.001
+RTT_PREFIX = 24  # كل شبكة /24 لها تقدير مستقل؛ رابط VPN بطيء لا يبطئ الشبكة المحلية
+RTT_POLL = 0.02
+RTT_SLOW_LINK = 0.05  # SRTT أعلى من هذا يعني رابطاً بطيئاً (VPN أو WAN)
+RTT_LOSSY = 0.1
+RTT_MAX_RETRIES = 3
+
+class SubnetRTT:
+    # تقدير RFC 6298 لشبكة واحدة: RTO = SRTT + max(G, K*RTTVAR) بين حد أدنى وأعلى
+    # المحاولات الإضافية تزيد مع بطء الرابط ومع نسبة الردود التي لم تصل إلا بعد إعادة الإرسال
+    def __init__(self, initial, min_rto, max_rto, retries):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.base_retries = retries
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial
+        self.answered = 0
+        self.recovered = 0
+
+    def sample(self, rtt, attempt=0):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+        self.rto = min(self.max_rto, max(self.min_rto, self.srtt + max(RTT_GRANULARITY, RTT_K * self.rttvar)))
+        self.answered += 1
+        if attempt:
+            self.recovered += 1
+
+    def retries(self):
+        if self.srtt is None:
+            return self.base_retries
+        loss = self.recovered / self.answered
+        extra = (self.srtt > RTT_SLOW_LINK) + (loss > 0) + (loss > RTT_LOSSY)
+        return min(RTT_MAX_RETRIES, self.base_retries + extra)
+
+class RTTEstimator:
+    # مقدر مشترك بين الخيوط لكل نوع من الطلبات (اتصال TCP أو SNMP)، ويبقى بين عمليات البحث
+    def __init__(self, initial, min_rto, max_rto, retries=0, prefix=RTT_PREFIX):
+        self.initial = initial
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.retries_default = retries
+        self.shift = 32 - prefix
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.subnets = {}
+
+    def subnet(self, ip):
+        try:
+            key = int(ipaddress.IPv4Address(ip)) >> self.shift
+        except ValueError:
+            key = None
+        entry = self.subnets.get(key)
+        if entry is None:
+            with self.lock:
+                entry = self.subnets.setdefault(key, SubnetRTT(self.initial, self.min_rto, self.max_rto, self.retries_default))
+        return entry
+
+    def timeout(self, ip):
+        return self.subnet(ip).rto
+
+    def retries(self, ip):
+        return self.subnet(ip).retries()
+
+    def sampled(self, ip):
+        return self.subnet(ip).srtt is not None
+
+    def sample(self, ip, rtt, attempt=0):
+        entry = self.subnet(ip)
+        with self.lock:
+            entry.sample(rtt, attempt)
+
+    def stats(self):
+        # المعاملات المختارة لكل شبكة كما تظهر في إحصاءات البحث
+        with self.lock:
+            items = sorted((key, entry) for key, entry in self.subnets.items() if key is not None and entry.answered)
+            return [{"subnet": f"{ipaddress.IPv4Address(key << self.shift)}/{self.prefix}", "samples": entry.answered,
+                     "srtt_ms": round(entry.srtt * 1000, 2), "rttvar_ms": round(entry.rttvar * 1000, 2), "rto_ms": round(entry.rto * 1000, 1),
+                     "retries": entry.retries(), "recovered": entry.recovered} for key, entry in items]
+
+async def wait_rtt(aw, rtt, ip, attempt=0):
+    # المهلة تقرأ من المقدر عند كل استيقاظ، فالطلبات التي بدأت قبل أول رد من الشبكة تقصر مهلتها فور وصوله
+    # كل محاولة اتصال أو طلب SNMP جديد مستقل بمعرفه، فلا غموض في نسبة الرد لمحاولة بعينها (قاعدة Karn)
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(aw)
+    start = loop.time()
+    done = ()
+    try:
+        while True:
+            remaining = rtt.timeout(ip) - (loop.time() - start)
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            step = remaining if rtt.sampled(ip) else min(remaining, RTT_POLL)
+            done, _ = await asyncio.wait((task,), timeout=step)
+            if done:
+                # الرفض (RST) يرسله مكدس النظام فوراً، فلا يقيس زمن الخدمة ولا يحسب عينة
+                if not task.cancelled() and task.exception() is None:
+                    rtt.sample(ip, loop.time() - start, attempt)
+                return task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None and not done:
+            # الإلغاء وصل بعد اكتمال الاتصال مباشرة: يغلق حتى لا يبقى مقبس مفتوح
+            result = task.result()
+            if isinstance(result, tuple) and len(result) == 2 and hasattr(result[1], "close"):
+                result[1].close()
+
+SNMP_PORT = 161
+SNMP_COMMUNITY = "public"
+SNMP_VERSION = 0  # SNMPv1 مثل mpModel=0
+SNMP_TIMEOUT = 1.0  # المهلة الأولى فقط؛ بعد أول رد من الشبكة تحسب من RTT المقاس
+SNMP_RETRIES = 1
+SNMP_RTO_MIN = 0.05  # معالج SNMP في الطابعة أبطأ من مكدس TCP
+SNMP_RTO_MAX = 5.0
+SNMP_CONCURRENCY = 256
+SNMP_OIDS = [
+    ('1.3.6.1.2.1.1.1.0', 'Description'),
+    ('1.3.6.1.2.1.25.3.2.1.3.1', 'Model'),
+    ('1.3.6.1.2.1.43.5.1.1.16.1', 'Product'),
+    ('1.3.6.1.2.1.43.5.1.1.17.1', 'Serial'),  # prtGeneralSerialNumber: هوية ثابتة للجهاز مهما تغير عنوانه
+]
+SNMP_NO_SUCH_NAME = 2
+
+def ber_length(n):
+    if n < 0x80:
+        return bytes([n])
+    out = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(out)]) + out
+
+def ber_tlv(tag, payload):
+    return bytes([tag]) + ber_length(len(payload)) + payload
+
+def ber_int(value):
+    return ber_tlv(0x02, value.to_bytes(max(1, (value.bit_length() + 8) // 8), "big", signed=True))
+
+def ber_oid(oid):
+    parts = [int(x) for x in oid.split(".")]
+    out = bytes([parts[0] * 40 + parts[1]])
+    for part in parts[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        out += bytes(reversed(chunk))
+    return ber_tlv(0x06, out)
+
+def ber_read(data, pos):
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+    return tag, data[pos:pos + length], pos + length
+
+def ber_decode_oid(value):
+    parts = [value[0] // 40, value[0] % 40]
+    n = 0
+    for b in value[1:]:
+        n = (n << 7) | (b & 0x7F)
+        if not b & 0x80:
+            parts.append(n)
+            n = 0
+    return ".".join(str(p) for p in parts)
+
+def build_snmp_get(request_id, oids, community=SNMP_COMMUNITY, version=SNMP_VERSION):
+    # كل المعرفات في طلب GET واحد
+    varbinds = b"".join(ber_tlv(0x30, ber_oid(oid) + b"\x05\x00") for oid in oids)
+    pdu = ber_tlv(0xA0, ber_int(request_id) + ber_int(0) + ber_int(0) + ber_tlv(0x30, varbinds))
+    return ber_tlv(0x30, ber_int(version) + ber_tlv(0x04, community.encode()) + pdu)
+
+def parse_snmp_response(data):
+    _, message, _ = ber_read(data, 0)
+    _, _, pos = ber_read(message, 0)
+    _, _, pos = ber_read(message, pos)
+    tag, pdu, _ = ber_read(message, pos)
+    if tag != 0xA2:
+        raise ValueError("Not a GetResponse PDU")
+    _, request_id, pos = ber_read(pdu, 0)
+    _, error_status, pos = ber_read(pdu, pos)
+    _, error_index, pos = ber_read(pdu, pos)
+    _, varbinds, _ = ber_read(pdu, pos)
+    values = {}
+    pos = 0
+    while pos < len(varbinds):
+        _, varbind, pos = ber_read(varbinds, pos)
+        _, oid, vpos = ber_read(varbind, 0)
+        vtag, value, _ = ber_read(varbind, vpos)
+        oid = ber_decode_oid(oid)
+        if vtag == 0x04:
+            values[oid] = value.decode("utf-8", "replace").strip("\x00 ")
+        elif vtag == 0x06:
+            values[oid] = ber_decode_oid(value)
+        elif vtag == 0x02 or 0x41 <= vtag <= 0x47:
+            values[oid] = str(int.from_bytes(value, "big", signed=vtag == 0x02))
+    return (int.from_bytes(request_id, "big", signed=True), int.from_bytes(error_status, "big"),
+            int.from_bytes(error_index, "big"), values)
+
+class SNMPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, pending):
+        self.pending = pending
+    def datagram_received(self, data, addr):
+        try:
+            request_id, error_status, error_index, values = parse_snmp_response(data)
+        except Exception:
+            swallowed("snmp.parse")
+            return
+        waiter = self.pending.get(request_id)
+        if waiter and waiter[0] == addr[0] and not waiter[1].done():
+            waiter[1].set_result((error_status, error_index, values))
+
+class SNMPClient:
+    # محرك SNMP واحد: مقبس UDP مشترك وطلبات كثيرة في نفس الوقت
+    def __init__(self, community=SNMP_COMMUNITY, timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES,
+                 concurrency=SNMP_CONCURRENCY, version=SNMP_VERSION, port=SNMP_PORT, limiter=None, rtt=None):
+        self.community = community
+        self.limiter = limiter
+        self.rtt = rtt
+        self.timeout = timeout
+        self.retries = retries
+        self.concurrency = concurrency
+        self.version = version
+        self.port = port
+        self.pending = {}
+        self.transport = None
+        self.request_ids = random.randrange(1, 0x3FFFFFFF)
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: SNMPProtocol(self.pending), family=socket.AF_INET)
+        self.sem = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.transport.close()
+
+    def next_request_id(self):
+        self.request_ids = self.request_ids % 0x7FFFFFFF + 1
+        return self.request_ids
+
+    async def request(self, ip, oids):
+        loop = asyncio.get_running_loop()
+        retries = self.rtt.retries(ip) if self.rtt else self.retries
+        for attempt in range(retries + 1):
+            request_id = self.next_request_id()
+            waiter = loop.create_future()
+            self.pending[request_id] = (ip, waiter)
+            try:
+                if self.limiter:
+                    await self.limiter.acquire()
+                count("probes")
+                self.transport.sendto(build_snmp_get(request_id, oids, self.community, self.version), (ip, self.port))
+                if self.rtt:
+                    return await wait_rtt(waiter, self.rtt, ip, attempt)
+                return await asyncio.wait_for(waiter, self.timeout)
+            except asyncio.TimeoutError:
+                count("timeouts")
+                continue
+            except OSError:
+                continue
+            finally:
+                self.pending.pop(request_id, None)
+        return None
+
+    async def get(self, ip, oids=SNMP_OIDS):
+        names = dict(oids)
+        wanted = [oid for oid, _ in oids]
+        async with self.sem:
+            while wanted:
+                reply = await self.request(ip, wanted)
+                if reply is None:
+                    return None
+                error_status, error_index, values = reply
+                # في SNMPv1 معرف واحد غير موجود يفشل الطلب كله، فنحذفه ونعيد الطلب
+                if error_status == SNMP_NO_SUCH_NAME and 1 <= error_index <= len(wanted):
+                    del wanted[error_index - 1]
+                    continue
+                if error_status:
+                    return None
+                info = {names[oid]: value for oid, value in values.items() if oid in names and value}
+                return info or None
+        return None
+
+async def snmp_sweep(ips, oids=SNMP_OIDS, on_result=None, cancel=None, **client_options):
+    async with SNMPClient(**client_options) as client:
+        results = {}
+        async def query(ip):
+            info = await client.get(ip, oids)
+            if info:
+                results[ip] = info
+            if on_result:
+                on_result(ip, info)
+        await for_each_bounded(ips, query, cancel=cancel)
+    return results
+
+def snmp_printer_record(ip, info):
+    record = {
+        "printer_name": info.get('Description', f"SNMP Printer ({ip})"),
+        "driver_name": info.get('Model', "Generic SNMP Printer"),
+        "driver_id": ip,
+        "download_url": f"https://www.google.com/search?q=printer+driver+{ip}",
+        "type": "snmp"
+    }
+    model = info.get('Model') or info.get('Product')
+    if model:
+        record["model"] = model
+    if info.get('Serial'):
+        record["serial"] = info['Serial']
+    return record
+
+@register_scanner
+class SNMPScanner(Scanner):
+    name = "snmp"
+    needs_hosts = True
+
+    def __init__(self, targets, timeout=SNMP_TIMEOUT, concurrency=SNMP_CONCURRENCY, limiter=None, cancel=None, on_found=None, on_progress=None,
+                 rtt=None, port=SNMP_PORT):
+        super().__init__(targets, cancel, on_found, on_progress)
+        self.rtt = rtt
+        self.limiter = limiter
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.port = port
+
+    @classmethod
+    def job_options(cls, scheduler, generation, known_models=None):
+        return {"concurrency": scheduler.concurrency_for(cls.name), "limiter": scheduler.limiter(cls.name, generation),
+                "rtt": scheduler.rtt['snmp']}
+
+    def scan(self):
+        printers = []
+        counter = ProgressCounter(len(self.targets), self.on_progress)
+        def on_result(ip, info):
+            if info:
+                printer = snmp_printer_record(ip, info)
+                printers.append(printer)
+                self.emit(printer)
+            counter.step()
+        try:
+            asyncio.run(snmp_sweep(self.targets, on_result=on_result, cancel=self.token, timeout=self.timeout, concurrency=self.concurrency,
+                                   limiter=self.limiter, rtt=self.rtt, port=self.port))
+        except Exception:
+            swallowed("snmp.sweep")
+        return printers
+
+MDNS_SERVICE_TYPES = {
+    "_ipp._tcp.local.": "ipp",
+    "_ipps._tcp.local.": "ipps",
+    "_pdl-datastream._tcp.local.": "raw",
+    "_printer._tcp.local.": "lpd",
+    "_uscan._tcp.local.": "uscan",
+}
+MDNS_TIMEOUT = 2.0
+MDNS_RESOLVE_TIMEOUT = 3000  # ms
+MDNS_TXT_KEYS = ("ty", "product", "usb_MFG", "usb_MDL", "note", "adminurl")
+
+def decode_txt(properties):
+    txt = {}
+    for key, value in (properties or {}).items():
+        key = key.decode("utf-8", "replace") if isinstance(key, bytes) else str(key)
+        if key in MDNS_TXT_KEYS and value:
+            txt[key] = value.decode("utf-8", "replace").strip() if isinstance(value, bytes) else str(value)
+    return txt
+
+def model_from_txt(txt):
+    # ty هو الاسم المعروض، ثم usb_MFG/MDL كما في معرف IEEE 1284، ثم product بين قوسين
+    if txt.get("ty"):
+        return txt["ty"]
+    if txt.get("usb_MDL"):
+        mfg = txt.get("usb_MFG", "")
+        mdl = txt["usb_MDL"]
+        return mdl if mdl.lower().startswith(mfg.lower()) else f"{mfg} {mdl}".strip()
+    product = txt.get("product", "").strip("()")
+    return product or None
+
+def mdns_printer_record(ip, name, services, txt):
+    model = model_from_txt(txt)
+    record = {
+        "printer_name": model or name,
+        "driver_name": f"{model} Driver" if model else "mDNS Printer",
+        "driver_id": ip,
+        "download_url": f"https://www.google.com/search?q={(model + ' printer driver').replace(' ', '+')}" if model
+                        else f"https://www.google.com/search?q=printer+driver+{ip}",
+        "type": "mdns",
+        "services": sorted(services),
+    }
+    if model:
+        record["model"] = model
+    if txt:
+        record["txt"] = txt
+    return record
+
+def mdns_is_printer(record):
+    # جهاز يعلن _uscan فقط ماسح ضوئي وليس طابعة
+    return bool(record) and record["services"] != ["uscan"]
+
+class MDNSBrowser:
+    # متصفح DNS-SD واحد طويل العمر في خيط خاص بحلقة asyncio؛ يحل الخدمات فور ظهورها
+    # ويحتفظ بسجلات TXT محلولة، فالبحث التالي يقرأ من الذاكرة مباشرة
+    def __init__(self, types=MDNS_SERVICE_TYPES):
+        self.types = dict(types)
+        self.lock = threading.Lock()
+        self.services = {}  # (type, name) -> (ip, instance, txt)
+        self.devices = {}  # ip -> record
+        self.subscribers = set()
+        self.tasks = set()
+        self.loop = None
+        self.aiozc = None
+        self.started = None
+        self.available = True
+
+    def start(self):
+        with self.lock:
+            if self.loop or not self.available:
+                return self.available
+            try:
+                from zeroconf import ServiceStateChange
+                from zeroconf.asyncio import AsyncZeroconf, AsyncServiceBrowser, AsyncServiceInfo
+            except ImportError:
+                self.available = False
+                return False
+            self.ServiceStateChange = ServiceStateChange
+            self.AsyncServiceInfo = AsyncServiceInfo
+            self.loop = asyncio.new_event_loop()
+            self.started = time.monotonic()
+        ready = threading.Event()
+        async def open_browser():
+            self.aiozc = AsyncZeroconf()
+            self.browser = AsyncServiceBrowser(self.aiozc.zeroconf, list(self.types), handlers=[self.on_service_state_change])
+        def run():
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.loop.run_until_complete(open_browser())
+            except Exception:
+                swallowed("mdns.browser")
+                self.available = False
+            ready.set()
+            if self.available:
+                self.loop.run_forever()
+        threading.Thread(target=run, name="mdns", daemon=True).start()
+        ready.wait()
+        return self.available
+
+    def age(self):
+        return time.monotonic() - self.started if self.started else 0.0
+
+    def on_service_state_change(self, zeroconf, service_type, name, state_change):
+        # يعمل داخل حلقة المتصفح؛ الحل غير متزامن حتى لا تتوقف بقية الخدمات
+        if state_change is self.ServiceStateChange.Removed:
+            self.forget(service_type, name)
+            return
+        task = self.loop.create_task(self.resolve(service_type, name))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def resolve(self, service_type, name):
+        info = self.AsyncServiceInfo(service_type, name)
+        try:
+            if not await info.async_request(self.aiozc.zeroconf, MDNS_RESOLVE_TIMEOUT):
+                return
+        except Exception:
+            swallowed("mdns.resolve")
+            return
+        addresses = info.parsed_addresses()
+        ipv4 = [a for a in addresses if ":" not in a]
+        if not (ipv4 or addresses):
+            return
+        ip = (ipv4 or addresses)[0]
+        instance = name[:-len(service_type) - 1] if name.endswith("." + service_type) else name
+        with self.lock:
+            self.services[(service_type, name)] = (ip, instance, decode_txt(info.properties))
+            record = self.rebuild(ip)
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            callback(record)
+
+    def rebuild(self, ip):
+        # طابعة واحدة تعلن عدة خدمات؛ تدمج في سجل واحد لكل عنوان
+        services, instance, txt = [], None, {}
+        for (service_type, name), (addr, inst, service_txt) in self.services.items():
+            if addr == ip:
+                services.append(self.types.get(service_type, service_type))
+                instance = instance or inst
+                for key, value in service_txt.items():
+                    txt.setdefault(key, value)
+        if not services:
+            self.devices.pop(ip, None)
+            return None
+        record = self.devices[ip] = mdns_printer_record(ip, instance, services, txt)
+        return record
+
+    def forget(self, service_type, name):
+        with self.lock:
+            entry = self.services.pop((service_type, name), None)
+            if entry:
+                self.rebuild(entry[0])
+
+    def snapshot(self):
+        with self.lock:
+            return [r for r in self.devices.values() if mdns_is_printer(r)]
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.add(callback)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.subscribers.discard(callback)
+
+    def close(self):
+        with self.lock:
+            loop, self.loop = self.loop, None
+        if not loop:
+            return
+        async def shutdown():
+            await self.browser.async_cancel()
+            await self.aiozc.async_close()
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result(2)
+        except Exception:
+            swallowed("mdns.close")
+        loop.call_soon_threadsafe(loop.stop)
+
+_mdns_browser = None
+_mdns_browser_lock = threading.Lock()
+
+def mdns_browser():
+    global _mdns_browser
+    with _mdns_browser_lock:
+        if _mdns_browser is None:
+            _mdns_browser = MDNSBrowser()
+        return _mdns_browser
+
+def mdns_search(timeout=MDNS_TIMEOUT, cancel=None, on_found=None):
+    # المتصفح يبقى يعمل بين عمليات البحث؛ إذا مضى عليه timeout تعاد النتائج الموجودة فوراً
+    browser = mdns_browser()
+    if not browser.start():
+        return []
+    found = {}
+    def on_record(record):
+        if mdns_is_printer(record) and not (cancel and cancel.cancelled) and record != found.get(record["driver_id"]):
+            found[record["driver_id"]] = record
+            if on_found:
+                on_found(record)
+    browser.subscribe(on_record)
+    try:
+        for record in browser.snapshot():
+            on_record(record)
+        remaining = timeout - browser.age()
+        if remaining > 0:
+            if cancel:
+                cancel.wait(remaining)
+            else:
+                time.sleep(remaining)
+    finally:
+        browser.unsubscribe(on_record)
+    return browser.snapshot()
+
+@register_scanner
+class MDNSScanner(Scanner):
+    name = "mdns"
+
+    def __init__(self, targets=None, cancel=None, on_found=None, on_progress=None, timeout=MDNS_TIMEOUT):
+        super().__init__(targets, cancel, on_found, on_progress)
+        self.timeout = timeout
+
+    def scan(self):
+        printers = mdns_search(timeout=self.timeout, cancel=self.token, on_found=self.emit)
+        if self.on_progress:
+            self.on_progress(100)
+        return printers
+
+NETWORK_PORT = 9100
+NETWORK_TIMEOUT = 0.12  # مهلة ثابتة لمن لا يمرر مقدر RTT
+TCP_RTO_INITIAL = 0.3  # تكفي لرابط VPN بحدود 150 ms حتى يصل أول رد؛ 1s في RFC 6298 طويلة لعناوين أغلبها فارغ
+TCP_RTO_MIN = 0.1  # قرب المهلة الثابتة القديمة: تحت الحمل يتأخر رد الطابعة أكثر بكثير من SRTT الهادئ
+TCP_RETRIES = 1  # محاولة إعادة واحدة على الأقل قبل اعتبار العنوان ميتاً
+TCP_RTO_MAX = 3.0
+NETWORK_CONCURRENCY = 256
+FINGERPRINT_TIMEOUT = 1.0
+IPP_PORT = 631
+IPP_PATH = "/ipp/print"
+PRINTER_PORTS = {9100: "raw", 631: "ipp", 515: "lpd", 80: "http", 443: "https"}
+# المنافذ التي تدل وحدها على وجود طابعة، أما 80/443 فهي معلومات إضافية فقط
+PRINT_SERVICE_PORTS = (9100, 631, 515)
+PJL_INFO_ID = b"\x1b%-12345X@PJL INFO ID\r\n\x1b%-12345X\r\n"
+
+async def tcp_connect(ip, port, timeout):
+    count("probes")
+    try:
+        return await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except asyncio.TimeoutError:
+        count("timeouts")
+        return None
+    except OSError:
+        return None
+
+async def close_stream(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        swallowed("tcp.close")
+
+async def tcp_connect_rtt(ip, port, rtt, limiter=None):
+    # مثل tcp_connect لكن المهلة وعدد المحاولات من مقدر RTT؛ الرفض الصريح (RST) لا يعاد
+    for attempt in range(rtt.retries(ip) + 1):
+        if limiter:
+            await limiter.acquire()
+        count("probes")
+        try:
+            return await wait_rtt(asyncio.open_connection(ip, port), rtt, ip, attempt)
+        except asyncio.TimeoutError:
+            count("timeouts")
+            continue
+        except OSError:
+            return None
+    return None
+
+async def tcp_probe(ip, port, timeout):
+    conn = await tcp_connect(ip, port, timeout)
+    if conn is None:
+        return False
+    await close_stream(conn[1])
+    return True
+
+async def tcp_sweep(ips, port=NETWORK_PORT, timeout=NETWORK_TIMEOUT, concurrency=NETWORK_CONCURRENCY, on_result=None, limiter=None, cancel=None,
+                    rtt=None):
+    # يفحص كل العناوين بالتوازي مع حد أقصى للاتصالات المفتوحة
+    sem = asyncio.Semaphore(concurrency)
+    found = []
+    async def probe(ip):
+        async with sem:
+            if rtt:
+                conn = await tcp_connect_rtt(ip, port, rtt, limiter)
+                ok = conn is not None
+                if ok:
+                    await close_stream(conn[1])
+            else:
+                if limiter:
+                    await limiter.acquire()
+                ok = await tcp_probe(ip, port, timeout)
+        if ok:
+            found.append(ip)
+        if on_result:
+            on_result(ip, ok)
+    await for_each_bounded(ips, probe, cancel=cancel)
+    return found
+
+def parse_ieee1284_id(device_id):
+    fields = {}
+    for part in (device_id or "").split(";"):
+        if ":" not in part:
+            continue
+        key, value = part.split(":", 1)
+        key = key.strip().upper()
+        key = {"MANUFACTURER": "MFG", "MODEL": "MDL", "COMMAND SET": "CMD", "DESCRIPTION": "DES"}.get(key, key)
+        fields.setdefault(key, value.strip())
+    return fields
+
+def model_from_device_id(device_id):
+    fields = parse_ieee1284_id(device_id)
+    mfg = fields.get("MFG", "")
+    mdl = fields.get("MDL", "")
+    if not mdl:
+        return None
+    if mfg and not mdl.lower().startswith(mfg.lower()):
+        return f"{mfg} {mdl}"
+    return mdl
+
+def parse_pjl_id(data):
+    text = data.decode("latin-1", "replace").replace("\r", "\n")
+    for line in text.split("\n"):
+        line = line.strip().strip("\x0c").strip()
+        if not line or line.upper().startswith("@PJL") or line.startswith("\x1b"):
+            continue
+        return line.strip('"').strip() or None
+    return None
+
+async def pjl_info_id(reader, writer, timeout=FINGERPRINT_TIMEOUT):
+    writer.write(PJL_INFO_ID)
+    await writer.drain()
+    try:
+        # رد PJL ينتهي بحرف FF
+        data = await asyncio.wait_for(reader.readuntil(b"\x0c"), timeout)
+    except asyncio.IncompleteReadError as e:
+        data = e.partial
+    except (asyncio.LimitOverrunError, asyncio.TimeoutError, OSError):
+        return None
+    return parse_pjl_id(data)
+
+def ipp_attribute(tag, name, value):
+    return struct.pack(">BH", tag, len(name)) + name + struct.pack(">H", len(value)) + value
+
+def build_ipp_get_printer_attributes(uri):
+    # IPP/1.1 Get-Printer-Attributes (0x000B) بطلب خاصيتين فقط
+    body = struct.pack(">BBHI", 1, 1, 0x000B, 1) + b"\x01"
+    body += ipp_attribute(0x47, b"attributes-charset", b"utf-8")
+    body += ipp_attribute(0x48, b"attributes-natural-language", b"en")
+    body += ipp_attribute(0x45, b"printer-uri", uri.encode())
+    body += ipp_attribute(0x44, b"requested-attributes", b"printer-make-and-model")
+    body += ipp_attribute(0x44, b"", b"printer-device-id")
+    return body + b"\x03"
+
+def parse_ipp_attributes(data):
+    attrs = {}
+    pos = 8
+    name = None
+    try:
+        while pos < len(data):
+            tag = data[pos]
+            pos += 1
+            if tag == 0x03:
+                break
+            if tag < 0x10:
+                continue
+            name_len = struct.unpack_from(">H", data, pos)[0]
+            pos += 2
+            raw_name = data[pos:pos + name_len]
+            pos += name_len
+            value_len = struct.unpack_from(">H", data, pos)[0]
+            pos += 2
+            value = data[pos:pos + value_len]
+            pos += value_len
+            if name_len:
+                name = raw_name.decode("utf-8", "replace")
+            if name and name not in attrs and 0x41 <= tag <= 0x49:
+                attrs[name] = value.decode("utf-8", "replace")
+    except struct.error:
+        pass
+    return attrs
+
+def dechunk_http_body(body):
+    out = b""
+    while body:
+        size_line, _, rest = body.partition(b"\r\n")
+        try:
+            size = int(size_line.split(b";")[0].strip() or b"0", 16)
+        except ValueError:
+            break
+        if size == 0:
+            break
+        out += rest[:size]
+        body = rest[size + 2:]
+    return out
+
+async def ipp_get_printer_attributes(ip, port=IPP_PORT, timeout=FINGERPRINT_TIMEOUT, path=IPP_PATH):
+    conn = await tcp_connect(ip, port, timeout)
+    if conn is None:
+        return {}
+    reader, writer = conn
+    try:
+        body = build_ipp_get_printer_attributes(f"ipp://{ip}:{port}{path}")
+        head = (f"POST {path} HTTP/1.1\r\nHost: {ip}:{port}\r\nContent-Type: application/ipp\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode()
+        writer.write(head + body)
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return {}
+    finally:
+        await close_stream(writer)
+    headers, _, payload = raw.partition(b"\r\n\r\n")
+    status = headers.split(b"\r\n", 1)[0].split()
+    if len(status) < 2 or status[1] != b"200":
+        return {}
+    if b"chunked" in headers.lower():
+        payload = dechunk_http_body(payload)
+    return parse_ipp_attributes(payload)
+
+async def fingerprint_printer(ip, open_ports, raw=None, timeout=FINGERPRINT_TIMEOUT):
+    # استعلام خفيف على الأجهزة الحية فقط لمعرفة الموديل الحقيقي
+    model = None
+    if IPP_PORT in open_ports:
+        attrs = await ipp_get_printer_attributes(ip, IPP_PORT, timeout)
+        model = attrs.get("printer-make-and-model") or model_from_device_id(attrs.get("printer-device-id"))
+    if raw:
+        reader, writer = raw
+        if not model:
+            try:
+                model = await pjl_info_id(reader, writer, timeout)
+            except Exception:
+                swallowed("network.pjl")
+        await close_stream(writer)
+    return model
+
+async def printer_sweep(ips, ports=tuple(PRINTER_PORTS), timeout=NETWORK_TIMEOUT, concurrency=NETWORK_CONCURRENCY,
+                        fingerprint=True, on_result=None, limiter=None, known_models=None, cancel=None, rtt=None):
+    # فحص واحد لكل المنافذ لكل عنوان، ونتيجة واحدة لكل IP
+    known_models = known_models or {}
+    sem = asyncio.Semaphore(concurrency)
+    async def connect(ip, port):
+        async with sem:
+            if rtt:
+                return await tcp_connect_rtt(ip, port, rtt, limiter)
+            if limiter:
+                await limiter.acquire()
+            return await tcp_connect(ip, port, timeout)
+    async def scan_host(ip):
+        conns = await asyncio.gather(*(connect(ip, port) for port in ports))
+        open_ports = [port for port, conn in zip(ports, conns) if conn]
+        raw = None
+        for port, conn in zip(ports, conns):
+            if conn is None:
+                continue
+            if port == NETWORK_PORT and fingerprint and ip not in known_models:
+                raw = conn
+            else:
+                await close_stream(conn[1])
+        record = None
+        if any(port in PRINT_SERVICE_PORTS for port in open_ports):
+            model = known_models.get(ip)
+            if model is None and fingerprint:
+                model = await fingerprint_printer(ip, open_ports, raw)
+            record = network_printer_record(ip, open_ports, model)
+        elif raw:
+            await close_stream(raw[1])
+        if record:
+            found.append(record)
+        if on_result:
+            on_result(ip, record)
+    found = []
+    await for_each_bounded(ips, scan_host, cancel=cancel)
+    return found
+
+DISCOVERY_PORTS = (9100, 631, 515, 80, 443, 22, 139, 445)
+ARP_TABLE = "/proc/net/arp"
+
+async def tcp_alive(ip, port, timeout, rtt=None, attempt=0):
+    # رفض الاتصال (RST) يعني أن الجهاز موجود
+    count("probes")
+    try:
+        if rtt:
+            reader, writer = await wait_rtt(asyncio.open_connection(ip, port), rtt, ip, attempt)
+        else:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except ConnectionRefusedError:
+        return True
+    except asyncio.TimeoutError:
+        count("timeouts")
+        return False
+    except OSError:
+        return False
+    await close_stream(writer)
+    return True
+
+def normalize_mac(mac):
+    return ":".join(part.zfill(2) for part in re.split(r"[-:]", mac)).lower()
+
+def read_neighbor_table(path=ARP_TABLE):
+    table = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 4 and fields[2] != "0x0" and fields[3] != "00:00:00:00:00:00":
+                    table[fields[0]] = fields[3].lower()
+        return table
+    except OSError:
+        pass
+    # ويندوز و macOS: لا يوجد /proc فنقرأ ناتج arp -a
+    try:
+        out = subprocess.run(["arp", "-a"], capture_output=True, text=True, timeout=5).stdout
+    except Exception:
+        swallowed("discovery.arp")
+        return table
+    for ip, mac in re.findall(r"\(?(\d+\.\d+\.\d+\.\d+)\)?\s+(?:at\s+)?([0-9a-fA-F]{1,2}(?:[-:][0-9a-fA-F]{1,2}){5})", out):
+        mac = normalize_mac(mac)
+        if mac not in ("ff:ff:ff:ff:ff:ff", "00:00:00:00:00:00"):
+            table[ip] = mac
+    return table
+
+async def discover_live_hosts(ips, ports=DISCOVERY_PORTS, timeout=NETWORK_TIMEOUT, concurrency=NETWORK_CONCURRENCY, on_result=None, limiter=None,
+                              cancel=None, rtt=None):
+    # مرحلة اكتشاف واحدة لكل بحث: دفعة اتصالات على منافذ شائعة ثم جدول ARP
+    sem = asyncio.Semaphore(concurrency)
+    async def probe(ip, port, attempt):
+        async with sem:
+            if limiter:
+                await limiter.acquire()
+            return await tcp_alive(ip, port, timeout, rtt, attempt)
+    async def check(ip):
+        # جولة إعادة فقط للعناوين الصامتة، وفقط إذا كانت شبكتها بطيئة أو فيها فقد
+        alive = False
+        for attempt in range((rtt.retries(ip) if rtt else 0) + 1):
+            tasks = [asyncio.ensure_future(probe(ip, port, attempt)) for port in ports]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    if await next_done:
+                        alive = True
+                        break
+            finally:
+                for task in tasks:
+                    task.cancel()
+            if alive:
+                break
+        if alive:
+            responded.add(ip)
+        if on_result:
+            on_result(ip, alive)
+    responded = set()
+    await for_each_bounded(ips, check, cancel=cancel)
+    # الأجهزة التي ردت على ARP حتى لو كانت منافذ TCP مغلقة بجدار حماية
+    neighbors = read_neighbor_table()
+    live = [ip for ip in ips if ip in responded or ip in neighbors]
+    return live, {ip: neighbors[ip] for ip in live if ip in neighbors}
+
+class HostDiscovery:
+    def __init__(self, targets, ports=DISCOVERY_PORTS, timeout=NETWORK_TIMEOUT, concurrency=NETWORK_CONCURRENCY, limiter=None, cancel=None,
+                 on_progress=None, rtt=None):
+        self.targets = targets
+        self.rtt = rtt
+        self.on_progress = on_progress
+        self.limiter = limiter
+        self.cancel = cancel
+        self.ports = tuple(ports)
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.macs = {}
+
+    def scan(self):
+        counter = ProgressCounter(len(self.targets), self.on_progress)
+        def on_result(ip, alive):
+            counter.step()
+        # خطأ هنا يصل إلى ScanJob فتنتهي البروتوكولات التي تنتظره بلا نتائج، بدل فحص كل الأهداف بلا تصفية
+        live, self.macs = asyncio.run(discover_live_hosts(self.targets, self.ports, self.timeout, self.concurrency, on_result, self.limiter,
+                                                        self.cancel, self.rtt))
+        return live
+
+def network_printer_record(ip, ports=(NETWORK_PORT,), model=None):
+    if model:
+        printer_name = model
+        driver_name = f"{model} Driver"
+        download_url = f"https://www.google.com/search?q={(model + ' printer driver').replace(' ', '+')}"
+    else:
+        printer_name = f"Network Printer ({ip})"
+        driver_name = f"Generic Network Printer Driver"
+        download_url = f"https://www.google.com/search?q=network+printer+driver+{ip}"
+    record = {
+        "printer_name": printer_name,
+        "driver_name": driver_name,
+        "driver_id": ip,
+        "download_url": download_url,
+        "type": "network",
+        "ports": sorted(ports),
+        "protocols": [PRINTER_PORTS.get(port, str(port)) for port in sorted(ports)],
+    }
+    if model:
+        record["model"] = model
+    return record
+
+@register_scanner
+class NetworkScanner(Scanner):
+    name = "network"
+    needs_hosts = True
+
+    def __init__(self, targets, ports=tuple(PRINTER_PORTS), timeout=NETWORK_TIMEOUT, concurrency=NETWORK_CONCURRENCY, fingerprint=True, limiter=None,
+                 known_models=None, cancel=None, on_found=None, on_progress=None, rtt=None):
+        super().__init__(targets, cancel, on_found, on_progress)
+        self.rtt = rtt
+        self.limiter = limiter
+        self.known_models = known_models
+        self.ports = tuple(ports)
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def job_options(cls, scheduler, generation, known_models=None):
+        return {"concurrency": scheduler.concurrency_for(cls.name), "limiter": scheduler.limiter(cls.name, generation),
+                "known_models": known_models, "rtt": scheduler.rtt['tcp']}
+
+    def scan(self):
+        printers = []
+        counter = ProgressCounter(len(self.targets), self.on_progress)
+        def on_result(ip, printer):
+            if printer:
+                printers.append(printer)
+                self.emit(printer)
+            counter.step()
+        try:
+            asyncio.run(printer_sweep(self.targets, self.ports, self.timeout, self.concurrency, self.fingerprint, on_result, self.limiter,
+                                     self.known_models, self.token, self.rtt))
+        except Exception:
+            swallowed("network.sweep")
+        return printers
+
+SCAN_WORKERS = 4
+SCAN_RATE_LIMIT = 2000  # حزم في الثانية لكل البروتوكولات معاً
+SCAN_CONCURRENCY = 512
+PROTOCOL_WEIGHTS = {'usb': 1, 'discovery': 3, 'network': 3, 'snmp': 2, 'mdns': 1}
+
+class ScanScheduler:
+    # مجدول واحد لكل البروتوكولات: مجموعة خيوط، حد عام للحزم، وحصة موزونة لكل بروتوكول
+    def __init__(self, workers=SCAN_WORKERS, rate=SCAN_RATE_LIMIT, concurrency=SCAN_CONCURRENCY, weights=PROTOCOL_WEIGHTS, on_progress=None):
+        self.on_progress = on_progress
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+        self.rate = rate
+        self.concurrency = concurrency
+        self.weights = dict(weights)
+        self.lock = threading.Lock()
+        self.limiters = {}
+        self.task_progress = {}
+        self.last_progress = -1
+        self.generation = 0
+        # تقديرات RTT تبقى مع المجدول، فالبحث التالي يبدأ بمهلات مناسبة لكل شبكة
+        # الاكتشاف له مقدر منفصل: دفعته الخفيفة أسرع من فحص الطابعات الثقيل (5 منافذ وبصمة) ولا يجب أن تقصر مهلاته
+        self.rtt = {'discovery': RTTEstimator(TCP_RTO_INITIAL, TCP_RTO_MIN, TCP_RTO_MAX, TCP_RETRIES),
+                    'tcp': RTTEstimator(TCP_RTO_INITIAL, TCP_RTO_MIN, TCP_RTO_MAX, TCP_RETRIES),
+                    'snmp': RTTEstimator(SNMP_TIMEOUT, SNMP_RTO_MIN, SNMP_RTO_MAX, SNMP_RETRIES)}
+
+    def plan(self, names):
+        # كل بحث جديد يبدأ جيلاً جديداً، وتحديثات البحث السابق الملغى تهمل
+        with self.lock:
+            self.generation += 1
+            self.task_progress = {name: 0 for name in names}
+            self.limiters = {}
+            self.last_progress = -1
+        if self.on_progress:
+            self.on_progress(0)
+        return self.generation
+
+    def weight(self, name):
+        return self.weights.get(name, 1)
+
+    def timing_stats(self):
+        return {name: estimator.stats() for name, estimator in self.rtt.items()}
+
+    def concurrency_for(self, name):
+        with self.lock:
+            total = sum(self.weight(n) for n in self.task_progress) or 1
+        return max(1, int(self.concurrency * self.weight(name) / total))
+
+    def limiter(self, name, generation=None):
+        limiter = RateLimiter(self.rate)
+        with self.lock:
+            if generation in (None, self.generation):
+                self.limiters[name] = limiter
+                self.rebalance()
+        return limiter
+
+    def rebalance(self):
+        # عند انتهاء بروتوكول توزع حصته على البروتوكولات التي ما زالت تعمل
+        total = sum(self.weight(n) for n in self.limiters) or 1
+        for name, limiter in self.limiters.items():
+            limiter.set_rate(self.rate * self.weight(name) / total if self.rate else None)
+
+    def release(self, name, generation=None):
+        with self.lock:
+            if generation not in (None, self.generation):
+                return
+            if self.limiters.pop(name, None) is not None:
+                self.rebalance()
+
+    def submit(self, name, fn, *args, generation=None, metrics=None):
+        # ما يسجله العمل من مجسات وأخطاء يحسب للبحث metrics تحت اسم البروتوكول
+        def run():
+            try:
+                if metrics:
+                    with bind_metrics(metrics, name):
+                        fn(*args)
+                else:
+                    fn(*args)
+            finally:
+                self.update(name, 100, generation)
+                self.release(name, generation)
+        return self.pool.submit(run)
+
+    def update(self, name, value, generation=None):
+        with self.lock:
+            if generation not in (None, self.generation) or name not in self.task_progress:
+                return
+            self.task_progress[name] = value
+            total = sum(self.weight(n) for n in self.task_progress) or 1
+            combined = int(sum(self.weight(n) * v for n, v in self.task_progress.items()) / total)
+            if combined == self.last_progress:
+                return
+            self.last_progress = combined
+        if self.on_progress:
+            self.on_progress(combined)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+SCAN_PROTOCOLS = ('usb', 'network', 'snmp', 'mdns')
+
+def sweep_scopes(protocols, targets):
+    return {name: f"{name}:{targets}" if uses_targets(name) else name for name in protocols}
+
+class ScanJob:
+    # بحث واحد على المجدول بدون Qt؛ تستعمله الواجهة ووضع سطر الأوامر معاً
+    def __init__(self, scheduler, protocols, targets, on_found=None, on_finished=None, known_models=None, cancel=None, catalog=None,
+                 metrics=None):
+        self.scheduler = scheduler
+        self.catalog = catalog
+        self.metrics = metrics or ScanMetrics()
+        self.protocols = list(protocols)
+        self.targets = targets
+        self.on_found = on_found or (lambda p: None)
+        self.on_finished = on_finished or (lambda name, printers: None)
+        self.known_models = known_models
+        self.cancel = cancel or CancelToken()
+        self.generation = None
+        self.scanners = {}
+
+    def start(self):
+        scheduler = self.scheduler
+        token = self.cancel
+        host_protocols = [name for name in self.protocols if uses_targets(name)]
+        planned = self.protocols + (['discovery'] if host_protocols else [])
+        generation = self.generation = scheduler.plan(planned)
+        catalog = self.catalog or driver_catalog()
+        metrics = self.metrics
+        remaining = set(self.protocols)
+        starts = {}
+        macs = {}
+        def progress_for(name):
+            return lambda val: scheduler.update(name, val, generation)
+        def enrich(p):
+            # كل سجل يمر على فهرس التعريفات المحلي قبل أن يصل إلى الواجهة أو المخرجات
+            # وعنوان MAC من جدول ARP يعطي الجهاز هوية لا تتغير بتغير IP
+            mac = macs.get(p.get('driver_id'))
+            if mac and 'mac' not in p:
+                p['mac'] = mac
+            try:
+                with metrics.phase("catalog"):
+                    return catalog.enrich(p)
+            except Exception:
+                swallowed("catalog.enrich")
+                return p
+        def found(p):
+            self.on_found(enrich(p))
+        def finish(name, printers):
+            printers = [enrich(p) for p in printers]
+            metrics.count("hits", len(printers), protocol=name)
+            metrics.add_phase(name, starts.get(name, metrics.started), time.time() - starts.get(name, metrics.started))
+            with metrics.lock:
+                remaining.discard(name)
+                last = not remaining
+            if last:
+                # آخر بروتوكول: زمن البحث كاملاً، ثم يضاف البحث إلى المجموع التراكمي
+                metrics.add_phase("total", metrics.started, time.time() - metrics.started)
+                total_metrics().merge(metrics)
+            self.on_finished(name, printers)
+        def launch(name, hosts=None):
+            # كل ماسح مسجل يعمل بنفس الطريقة؛ الماسحات التي لا تبث نتائجها أثناء الفحص يبثها run() عند انتهائها
+            cls = scanner_class(name)
+            scanner = self.scanners[name] = cls(hosts, cancel=token, on_found=found, on_progress=progress_for(name),
+                                                **cls.job_options(scheduler, generation, self.known_models))
+            def work():
+                starts[name] = time.time()
+                printers = []
+                try:
+                    if hosts is None or not token.cancelled:
+                        printers = scanner.run()
+                except Exception:
+                    # ماسح إضافة معطوب لا يعلق البحث كله: البروتوكول ينتهي بدون نتائج
+                    swallowed(f"{name}.scan")
+                finish(name, printers)
+            scheduler.submit(name, work, generation=generation, metrics=metrics)
+        for name in self.protocols:
+            if name not in host_protocols:
+                launch(name)
+        if host_protocols:
+            host_discovery = HostDiscovery(self.targets, concurrency=scheduler.concurrency_for('discovery'),
+                                           limiter=scheduler.limiter('discovery', generation), cancel=token,
+                                           on_progress=progress_for('discovery'), rtt=scheduler.rtt['discovery'])
+            def discover():
+                start = time.time()
+                try:
+                    hosts = host_discovery.scan()
+                except Exception:
+                    # اكتشاف معطوب لا يعلق البحث: البروتوكولات التي تنتظره تنتهي بدون نتائج
+                    swallowed("discovery.scan")
+                    hosts = None
+                metrics.add_phase('discovery', start, time.time() - start)
+                if hosts is not None:
+                    count("hits", len(hosts))
+                    macs.update(host_discovery.macs)
+                # الماسحات لا تفحص إلا الأجهزة الحية
+                for name in host_protocols:
+                    try:
+                        if hosts is None:
+                            finish(name, [])
+                        else:
+                            launch(name, hosts)
+                    except Exception:
+                        swallowed(f"{name}.scan")
+                        if name in remaining:
+                            finish(name, [])
+            scheduler.submit('discovery', discover, generation=generation, metrics=metrics)
+        return generation
+
+    def stats(self):
+        return {name: scanner.stats() for name, scanner in self.scanners.items()}
+
+def run_scan(protocols, targets, cache=None, force=False, on_found=None, cancel=None, scheduler=None, tracker=None, on_change=None,
+             metrics=None):
+    # بحث كامل يعود بعد انتهاء كل البروتوكولات؛ ما زال حديثاً في المخزن لا يعاد فحصه
+    # مع tracker يقارن كل بروتوكول أعيد فحصه باللقطة السابقة ويبلغ عن كل تغيير عبر on_change
+    on_found = on_found or (lambda p: None)
+    on_change = on_change or (lambda change: None)
+    cancel = cancel or CancelToken()
+    metrics = metrics or ScanMetrics()
+    scopes = sweep_scopes(protocols, targets)
+    with metrics.phase("cache"):
+        cached = cache.load(set(protocols), targets) if cache else []
+        stale = [name for name in protocols if force or not cache or not cache.is_fresh(scopes[name])]
+    printers = [p for p in cached if p.get('type') not in stale]
+    for p in printers:
+        on_found(p)
+    if not stale:
+        return printers
+    started = time.time()
+    pending = set(stale)
+    lock = threading.Lock()
+    done = threading.Event()
+    def on_finished(name, found):
+        with lock:
+            if not cancel.cancelled:
+                if cache:
+                    cache.record_sweep(name, found, started, scopes[name], targets if uses_targets(name) else None)
+                if tracker:
+                    for change in tracker.update(name, found, targets if uses_targets(name) else None):
+                        on_change(change)
+                printers.extend(found)
+            pending.discard(name)
+            if not pending:
+                done.set()
+    own_scheduler = scheduler is None
+    scheduler = scheduler or ScanScheduler()
+    known_models = cache.known_models() if cache and not force else None
+    try:
+        ScanJob(scheduler, stale, targets, on_found, on_finished, known_models, cancel, metrics=metrics).start()
+        while not done.wait(0.5):
+            pass
+    finally:
+        if own_scheduler:
+            scheduler.shutdown()
+    return printers
+
+MONITOR_INTERVAL = 5 * 60  # دورة مراقبة كاملة على كل الشبكات الفرعية
+MONITOR_PREFIX = 24
+MONITOR_MISSES = 2  # لا يعلن اختفاء جهاز إلا بعد غيابه عن فحصين متتاليين لشبكته، فرد ضائع لا يظهر كاختفاء ثم عودة
+
+class ScanMonitor:
+    # مراقبة في الخلفية: الأهداف تقسم إلى شبكات فرعية ويفحص جزء واحد في كل خطوة، فحمل الشبكة موزع على الفترة كلها
+    # كل خطوة تقارن بآخر نتيجة لنفس الجزء فقط، ولا تكتب في المخزن والسجل ولا تبلغ الواجهة إلا بالجديد والمتغير والمختفي
+    def __init__(self, protocols, targets, interval=MONITOR_INTERVAL, cache=None, tracker=None, history=None, scheduler=None,
+                 prefix=MONITOR_PREFIX, misses=MONITOR_MISSES, on_change=None, on_sweep=None):
+        self.protocols = list(protocols)
+        self.targets = targets
+        self.interval = interval
+        self.cache = cache
+        self.tracker = tracker
+        self.history = history
+        self.own_scheduler = scheduler is None
+        self.scheduler = scheduler or ScanScheduler()
+        self.prefix = prefix
+        self.misses = misses
+        self.on_change = on_change or (lambda change: None)
+        self.on_sweep = on_sweep or (lambda sweep: None)
+        self.parts = []  # [(البروتوكولات، الأهداف)]: البروتوكولات المحلية (USB، mDNS) جزء واحد، وكل شبكة فرعية جزء
+        self.subnets = {}  # رقم الشبكة الفرعية -> الجزء
+        local = [name for name in self.protocols if not uses_targets(name)]
+        host = [name for name in self.protocols if uses_targets(name)]
+        if local:
+            self.parts.append((local, None))
+        for subnet in targets.subnets(prefix) if host else ():
+            self.subnets[subnet.ranges[0][0] >> (32 - prefix)] = len(self.parts)
+            self.parts.append((host, subnet))
+        self.records = [{} for _ in self.parts]  # لكل جزء: مصدر السجل -> السجل
+        self.fingerprints = {}
+        self.missed = {}
+        self.compared = set()
+        self.resolver = DeviceResolver()
+        self.published = {}  # مفتاح الجهاز -> بصمته كما أبلغ آخر مرة
+        self.last_metrics = None
+        self.sweeps = 0
+        self.cycles = 0
+
+    def part_of(self, p):
+        name = p.get("type")
+        if name not in self.protocols:
+            return None
+        if not uses_targets(name):
+            return 0
+        try:
+            address = int(ipaddress.IPv4Address(str(p.get("driver_id"))))
+        except ValueError:
+            return None
+        part = self.subnets.get(address >> (32 - self.prefix))
+        return part if part is not None and str(p.get("driver_id")) in self.parts[part][1] else None
+
+    def seed(self, printers):
+        # نتائج سابقة (المخزن أو الجدول الحالي) تصبح أساس المقارنة، فالدورة الأولى لا تعيد كتابة ما لم يتغير
+        for p in printers:
+            part = self.part_of(p)
+            if part is not None:
+                key = source_key(p)
+                self.records[part][key] = p
+                self.fingerprints[key] = record_fingerprint(p)
+        return self.rebuild()
+
+    def rebuild(self):
+        # بعد اختفاء جهاز: الاتحاد-بحث لا يفك الروابط، فيعاد الدمج من السجلات الحالية ويبلغ فقط عما اختلف
+        self.resolver = DeviceResolver()
+        for records in self.records:
+            for p in records.values():
+                self.resolver.link(p)
+        devices = {device["entity"]: device for device in self.resolver.devices()}
+        fingerprints = {key: record_fingerprint(device) for key, device in devices.items()}
+        updated = [devices[key] for key, fingerprint in fingerprints.items() if self.published.get(key) != fingerprint]
+        removed = [key for key in self.published if key not in devices]
+        self.published = fingerprints
+        return updated, removed
+
+    def merge(self, changed):
+        updated, removed = {}, set()
+        for p in changed:
+            device, merged = self.resolver.add(p)
+            updated[device["entity"]] = device
+            removed.update(merged)
+        removed = [key for key in removed if not self.resolver.is_live(key)]
+        for key in removed:
+            self.published.pop(key, None)
+        devices = []
+        for key, device in updated.items():
+            fingerprint = record_fingerprint(device)
+            if self.resolver.is_live(key) and self.published.get(key) != fingerprint:
+                self.published[key] = fingerprint
+                devices.append(device)
+        return devices, removed
+
+    def sweep(self, index, cancel=None):
+        # فحص جزء واحد بالقوة ثم مقارنته بآخر نتيجة له؛ يعيد ملخص الخطوة أو None إذا ألغي
+        cancel = cancel or CancelToken()
+        protocols, targets = self.parts[index]
+        started = time.time()
+        metrics = self.last_metrics = ScanMetrics()
+        printers = run_scan(protocols, targets, force=True, cancel=cancel, scheduler=self.scheduler, metrics=metrics)
+        if cancel.cancelled:
+            return None
+        previous = self.records[index]
+        current = {source_key(p): p for p in printers}
+        for key, p in previous.items():
+            if key in current:
+                self.missed.pop(key, None)
+                continue
+            misses = self.missed.get(key, 0) + 1
+            if misses < self.misses:
+                self.missed[key] = misses
+                current[key] = p
+            else:
+                self.missed.pop(key, None)
+        changed = []
+        for key, p in current.items():
+            fingerprint = record_fingerprint(p)
+            if self.fingerprints.get(key) != fingerprint:
+                self.fingerprints[key] = fingerprint
+                changed.append(p)
+        gone = [p for key, p in previous.items() if key not in current]
+        for p in gone:
+            self.fingerprints.pop(source_key(p), None)
+        self.records[index] = current
+        changes = []
+        with metrics.phase("store"):
+            if self.cache:
+                self.cache.record_changes(changed, gone, started, sweep_scopes(protocols, targets).values())
+            # أول فحص لكل جزء يقارن دائماً، فلقطة التغييرات قد تكون أقدم من الأساس الذي بدأت منه المراقبة
+            if self.tracker and (changed or gone or index not in self.compared):
+                for name in protocols:
+                    for change in self.tracker.update(name, [p for p in current.values() if p.get("type") == name],
+                                                      targets if uses_targets(name) else None):
+                        changes.append(change)
+                        self.on_change(change)
+                self.compared.add(index)
+            if self.history:
+                self.history.record_session(list(current.values()), started, protocols=protocols, targets=targets, changed_only=True)
+        updated, removed = self.rebuild() if gone else self.merge(changed)
+        self.sweeps += 1
+        sweep = {"time": started, "seconds": round(time.time() - started, 3), "targets": str(targets) if targets else None,
+                 "protocols": protocols, "found": len(printers), "changed": len(changed), "gone": len(gone),
+                 "updated": updated, "removed": removed, "changes": changes}
+        self.on_sweep(sweep)
+        return sweep
+
+    def run(self, cancel=None):
+        # حتى الإلغاء: خطوة كل interval / عدد الأجزاء، وجزء أبطأ من خطوته يؤخر التالي بدل أن تتراكم الفحوص
+        cancel = cancel or CancelToken()
+        step = self.interval / max(1, len(self.parts))
+        try:
+            while not cancel.cancelled:
+                for index in range(len(self.parts)):
+                    started = time.time()
+                    self.sweep(index, cancel)
+                    if cancel.wait(max(0, step - (time.time() - started))):
+                        return
+                self.cycles += 1
+        finally:
+            if self.own_scheduler:
+                self.scheduler.shutdown()
+
+    def devices(self):
+        return self.resolver.devices()
+
+    def stats(self):
+        return {"parts": len(self.parts), "sweeps": self.sweeps, "cycles": self.cycles, "devices": len(self.published),
+                "records": sum(len(records) for records in self.records), "missing": len(self.missed)}
+
+class RecordWriter:
+    # ndjson: سطر لكل جهاز فور اكتشافه؛ json: مستند واحد لكل فحص (سطر واحد لكل فحص في وضع الخدمة)
+    def __init__(self, stream, fmt="json", compact=False):
+        self.stream = stream
+        self.fmt = fmt
+        self.compact = compact
+        self.lock = threading.Lock()
+
+    def write_line(self, obj):
+        with self.lock:
+            self.stream.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            self.stream.flush()
+
+    def found(self, p):
+        if self.fmt == "ndjson":
+            self.write_line(p)
+
+    def changed(self, change):
+        # في ndjson يميز سطر التغيير عن سطر الجهاز بالحقل change
+        if self.fmt == "ndjson":
+            self.write_line(change)
+
+    def scan_done(self, printers, targets, protocols, started, changes=None, timing=None, metrics=None, agents=None):
+        if self.fmt != "json":
+            return
+        # كل سجل يبقى جهازاً مستقلاً، والملخص يجمع الأجهزة حسب الموديل الحقيقي
+        groups = model_matcher().annotate(printers)
+        models = [{"model": g["model"], "manufacturer": g["manufacturer"], "count": g["count"],
+                   "devices": [device_key(p) for p in g["records"]]} for g in sorted(groups, key=lambda g: (-g["count"], g["model"]))]
+        # devices: طابعة فعلية واحدة لكل ما رأته البروتوكولات منها، مع مصدر كل حقل في provenance
+        doc = {"time": started, "duration": round(time.time() - started, 3), "targets": str(targets), "protocols": list(protocols),
+               "printers": printers, "devices": merge_devices(printers), "models": models}
+        if changes is not None:
+            doc["changes"] = changes
+        if timing:
+            doc["timing"] = timing
+        if metrics:
+            doc["metrics"] = metrics
+        if agents:
+            doc["agents"] = agents
+        if self.compact:
+            self.write_line(doc)
+        else:
+            with self.lock:
+                json.dump(doc, self.stream, ensure_ascii=False, indent=2)
+                self.stream.write("\n")
+                self.stream.flush()
+
+    def sweep_done(self, sweep):
+        # المراقبة: سطر لكل خطوة غيرت شيئاً فقط؛ في ndjson سطر لكل جهاز تغير وسطر removed لكل جهاز اختفى
+        if not (sweep["updated"] or sweep["removed"] or sweep["changes"]):
+            return
+        if self.fmt == "ndjson":
+            for device in sweep["updated"]:
+                self.write_line(device)
+            for key in sweep["removed"]:
+                self.write_line({"removed": key, "time": sweep["time"]})
+            return
+        self.write_line(sweep)
+
+def write_metrics(path, metrics):
+    # الملف يستبدل دفعة واحدة حتى لا يقرأ جامع Prometheus (textfile collector) ملفاً نصف مكتوب
+    if path.endswith(".prom"):
+        text = total_metrics().to_prometheus()
+    else:
+        text = json.dumps({"last": metrics.snapshot(), "total": total_metrics().snapshot()}, indent=2, ensure_ascii=False)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="printer_discovery", description="Discover printers without the GUI and write them as JSON or NDJSON.")
+    parser.add_argument("--headless", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("-t", "--targets", action="append",
+                        help=f"CIDR, range or address, comma separated or repeated (default: {DEFAULT_TARGETS})")
+    parser.add_argument("-p", "--protocols", default="usb,network",
+                        help=f"comma separated list of {','.join(SCAN_PROTOCOLS)} or plugin scanners (default: usb,network)")
+    parser.add_argument("-f", "--format", choices=("json", "ndjson"), default="json")
+    parser.add_argument("-o", "--output", help="write to this file instead of stdout (appended in daemon mode)")
+    parser.add_argument("--cache", help="SQLite device cache; protocols swept within --ttl are answered from it")
+    parser.add_argument("--ttl", type=float, default=CACHE_TTL, help="cache freshness in seconds (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="ignore the cache and rescan everything")
+    parser.add_argument("--history", help="SQLite history store; every completed scan is recorded as one session")
+    parser.add_argument("--metrics", help="after each scan write scan metrics here: Prometheus text if the name ends in .prom, JSON otherwise")
+    parser.add_argument("--changes", help="SQLite snapshot of the last scan; report devices that appeared, disappeared, changed IP or model")
+    parser.add_argument("--rate", type=int, default=SCAN_RATE_LIMIT, help="packets per second for all protocols (0 = unlimited)")
+    parser.add_argument("--plugin", action="append", default=[],
+                        help=f"import this module to register extra scanners (repeatable; also ${SCANNER_PLUGINS_ENV}, comma separated)")
+    parser.add_argument("--daemon", action="store_true", help="keep running and rescan every --interval seconds until SIGTERM/SIGINT")
+    parser.add_argument("--interval", type=float, default=CACHE_TTL, help="seconds between scans in daemon mode (default: %(default)s)")
+    parser.add_argument("--export", help="also stream every record found to this file: .ndjson, .csv, .parquet or .arrow "
+                                           "(the last two need pyarrow)")
+    parser.add_argument("--monitor", action="store_true",
+                        help=f"daemon mode that rescans one /{MONITOR_PREFIX} at a time, spread over --interval, and writes only what changed")
+    args = parser.parse_args(argv)
+    args.protocols = [name.strip() for name in args.protocols.split(",") if name.strip()]
+    try:
+        known = load_scanner_plugins(args.plugin)
+    except ImportError as e:
+        parser.error(f"cannot load scanner plugin: {e}")
+    unknown = set(args.protocols) - set(known)
+    if unknown or not args.protocols:
+        parser.error(f"unknown protocols: {', '.join(sorted(unknown)) or '(none)'}")
+    try:
+        args.targets = TargetSet(",".join(args.targets or [DEFAULT_TARGETS]))
+    except ValueError as e:
+        parser.error(str(e))
+    if args.export:
+        from printer_export import export_format, require_pyarrow
+        try:
+            if export_format(args.export) in ("parquet", "arrow"):
+                require_pyarrow()
+        except (ValueError, ImportError) as e:
+            parser.error(str(e))
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    stop = CancelToken()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.cancel())
+    cache = DeviceCache(args.cache, args.ttl) if args.cache else None
+    history = HistoryStore(args.history, legacy=None) if args.history else None
+    tracker = ChangeTracker(args.changes) if args.changes else None
+    scheduler = ScanScheduler(rate=args.rate or None)
+    stream = open(args.output, "a" if args.daemon or args.monitor else "w", encoding="utf-8") if args.output else sys.stdout
+    writer = RecordWriter(stream, args.format, compact=args.daemon or args.monitor)
+    exporter = None
+    if args.export:
+        # الملف يكتب أثناء الفحص ويغلق عند الخروج، ولا تجمع النتائج في الذاكرة من أجله
+        from printer_export import open_writer
+        exporter = open_writer(args.export)
+    def found(p):
+        writer.found(p)
+        if exporter:
+            exporter.write(p, time.time())
+    if args.monitor:
+        def on_sweep(sweep):
+            writer.sweep_done(sweep)
+            if exporter:
+                for device in sweep["updated"]:
+                    for p in device["sources"]:
+                        exporter.write(p, sweep["time"])
+            if args.metrics:
+                write_metrics(args.metrics, monitor.last_metrics)
+        monitor = ScanMonitor(args.protocols, args.targets, args.interval, cache, tracker, history, scheduler,
+                              on_change=writer.changed, on_sweep=on_sweep)
+        if cache:
+            monitor.seed(cache.load(set(args.protocols), args.targets))
+        try:
+            monitor.run(stop)
+        finally:
+            scheduler.shutdown()
+            if exporter:
+                exporter.close()
+            if stream is not sys.stdout:
+                stream.close()
+        return 0
+    try:
+        while not stop.cancelled:
+            started = time.time()
+            # في وضع الخدمة كل دورة فحص كامل، والمخزن يحدث فقط
+            changes = []
+            metrics = ScanMetrics()
+            def on_change(change):
+                changes.append(change)
+                writer.changed(change)
+            printers = run_scan(args.protocols, args.targets, cache, args.force or args.daemon, found, stop, scheduler,
+                                tracker, on_change, metrics)
+            if not stop.cancelled:
+                writer.scan_done(printers, args.targets, args.protocols, started, changes if tracker else None, scheduler.timing_stats(),
+                                 metrics.snapshot())
+                if args.metrics:
+                    write_metrics(args.metrics, metrics)
+                if history:
+                    history.record_session(printers, started, protocols=args.protocols, targets=args.targets)
+            if not args.daemon:
+                break
+            stop.wait(max(0, args.interval - (time.time() - started)))
+    finally:
+        scheduler.shutdown()
+        if exporter:
+            exporter.close()
+        if stream is not sys.stdout:
+            stream.close()
+    return 0
+
+if __name__ == "__main__":
+    # الإضافات تستورد printer_discovery؛ بدون هذا تسجل ماسحاتها في نسخة ثانية من الوحدة غير التي تعمل
+    sys.modules.setdefault("printer_discovery", sys.modules[__name__])
+    sys.exit(main())
@@ -3,20 +3,34 @@
 # جميع الحقوق محفوظة © khalid aldawish 2025
 
 import sys
-import usb.core
-import usb.util
-import webbrowser
-import socket
+
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    # وضع سطر الأوامر والخدمة لا يحمل PyQt5 أبداً، فيعمل على خادم بلا Qt
+    from printer_discovery import main as headless_main
+    sys.exit(headless_main(sys.argv[1:]))
+
+import time
 import threading
+import datetime
+import itertools
 
 from PyQt5.QtWidgets import (
     QApplication, QSplashScreen, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox, QComboBox,
-    QLabel, QProgressBar, QMenuBar, QAction, QDialog, QTextEdit, QLineEdit, QCheckBox, QFormLayout, QSpinBox
+    QPushButton, QTableView, QHeaderView, QMessageBox, QComboBox, QStyledItemDelegate, QStyleOptionButton, QStyle,
+    QLabel, QProgressBar, QMenuBar, QAction, QDialog, QTextEdit, QLineEdit, QCheckBox, QFormLayout, QSpinBox, QFileDialog
 )
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QObject
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QObject, QAbstractTableModel, QModelIndex, QEvent
 from PyQt5.QtGui import QPixmap
 
+from printer_discovery import (
+    DEFAULT_TARGETS, CACHE_TTL, uses_targets, TargetSet, CancelToken, DeviceCache, ScanScheduler, ScanJob,
+    device_key, sweep_scopes, HISTORY_PAGE_SIZE, history_store, MONITOR_INTERVAL, ScanMonitor
+)
+from printer_models import model_matcher, manufacturer_of
+from printer_inventory import ChangeTracker, DeviceResolver, merge_devices, summarize_changes
+from printer_metrics import ScanMetrics, total_metrics
+from printer_export import EXPORT_FILTERS, IMPORT_FILTERS, export_history, import_inventory
+
 # --------- الترجمة ---------
 translations = {
     'en': {
@@ -32,6 +46,8 @@ translations = {
         'download': "Download",
         'no_printers': "No printers found.",
         'found': "Found {n} printer(s).",
+        'timing_line': "{name} {subnet}: SRTT {srtt_ms} ms, RTO {rto_ms} ms, retries {retries}",
+        'changes': "Since last scan: {appeared} new, {disappeared} gone, {ip_changed} moved, {model_changed} changed model.",
         'loading': "Loading...",
         'lang': "Language",
         'no_usb_printers': "No USB printers detected.\nTry connecting a printer and click again.",
@@ -44,10 +60,32 @@ translations = {
         'about_text': "Printer Driver Finder\nVersion 1.0.0\n\nDeveloped by: khalid aldawish\n\n- Detects printers via USB, Network, SNMP, Bonjour/mDNS\n- Supports English and Arabic\n- Direct search for drivers\n- Progress bar for scan\n- Advanced search options\n\n© 2025 khalid aldawish. All rights reserved.",
         'refresh': "Refresh",
         'history': "History",
+        'stats': "Statistics",
+        'stats_last': "Last search",
+        'stats_total': "Since start",
+        'no_stats': "No search has finished yet.",
+        'export_json': "Export JSON",
+        'export_prometheus': "Export Prometheus",
+        'stats_phases': "Phase            start (s)   time (s)",
+        'stats_protocols': "Protocol          probes  timeouts      hits    errors  hit rate",
+        'stats_errors': "Ignored errors",
+        'stats_timing': "Timeouts per subnet",
         'clear_history': "Clear History",
         'copied': "Copied to clipboard.",
+        'export': "Export...",
+        'exported': "Exported {n} record(s).",
+        'import': "Import",
+        'imported': "Imported {n} record(s) into the cache and the change baseline.",
+        'prev_page': "< Newer",
+        'next_page': "Older >",
+        'page': "Page {page} of {pages}  ({count} printers)",
+        'history_range': ["All time", "Last 24 hours", "Last 7 days", "Last 30 days"],
+        'seen_times': "seen {times}x",
         'advanced': "Advanced",
         'ip_range': "IP Range",
+        'cache_ttl': "Cache TTL (minutes)",
+        'monitor_interval': "Monitor cycle (seconds)",
+        'ip_range_hint': "CIDR, ranges or addresses, e.g. 192.168.1.0/24, 10.0.0.1-10.0.0.50",
         'protocols': "Protocols",
         'search_by_model': "Search by Model",
         'manufacturer': "Manufacturer",
@@ -59,6 +97,13 @@ translations = {
         'searching_network': "Searching via Network...",
         'searching_usb': "Searching via USB...",
         'filter': "Filter",
+        'cancel': "Cancel",
+        'cancelled': "Search cancelled.",
+        'all_types': "All types",
+        'all_manufacturers': "All manufacturers",
+        'monitor': "Monitor",
+        'monitoring': "Monitoring {n} printer(s): checked {targets}.",
+        'monitor_all': "local devices",
     },
     'ar': {
         'title': "باحث تعريفات الطابعات",
@@ -73,6 +118,8 @@ translations = {
         'download': "تحميل",
         'no_printers': "لم يتم العثور على أي طابعة.",
         'found': "تم العثور على {n} طابعة.",
+        'timing_line': "{name} {subnet}: SRTT {srtt_ms} ms، المهلة {rto_ms} ms، المحاولات الإضافية {retries}",
+        'changes': "منذ آخر بحث: {appeared} جديدة، {disappeared} اختفت، {ip_changed} تغير عنوانها، {model_changed} تغير موديلها.",
         'loading': "جاري التحميل...",
         'lang': "اللغة",
         'no_usb_printers': "لم يتم اكتشاف أي طابعة USB.\nحاول توصيل طابعة واضغط مرة أخرى.",
@@ -85,10 +132,32 @@ translations = {
         'about_text': "باحث تعريفات الطابعات\nالإصدار 1.0.0\n\nتطوير: خالد الدويش\n\n- كشف الطابعات عبر USB والشبكة و SNMP و mDNS\n- يدعم العربية والإنجليزية\n- بحث مباشر عن التعاريف\n- شريط تقدم للفحص\n- خيارات بحث متقدمة\n\n© 2025 خالد الدويش. جميع الحقوق محفوظة.",
         'refresh': "تحديث",
         'history': "السجل",
+        'stats': "الإحصاءات",
+        'stats_last': "آخر بحث",
+        'stats_total': "منذ بدء البرنامج",
+        'no_stats': "لم ينته أي بحث بعد.",
+        'export_json': "تصدير JSON",
+        'export_prometheus': "تصدير Prometheus",
+        'stats_phases': "المرحلة          البداية (ث)  المدة (ث)",
+        'stats_protocols': "البروتوكول        مجسات    مهلات    نتائج    أخطاء  نسبة النجاح",
+        'stats_errors': "أخطاء تم تجاهلها",
+        'stats_timing': "المهلات لكل شبكة",
         'clear_history': "مسح السجل",
         'copied': "تم النسخ إلى الحافظة.",
+        'export': "تصدير...",
+        'exported': "تم تصدير {n} سجل.",
+        'import': "استيراد",
+        'imported': "تم استيراد {n} سجل إلى المخزن وأساس المقارنة.",
+        'prev_page': "< الأحدث",
+        'next_page': "الأقدم >",
+        'page': "صفحة {page} من {pages}  ({count} طابعة)",
+        'history_range': ["كل الفترات", "آخر 24 ساعة", "آخر 7 أيام", "آخر 30 يوماً"],
+        'seen_times': "ظهرت {times} مرة",
         'advanced': "خيارات متقدمة",
         'ip_range': "نطاق IP",
+        'cache_ttl': "مدة صلاحية النتائج المخزنة (دقائق)",
+        'monitor_interval': "دورة المراقبة (ثوان)",
+        'ip_range_hint': "نطاقات CIDR أو مدى أو عناوين، مثال: 192.168.1.0/24, 10.0.0.1-10.0.0.50",
         'protocols': "البروتوكولات",
         'search_by_model': "بحث بالاسم أو الموديل",
         'manufacturer': "الشركة",
@@ -100,201 +169,62 @@ translations = {
         'searching_network': "جاري البحث عبر الشبكة...",
         'searching_usb': "جاري البحث عبر USB...",
         'filter': "تصفية",
+        'cancel': "إلغاء",
+        'cancelled': "تم إلغاء البحث.",
+        'all_types': "كل الأنواع",
+        'all_manufacturers': "كل الشركات",
+        'monitor': "مراقبة",
+        'monitoring': "مراقبة {n} طابعة: آخر فحص {targets}.",
+        'monitor_all': "الأجهزة المحلية",
     }
 }
 
-HISTORY_FILE = "printer_history.txt"
-
-def save_to_history(entry):
-    try:
-        with open(HISTORY_FILE, "a", encoding="utf-8") as f:
-            f.write(entry + "\n")
-    except Exception:
-        pass
-
-def load_history():
-    try:
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            return [line.strip() for line in f.readlines() if line.strip()]
-    except Exception:
-        return []
-
-def clear_history():
-    try:
-        open(HISTORY_FILE, "w").close()
-    except Exception:
-        pass
-
-def safe_usb_string(device, idx):
-    try:
-        return usb.util.get_string(device, idx)
-    except Exception:
-        return None
-
-def get_printer_name_from_usb(device):
-    manufacturer = safe_usb_string(device, getattr(device, 'iManufacturer', 0)) or f"Vendor:{hex(getattr(device, 'idVendor', 0))}"
-    product = safe_usb_string(device, getattr(device, 'iProduct', 0)) or f"Product:{hex(getattr(device, 'idProduct', 0))}"
-    return f"{manufacturer} {product}".strip()
-
-def find_usb_printers_safe():
-    printers = []
-    try:
-        devices = list(usb.core.find(find_all=True))
-    except Exception:
-        devices = []
-    seen = set()
-    for device in devices:
-        try:
-            if getattr(device, 'bDeviceClass', 0) == 7:
-                pass
-            else:
-                has_printer_if = False
-                try:
-                    for cfg in device:
-                        if getattr(cfg, 'bInterfaceClass', 0) == 7:
-                            has_printer_if = True
-                            break
-                except Exception:
-                    pass
-                if not has_printer_if:
-                    continue
-            printer_name = get_printer_name_from_usb(device)
-            driver_name = f"{printer_name} Driver"
-            driver_id = f"{hex(getattr(device, 'idVendor', 0))}:{hex(getattr(device, 'idProduct', 0))}"
-            search_q = f"{printer_name} printer driver"
-            download_url = f"https://www.google.com/search?q={search_q.replace(' ', '+')}"
-            if (printer_name, driver_id) in seen:
-                continue
-            seen.add((printer_name, driver_id))
-            printers.append({
-                "printer_name": printer_name,
-                "driver_name": driver_name,
-                "driver_id": driver_id,
-                "download_url": download_url,
-                "type": "usb"
-            })
-        except Exception:
-            continue
-    return printers
-
-def snmp_get_printer_info(ip):
-    try:
-        from pysnmp.hlapi import getCmd, SnmpEngine, CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity
-    except ImportError:
-        return None
-    oids = [
-        ('1.3.6.1.2.1.1.1.0', 'Description'),
-        ('1.3.6.1.2.1.25.3.2.1.3.1', 'Model'),
-        ('1.3.6.1.2.1.43.5.1.1.16.1', 'Product'),
-    ]
-    info = {}
-    for oid, name in oids:
-        try:
-            iterator = getCmd(SnmpEngine(),
-                            CommunityData('public', mpModel=0),
-                            UdpTransportTarget((ip, 161), timeout=1, retries=0),
-                            ContextData(),
-                            ObjectType(ObjectIdentity(oid)))
-            errorIndication, errorStatus, errorIndex, varBinds = next(iterator)
-            if errorIndication or errorStatus:
-                continue
-            for varBind in varBinds:
-                info[name] = str(varBind[1])
-        except Exception:
-            continue
-    return info if info else None
-
-class SNMPScanner(QObject):
-    finished = pyqtSignal(list)
-    progress = pyqtSignal(int)
-    def __init__(self, ip_range):
-        super().__init__()
-        self.ip_range = ip_range
-
-    def scan(self):
-        printers = []
-        total = self.ip_range[1] - self.ip_range[0] + 1
-        for idx, i in enumerate(range(self.ip_range[0], self.ip_range[1] + 1)):
-            ip = f"{self.ip_range[2]}.{i}"
-            info = snmp_get_printer_info(ip)
-            if info:
-                printers.append({
-                    "printer_name": info.get('Description', f"SNMP Printer ({ip})"),
-                    "driver_name": info.get('Model', "Generic SNMP Printer"),
-                    "driver_id": ip,
-                    "download_url": f"https://www.google.com/search?q=printer+driver+{ip}",
-                    "type": "snmp"
-                })
-            self.progress.emit(int((idx+1)/total*100))
-        self.finished.emit(printers)
-
-def mdns_search(timeout=2):
-    try:
-        from zeroconf import Zeroconf, ServiceBrowser
-    except ImportError:
-        return []
-    import time
-    class PrinterListener:
-        def __init__(self):
-            self.found = []
-        def add_service(self, zeroconf, type, name):
-            info = zeroconf.get_service_info(type, name)
-            if info and info.addresses:
-                ip = ".".join(str(b) for b in info.addresses[0])
-                self.found.append({
-                    "printer_name": info.name,
-                    "driver_name": "mDNS Printer",
-                    "driver_id": ip,
-                    "download_url": f"https://www.google.com/search?q=printer+driver+{ip}",
-                    "type": "mdns"
-                })
-    zeroconf = Zeroconf()
-    listener = PrinterListener()
-    browser = ServiceBrowser(zeroconf, "_ipp._tcp.local.", listener)
-    time.sleep(timeout)
-    zeroconf.close()
-    return listener.found
-
-class MDNSScanner(QObject):
-    finished = pyqtSignal(list)
-    progress = pyqtSignal(int)
-    def __init__(self, timeout=2):
-        super().__init__()
-        self.timeout = timeout
-    def scan(self):
-        printers = mdns_search(timeout=self.timeout)
-        self.progress.emit(100)
-        self.finished.emit(printers)
-
-class NetworkScanner(QObject):
-    finished = pyqtSignal(list)
-    progress = pyqtSignal(int)
-    def __init__(self, ip_range):
-        super().__init__()
-        self.ip_range = ip_range
-
-    def scan(self):
-        printers = []
-        total = self.ip_range[1] - self.ip_range[0] + 1
-        for idx, i in enumerate(range(self.ip_range[0], self.ip_range[1] + 1)):
-            ip = f"{self.ip_range[2]}.{i}"
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(0.12)
-                result = sock.connect_ex((ip, 9100))
-                if result == 0:
-                    printers.append({
-                        "printer_name": f"Network Printer ({ip})",
-                        "driver_name": f"Generic Network Printer Driver",
-                        "driver_id": ip,
-                        "download_url": f"https://www.google.com/search?q=network+printer+driver+{ip}",
-                        "type": "network"
-                    })
-                sock.close()
-            except Exception:
-                pass
-            self.progress.emit(int((idx+1)/total*100))
-        self.finished.emit(printers)
+class ScanSession(QObject):
+    # جلسة بحث واحدة: النتائج تصل إلى الخيط الرئيسي عبر إشارات Qt، ورمز إلغاء تتحقق منه كل الماسحات
+    device_found = pyqtSignal(int, dict)
+    protocol_finished = pyqtSignal(int, str, list)
+    ids = itertools.count(1)
+    def __init__(self, protocols, targets, scopes, parent=None):
+        super().__init__(parent)
+        self.id = next(ScanSession.ids)
+        self.token = CancelToken()
+        self.pending = set(protocols)
+        self.targets = targets
+        self.scopes = scopes
+        self.generation = None
+        self.started = time.time()
+        self.changes = []
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    def cancel(self):
+        self.token.cancel()
+
+    def found(self, p):
+        if not self.cancelled:
+            self.device_found.emit(self.id, p)
+
+    def finish(self, name, printers):
+        self.protocol_finished.emit(self.id, name, printers)
+
+class MonitorSession(QObject):
+    # المراقبة تعمل في خيط خلفي، وكل خطوة تصل إلى الخيط الرئيسي بما تغير فقط عبر إشارة
+    swept = pyqtSignal(int, dict)
+    ids = itertools.count(1)
+    def __init__(self, monitor, parent=None):
+        super().__init__(parent)
+        self.id = next(MonitorSession.ids)
+        self.token = CancelToken()
+        self.monitor = monitor
+        monitor.on_sweep = lambda sweep: self.token.cancelled or self.swept.emit(self.id, sweep)
+
+    def start(self):
+        threading.Thread(target=self.monitor.run, args=(self.token,), name="monitor", daemon=True).start()
+
+    def cancel(self):
+        self.token.cancel()
 
 class AboutDialog(QDialog):
     def __init__(self, text, parent=None):
@@ -307,58 +237,183 @@ class AboutDialog(QDialog):
         layout.addWidget(label)
         self.setLayout(layout)
 
+def format_metrics(snapshot, timing, tr):
+    # تقرير نصي بأعمدة ثابتة: المراحل حسب وقت البداية، ثم العدادات لكل بروتوكول، ثم الأخطاء والمهلات
+    lines = [tr['stats_phases']]
+    for name, phase in sorted(snapshot["phases"].items(), key=lambda item: item[1]["start"]):
+        lines.append(f"{name:<16} {phase['start']:>9.3f}  {phase['seconds']:>9.3f}")
+    lines += ["", tr['stats_protocols']]
+    for name, stats in sorted(snapshot["protocols"].items()):
+        rate = f"{stats['hit_rate'] * 100:.1f}%" if stats["hit_rate"] is not None else "-"
+        lines.append(f"{name:<16} {stats['probes']:>8} {stats['timeouts']:>9} {stats['hits']:>9} {stats['errors']:>9} {rate:>9}")
+    if snapshot["errors"]:
+        lines += ["", tr['stats_errors']]
+        lines += [f"  {where}: {n}" for where, n in sorted(snapshot["errors"].items(), key=lambda item: -item[1])]
+    if timing:
+        lines += ["", tr['stats_timing']]
+        lines += ["  " + tr['timing_line'].format(name=name, **s) for name, stats in timing.items() for s in stats]
+    return "\n".join(lines)
+
+class StatsDialog(QDialog):
+    # إحصاءات آخر بحث أو المجموع منذ بدء البرنامج، مع تصديرها بصيغة JSON أو Prometheus
+    def __init__(self, last, totals, timing, lang, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(translations[lang]['stats'])
+        self.resize(640, 460)
+        self.lang = lang
+        self.sources = [last, totals]
+        self.timing = timing
+        layout = QVBoxLayout(self)
+        self.source_box = QComboBox()
+        self.source_box.addItems([translations[lang]['stats_last'], translations[lang]['stats_total']])
+        self.source_box.currentIndexChanged.connect(self.refresh)
+        layout.addWidget(self.source_box)
+        self.text = QTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QTextEdit.NoWrap)
+        self.text.setStyleSheet("font-family: monospace")
+        layout.addWidget(self.text)
+        btn_layout = QHBoxLayout()
+        self.json_btn = QPushButton(translations[lang]['export_json'])
+        self.json_btn.clicked.connect(lambda: self.export("json"))
+        self.prom_btn = QPushButton(translations[lang]['export_prometheus'])
+        self.prom_btn.clicked.connect(lambda: self.export("prom"))
+        self.copy_btn = QPushButton("Copy" if lang == "en" else "نسخ")
+        self.copy_btn.clicked.connect(self.copy_to_clipboard)
+        btn_layout.addWidget(self.json_btn)
+        btn_layout.addWidget(self.prom_btn)
+        btn_layout.addWidget(self.copy_btn)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+        self.refresh()
+
+    def metrics(self):
+        return self.sources[self.source_box.currentIndex()]
+
+    def refresh(self, *_):
+        metrics = self.metrics()
+        if metrics is None:
+            self.text.setText(translations[self.lang]['no_stats'])
+        else:
+            self.text.setText(format_metrics(metrics.snapshot(), self.timing, translations[self.lang]))
+        for btn in (self.json_btn, self.prom_btn):
+            btn.setEnabled(metrics is not None)
+
+    def export(self, fmt):
+        metrics = self.metrics()
+        name = "printer_scan.prom" if fmt == "prom" else "printer_scan.json"
+        path, _ = QFileDialog.getSaveFileName(self, translations[self.lang]['stats'], name)
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(metrics.to_prometheus() if fmt == "prom" else metrics.to_json())
+        except OSError as e:
+            QMessageBox.warning(self, translations[self.lang]['stats'], str(e))
+
+    def copy_to_clipboard(self):
+        QApplication.clipboard().setText(self.text.toPlainText())
+        QMessageBox.information(self, "Info", translations[self.lang]['copied'])
+
+HISTORY_RANGES = [None, 24 * 3600, 7 * 24 * 3600, 30 * 24 * 3600]
+
 class HistoryDialog(QDialog):
-    def __init__(self, history, lang, parent=None):
+    # صفحة واحدة فقط في الذاكرة، تقرأ من مخزن السجل عند التنقل أو تغيير الفترة
+    def __init__(self, store, lang, parent=None):
         super().__init__(parent)
         self.setWindowTitle(translations[lang]['history'])
-        self.resize(500, 300)
+        self.resize(600, 400)
         self.lang = lang
+        self.store = store
+        self.offset = 0
+        self.count = 0
         layout = QVBoxLayout(self)
+        self.range_box = QComboBox()
+        self.range_box.addItems(translations[lang]['history_range'])
+        self.range_box.currentIndexChanged.connect(self.change_range)
+        layout.addWidget(self.range_box)
         self.text = QTextEdit()
         self.text.setReadOnly(True)
-        self.text.setText("\n".join(history) if history else translations[lang]['no_printers'])
         layout.addWidget(self.text)
+        page_layout = QHBoxLayout()
+        self.prev_btn = QPushButton(translations[lang]['prev_page'])
+        self.prev_btn.clicked.connect(lambda: self.load_page(self.offset - HISTORY_PAGE_SIZE))
+        self.page_label = QLabel()
+        self.page_label.setAlignment(Qt.AlignCenter)
+        self.next_btn = QPushButton(translations[lang]['next_page'])
+        self.next_btn.clicked.connect(lambda: self.load_page(self.offset + HISTORY_PAGE_SIZE))
+        page_layout.addWidget(self.prev_btn)
+        page_layout.addWidget(self.page_label, 1)
+        page_layout.addWidget(self.next_btn)
+        layout.addLayout(page_layout)
         btn_layout = QHBoxLayout()
         self.copy_btn = QPushButton("Copy" if lang == "en" else "نسخ")
         self.copy_btn.clicked.connect(self.copy_to_clipboard)
         self.clear_btn = QPushButton(translations[lang]['clear_history'])
         self.clear_btn.clicked.connect(self.clear_history)
+        self.export_btn = QPushButton(translations[lang]['export'])
+        self.export_btn.clicked.connect(self.export_history)
         btn_layout.addWidget(self.copy_btn)
+        btn_layout.addWidget(self.export_btn)
         btn_layout.addWidget(self.clear_btn)
         layout.addLayout(btn_layout)
         self.setLayout(layout)
+        self.change_range()
+
+    def since(self):
+        span = HISTORY_RANGES[self.range_box.currentIndex()]
+        return time.time() - span if span else None
+
+    def change_range(self, *_):
+        self.count = self.store.count(self.since())
+        self.load_page(0)
+
+    def load_page(self, offset):
+        tr = translations[self.lang]
+        self.offset = max(0, min(offset, (max(self.count, 1) - 1) // HISTORY_PAGE_SIZE * HISTORY_PAGE_SIZE))
+        rows = self.store.page(self.offset, HISTORY_PAGE_SIZE, self.since())
+        lines = [f"{datetime.datetime.fromtimestamp(last_seen):%Y-%m-%d %H:%M} | {entry} | {tr['seen_times'].format(times=times)}"
+                 for key, entry, first_seen, last_seen, times in rows]
+        self.text.setText("\n".join(lines) if lines else tr['no_printers'])
+        pages = max(1, -(-self.count // HISTORY_PAGE_SIZE))
+        self.page_label.setText(tr['page'].format(page=self.offset // HISTORY_PAGE_SIZE + 1, pages=pages, count=self.count))
+        self.prev_btn.setEnabled(self.offset > 0)
+        self.next_btn.setEnabled(self.offset + HISTORY_PAGE_SIZE < self.count)
 
     def copy_to_clipboard(self):
         clipboard = QApplication.clipboard()
         clipboard.setText(self.text.toPlainText())
         QMessageBox.information(self, "Info", translations[self.lang]['copied'])
 
+    def export_history(self):
+        # كل ظهور في الفترة المختارة، يكتب من المخزن دفعة بعد دفعة وليس من الصفحة المعروضة
+        tr = translations[self.lang]
+        path, _ = QFileDialog.getSaveFileName(self, tr['history'], "printer_history.csv", EXPORT_FILTERS)
+        if not path:
+            return
+        try:
+            n = export_history(self.store, path, since=self.since())
+        except (ValueError, ImportError, OSError) as e:
+            QMessageBox.warning(self, tr['history'], str(e))
+            return
+        QMessageBox.information(self, "Info", tr['exported'].format(n=n))
+
     def clear_history(self):
-        clear_history()
-        self.text.setText(translations[self.lang]['no_printers'])
+        self.store.clear()
+        self.change_range()
 
 class AdvancedDialog(QDialog):
-    def __init__(self, lang, parent=None):
+    def __init__(self, lang, parent=None, targets=DEFAULT_TARGETS, cache_ttl=CACHE_TTL, monitor_interval=MONITOR_INTERVAL):
         super().__init__(parent)
         self.setWindowTitle(translations[lang]['advanced'])
         self.resize(350, 250)
         self.lang = lang
         layout = QVBoxLayout(self)
         form = QFormLayout()
-        self.ip_prefix = QLineEdit("192.168.1")
-        self.ip_start = QSpinBox()
-        self.ip_start.setRange(1, 254)
-        self.ip_start.setValue(1)
-        self.ip_end = QSpinBox()
-        self.ip_end.setRange(1, 254)
-        self.ip_end.setValue(254)
-        ip_layout = QHBoxLayout()
-        ip_layout.addWidget(QLabel(translations[lang]['ip_range']))
-        ip_layout.addWidget(self.ip_prefix)
-        ip_layout.addWidget(self.ip_start)
-        ip_layout.addWidget(QLabel("-"))
-        ip_layout.addWidget(self.ip_end)
-        form.addRow(translations[lang]['ip_range'] + ":", ip_layout)
+        self.ip_targets = QLineEdit(targets)
+        self.ip_targets.setPlaceholderText(translations[lang]['ip_range_hint'])
+        self.ip_targets.setToolTip(translations[lang]['ip_range_hint'])
+        form.addRow(translations[lang]['ip_range'] + ":", self.ip_targets)
         self.chk_usb = QCheckBox(translations[lang]['usb'])
         self.chk_network = QCheckBox(translations[lang]['network'])
         self.chk_snmp = QCheckBox(translations[lang]['snmp'])
@@ -373,6 +428,14 @@ class AdvancedDialog(QDialog):
         form.addRow(translations[lang]['protocols'] + ":", proto_layout)
         self.model_search = QLineEdit()
         form.addRow(translations[lang]['search_by_model'] + ":", self.model_search)
+        self.cache_ttl = QSpinBox()
+        self.cache_ttl.setRange(0, 24 * 60)
+        self.cache_ttl.setValue(int(cache_ttl // 60))
+        form.addRow(translations[lang]['cache_ttl'] + ":", self.cache_ttl)
+        self.monitor_interval = QSpinBox()
+        self.monitor_interval.setRange(10, 24 * 60 * 60)
+        self.monitor_interval.setValue(int(monitor_interval))
+        form.addRow(translations[lang]['monitor_interval'] + ":", self.monitor_interval)
         layout.addLayout(form)
         btn_layout = QHBoxLayout()
         self.btn_ok = QPushButton(translations[lang]['search'])
@@ -385,18 +448,11 @@ class AdvancedDialog(QDialog):
         self.btn_close.clicked.connect(self.reject)
 
     def get_options(self):
-        prefix = self.ip_prefix.text().strip()
-        start = self.ip_start.value()
-        end = self.ip_end.value()
         try:
-            parts = prefix.split('.')
-            if len(parts) != 3 or not all(0 <= int(p) <= 255 for p in parts):
-                raise ValueError("Invalid IP prefix")
-            if start > end:
-                start, end = end, start
-            ip_range = (start, end, prefix)
-        except Exception:
-            ip_range = (1, 254, "192.168.1")
+            targets = TargetSet(self.ip_targets.text())
+        except ValueError:
+            QMessageBox.warning(self, translations[self.lang]['advanced'], translations[self.lang]['invalid_range'])
+            targets = TargetSet(DEFAULT_TARGETS)
         protocols = {
             'usb': self.chk_usb.isChecked(),
             'network': self.chk_network.isChecked(),
@@ -404,20 +460,208 @@ class AdvancedDialog(QDialog):
             'mdns': self.chk_mdns.isChecked(),
         }
         model = self.model_search.text().strip()
-        return ip_range, protocols, model
+        return targets, protocols, model, self.cache_ttl.value() * 60, self.monitor_interval.value()
+
+DOWNLOAD_COLUMN = 4
+ROW_FLUSH_INTERVAL = 100  # ms
+FILTER_DEBOUNCE = 200  # ms
+def normalize_text(text):
+    return " ".join(str(text).casefold().split())
+
+def printer_search_key(p):
+    # الاسم الموحد يضاف للمفتاح حتى يطابق "lj m401" سجلاً باسم "HP LaserJet 400 M401dne"
+    fields = [str(p.get(field) or "") for field in ("printer_name", "driver_name", "driver_id", "model")]
+    return normalize_text(" ".join(fields + [model_matcher().record_signature(p).key]))
+
+def row_key(p):
+    # الصف الواحد جهاز مدمج من كل البروتوكولات التي رأته
+    return p.get("entity") or device_key(p)
+
+def record_types(p):
+    return [source["type"] for source in p.get("sources", ())] or [p.get("type")]
+
+class PrinterTableModel(QAbstractTableModel):
+    # جدول مبني على نموذج: تضاف الصفوف الجديدة فقط بدلاً من إعادة بناء الجدول
+    # التصفية تتم هنا على مفاتيح بحث محسوبة مسبقاً ثم إعادة ضبط واحدة للعرض
+    def __init__(self, tr, parent=None):
+        super().__init__(parent)
+        self.tr = tr
+        self.printers = []
+        self.keys = []
+        self.manufacturers = []
+        self.rows = {}
+        self.visible = []
+        self.positions = {}
+        self.terms = []
+        self.type_facet = ""
+        self.manufacturer_facet = ""
+
+    def set_translation(self, tr):
+        self.tr = tr
+        self.headerDataChanged.emit(Qt.Horizontal, 0, self.columnCount() - 1)
+        if self.visible:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.visible) - 1, self.columnCount() - 1))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.visible)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 5
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or orientation != Qt.Horizontal:
+            return None
+        return [self.tr['printer_name'], self.tr['driver_name'], self.tr['driver_id'], "Type", self.tr['download']][section]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        p = self.printers[self.visible[index.row()]]
+        column = index.column()
+        if column == 0:
+            return p["printer_name"]
+        if column == 1:
+            return p["driver_name"]
+        if column == 2:
+            return str(p["driver_id"])
+        if column == 3:
+            return " + ".join(self.tr.get(type_, type_ or "") for type_ in dict.fromkeys(record_types(p)))
+        return self.tr['download'] if role == Qt.DisplayRole else p["download_url"]
+
+    def record(self, row):
+        return self.printers[self.visible[row]]
+
+    def visible_records(self):
+        return [self.printers[i] for i in self.visible]
+
+    def store(self, i, p):
+        # مفاتيح البحث تحسب مرة واحدة لكل سجل وليس مع كل حرف
+        if i == len(self.printers):
+            self.printers.append(p)
+            self.keys.append(printer_search_key(p))
+            self.manufacturers.append(manufacturer_of(p))
+        else:
+            self.printers[i] = p
+            self.keys[i] = printer_search_key(p)
+            self.manufacturers[i] = manufacturer_of(p)
+
+    def accepts(self, i):
+        if self.type_facet and self.type_facet not in record_types(self.printers[i]):
+            return False
+        if self.manufacturer_facet and self.manufacturers[i] != self.manufacturer_facet:
+            return False
+        key = self.keys[i]
+        return all(term in key for term in self.terms)
+
+    def set_filter(self, text="", model="", type_facet="", manufacturer_facet=""):
+        terms = normalize_text(text).split() + normalize_text(model).split()
+        # إذا كان النص الجديد تضييقاً للسابق نبحث فقط في الصفوف الظاهرة حالياً
+        narrowing = (type_facet == self.type_facet and manufacturer_facet == self.manufacturer_facet
+                     and len(terms) >= len(self.terms) and all(old in new for old, new in zip(self.terms, terms)))
+        self.terms = terms
+        self.type_facet = type_facet
+        self.manufacturer_facet = manufacturer_facet
+        candidates = self.visible if narrowing else range(len(self.printers))
+        self.beginResetModel()
+        self.visible = [i for i in candidates if self.accepts(i)]
+        self.positions = {i: row for row, i in enumerate(self.visible)}
+        self.endResetModel()
+
+    def reset(self, printers):
+        self.beginResetModel()
+        self.printers = []
+        self.keys = []
+        self.manufacturers = []
+        self.rows = {}
+        for p in printers:
+            key = row_key(p)
+            if key not in self.rows:
+                self.rows[key] = len(self.printers)
+                self.store(len(self.printers), p)
+        self.visible = [i for i in range(len(self.printers)) if self.accepts(i)]
+        self.positions = {i: row for row, i in enumerate(self.visible)}
+        self.endResetModel()
+
+    def retain(self, keys):
+        # نهاية البحث: تحذف فقط الصفوف التي اختفت أجهزتها، وإذا لم يختف شيء لا يعاد رسم الجدول
+        self.keep_rows([i for i, p in enumerate(self.printers) if row_key(p) in keys])
+
+    def remove(self, keys):
+        # صفوف أجهزة اندمجت في جهاز آخر أثناء البحث
+        if keys and keys & self.rows.keys():
+            self.keep_rows([i for i, p in enumerate(self.printers) if row_key(p) not in keys])
+
+    def keep_rows(self, keep):
+        if len(keep) == len(self.printers):
+            return
+        self.beginResetModel()
+        printers, search_keys, manufacturers = self.printers, self.keys, self.manufacturers
+        self.printers = [printers[i] for i in keep]
+        self.keys = [search_keys[i] for i in keep]
+        self.manufacturers = [manufacturers[i] for i in keep]
+        self.rows = {row_key(p): i for i, p in enumerate(self.printers)}
+        self.visible = [i for i in range(len(self.printers)) if self.accepts(i)]
+        self.positions = {i: row for row, i in enumerate(self.visible)}
+        self.endResetModel()
+
+    def append_many(self, printers):
+        new = []
+        for p in printers:
+            key = row_key(p)
+            i = self.rows.get(key)
+            if i is None:
+                i = self.rows[key] = len(self.printers)
+                self.store(i, p)
+                if self.accepts(i):
+                    new.append(i)
+                continue
+            self.store(i, p)
+            row = self.positions.get(i)
+            if row is not None:
+                self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+        if not new:
+            return
+        first = len(self.visible)
+        self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+        for i in new:
+            self.positions[i] = len(self.visible)
+            self.visible.append(i)
+        self.endInsertRows()
+
+class DownloadDelegate(QStyledItemDelegate):
+    # زر مرسوم بدلاً من QPushButton لكل صف
+    clicked = pyqtSignal(int)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data(Qt.DisplayRole)
+        button.state = QStyle.State_Enabled | (option.state & QStyle.State_MouseOver)
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and option.rect.contains(event.pos()):
+            self.clicked.emit(index.row())
+            return True
+        return event.type() in (QEvent.MouseButtonPress, QEvent.MouseButtonDblClick)
 
 class MainWindow(QMainWindow):
+    # تقدم المجدول يصل من خيوط الفحص، فيمرر عبر إشارة إلى الخيط الرئيسي
+    scan_progress = pyqtSignal(int)
     def __init__(self, lang='en'):
         super().__init__()
         self.lang = lang
         self.tr = translations[self.lang]
         self.setWindowTitle(self.tr['title'])
         self.setGeometry(300, 100, 900, 600)
-        self.history = load_history()
-        self.network_scanner = None
-        self.adv_ip_range = (1, 254, "192.168.1")
+        self.session = None
+        self.adv_targets = TargetSet(DEFAULT_TARGETS)
         self.adv_protocols = {'usb': True, 'network': True, 'snmp': False, 'mdns': False}
         self.adv_model = ""
+        self.monitor_interval = MONITOR_INTERVAL
+        self.monitor_session = None
+        self.last_metrics = None
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
         self.layout = QVBoxLayout(self.central_widget)
@@ -427,13 +671,19 @@ class MainWindow(QMainWindow):
         about_action.triggered.connect(self.show_about)
         history_action = QAction(self.tr['history'], self)
         history_action.triggered.connect(self.show_history)
+        stats_action = QAction(self.tr['stats'], self)
+        stats_action.triggered.connect(self.show_stats)
         refresh_action = QAction(self.tr['refresh'], self)
         refresh_action.triggered.connect(self.refresh)
+        import_action = QAction(self.tr['import'], self)
+        import_action.triggered.connect(self.import_inventory)
         adv_action = QAction(self.tr['advanced'], self)
         adv_action.triggered.connect(self.show_advanced)
         menubar.addAction(about_action)
         menubar.addAction(history_action)
+        menubar.addAction(stats_action)
         menubar.addAction(refresh_action)
+        menubar.addAction(import_action)
         menubar.addAction(adv_action)
         self.setMenuBar(menubar)
 
@@ -451,9 +701,22 @@ class MainWindow(QMainWindow):
         filter_layout = QHBoxLayout()
         self.filter_edit = QLineEdit()
         self.filter_edit.setPlaceholderText(self.tr['filter'])
-        self.filter_edit.textChanged.connect(self.apply_filter)
+        # التصفية تنتظر توقف الكتابة قليلاً بدلاً من العمل مع كل حرف
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DEBOUNCE)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.filter_edit.textChanged.connect(self.filter_timer.start)
+        self.type_combo = QComboBox()
+        self.manufacturer_combo = QComboBox()
+        self.fill_type_facet()
+        self.manufacturer_combo.addItem(self.tr['all_manufacturers'], "")
+        self.type_combo.currentIndexChanged.connect(self.apply_filter)
+        self.manufacturer_combo.currentIndexChanged.connect(self.apply_filter)
         filter_layout.addWidget(QLabel(self.tr['filter']))
         filter_layout.addWidget(self.filter_edit)
+        filter_layout.addWidget(self.type_combo)
+        filter_layout.addWidget(self.manufacturer_combo)
         self.layout.addLayout(filter_layout)
 
         self.search_btn = QPushButton(self.tr['search'])
@@ -463,20 +726,29 @@ class MainWindow(QMainWindow):
         adv_btn_layout = QHBoxLayout()
         adv_btn_layout.addWidget(self.search_btn)
         adv_btn_layout.addWidget(self.advanced_btn)
+        self.cancel_btn = QPushButton(self.tr['cancel'])
+        self.cancel_btn.clicked.connect(self.cancel_search)
+        self.cancel_btn.setVisible(False)
+        adv_btn_layout.addWidget(self.cancel_btn)
+        self.monitor_chk = QCheckBox(self.tr['monitor'])
+        self.monitor_chk.toggled.connect(self.toggle_monitor)
+        adv_btn_layout.addWidget(self.monitor_chk)
         self.layout.addLayout(adv_btn_layout)
 
         self.progress = QProgressBar()
         self.progress.setVisible(False)
         self.layout.addWidget(self.progress)
 
-        self.table = QTableWidget(0, 5)
-        self.table.setHorizontalHeaderLabels([
-            self.tr['printer_name'],
-            self.tr['driver_name'],
-            self.tr['driver_id'],
-            "Type",
-            self.tr['download'],
-        ])
+        self.model = PrinterTableModel(self.tr, self)
+        self.model.rowsInserted.connect(self.update_manufacturer_facet)
+        self.model.modelReset.connect(self.update_manufacturer_facet)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setMouseTracking(True)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.download_delegate = DownloadDelegate(self.table)
+        self.download_delegate.clicked.connect(self.download_row)
+        self.table.setItemDelegateForColumn(DOWNLOAD_COLUMN, self.download_delegate)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.layout.addWidget(self.table)
 
@@ -484,6 +756,32 @@ class MainWindow(QMainWindow):
         self.layout.addWidget(self.status)
 
         self.all_printers = []
+        # الصفوف الواردة من الماسحات تجمع وتضاف دفعة واحدة كل ROW_FLUSH_INTERVAL
+        self.pending_rows = []
+        self.pending_removed = set()
+        # سجلات البروتوكولات تدمج أثناء البحث حتى تظهر كل طابعة في صف واحد
+        self.resolver = DeviceResolver()
+        self.row_timer = QTimer(self)
+        self.row_timer.setSingleShot(True)
+        self.row_timer.setInterval(ROW_FLUSH_INTERVAL)
+        self.row_timer.timeout.connect(self.flush_rows)
+        self.scheduler = ScanScheduler(on_progress=self.scan_progress.emit)
+        self.scan_progress.connect(self.progress.setValue)
+        self.cache_ttl = CACHE_TTL
+        # المخزن ولقطة التغييرات يفتحان عند أول بحث، فلقطة كبيرة لا تؤخر ظهور النافذة
+        self.stores = {}
+
+    @property
+    def cache(self):
+        if "cache" not in self.stores:
+            self.stores["cache"] = DeviceCache(ttl=self.cache_ttl)
+        return self.stores["cache"]
+
+    @property
+    def tracker(self):
+        if "tracker" not in self.stores:
+            self.stores["tracker"] = ChangeTracker()
+        return self.stores["tracker"]
 
     def switch_language(self):
         idx = self.lang_combo.currentIndex()
@@ -492,13 +790,11 @@ class MainWindow(QMainWindow):
         self.setWindowTitle(self.tr['title'])
         self.search_btn.setText(self.tr['search'])
         self.advanced_btn.setText(self.tr['advanced'])
-        self.table.setHorizontalHeaderLabels([
-            self.tr['printer_name'],
-            self.tr['driver_name'],
-            self.tr['driver_id'],
-            "Type",
-            self.tr['download'],
-        ])
+        self.cancel_btn.setText(self.tr['cancel'])
+        self.monitor_chk.setText(self.tr['monitor'])
+        self.model.set_translation(self.tr)
+        self.fill_type_facet()
+        self.manufacturer_combo.setItemText(0, self.tr['all_manufacturers'])
         self.status.setText("")
         self.setMenuBar(None)
         menubar = QMenuBar(self)
@@ -506,113 +802,180 @@ class MainWindow(QMainWindow):
         about_action.triggered.connect(self.show_about)
         history_action = QAction(self.tr['history'], self)
         history_action.triggered.connect(self.show_history)
+        stats_action = QAction(self.tr['stats'], self)
+        stats_action.triggered.connect(self.show_stats)
         refresh_action = QAction(self.tr['refresh'], self)
         refresh_action.triggered.connect(self.refresh)
+        import_action = QAction(self.tr['import'], self)
+        import_action.triggered.connect(self.import_inventory)
         adv_action = QAction(self.tr['advanced'], self)
         adv_action.triggered.connect(self.show_advanced)
         menubar.addAction(about_action)
         menubar.addAction(history_action)
+        menubar.addAction(stats_action)
         menubar.addAction(refresh_action)
+        menubar.addAction(import_action)
         menubar.addAction(adv_action)
         self.setMenuBar(menubar)
         self.filter_edit.setPlaceholderText(self.tr['filter'])
 
     def show_advanced(self):
-        dlg = AdvancedDialog(self.lang, self)
+        dlg = AdvancedDialog(self.lang, self, str(self.adv_targets), self.cache_ttl, self.monitor_interval)
         if dlg.exec_():
-            self.adv_ip_range, self.adv_protocols, self.adv_model = dlg.get_options()
+            self.adv_targets, self.adv_protocols, self.adv_model, self.cache_ttl, self.monitor_interval = dlg.get_options()
+            if "cache" in self.stores:
+                self.cache.ttl = self.cache_ttl
+            self.apply_filter()
+            # المراقبة الجارية تبدأ من جديد بالأهداف والفترة الجديدة
+            if self.monitor_session:
+                self.stop_monitor()
+                self.start_monitor()
 
-    def search_printers(self):
+    def search_printers(self, force=False):
+        # بحث جديد يلغي أي بحث ما زال يعمل بدلاً من تشغيل خيوط إضافية، ويوقف المراقبة لأن الاثنين يعدلان نفس الجدول
+        if self.session:
+            self.session.cancel()
+        self.monitor_chk.setChecked(False)
         self.status.setText(self.tr['searching'])
         self.progress.setVisible(True)
         self.progress.setValue(0)
         QApplication.processEvents()
-        self.table.setRowCount(0)
-        threads = []
-        self.all_printers = []
-        count_protocols = sum(self.adv_protocols.values())
-        count_finished = [0]  # list to be mutable in closure
-
-        def add_printers(printers):
-            self.all_printers += printers
-            count_finished[0] += 1
-            if count_finished[0] == count_protocols:
-                self.progress.setValue(100)
-                self.progress.setVisible(False)
-                self.display_printers(self.all_printers)
-                for p in self.all_printers:
-                    entry = f"{p['printer_name']} | {p['driver_name']} | {p['driver_id']} | {p.get('type','-')}"
-                    save_to_history(entry)
-        def progress_callback(val):
-            self.progress.setValue(val)
-
-        if self.adv_protocols.get('usb'):
-            self.status.setText(self.tr['searching_usb'])
-            QApplication.processEvents()
-            def usb_worker():
-                printers = find_usb_printers_safe()
-                self.progress.setValue(100)
-                add_printers(printers)
-            t = threading.Thread(target=usb_worker, daemon=True)
-            t.start()
-            threads.append(t)
-        if self.adv_protocols.get('network'):
-            self.status.setText(self.tr['searching_network'])
-            self.network_scanner = NetworkScanner(self.adv_ip_range)
-            self.network_scanner.progress.connect(progress_callback)
-            self.network_scanner.finished.connect(add_printers)
-            threading.Thread(target=self.network_scanner.scan, daemon=True).start()
-        if self.adv_protocols.get('snmp'):
-            self.status.setText(self.tr['searching_snmp'])
-            self.snmp_scanner = SNMPScanner(self.adv_ip_range)
-            self.snmp_scanner.progress.connect(progress_callback)
-            self.snmp_scanner.finished.connect(add_printers)
-            threading.Thread(target=self.snmp_scanner.scan, daemon=True).start()
-        if self.adv_protocols.get('mdns'):
-            self.status.setText(self.tr['searching_mdns'])
-            self.mdns_scanner = MDNSScanner(timeout=2)
-            self.mdns_scanner.progress.connect(progress_callback)
-            self.mdns_scanner.finished.connect(add_printers)
-            threading.Thread(target=self.mdns_scanner.scan, daemon=True).start()
-
-    def finish_search(self, printers, net_printers):
+        protocols = [name for name in ('usb', 'network', 'snmp', 'mdns') if self.adv_protocols.get(name)]
+        targets = self.adv_targets
+        metrics = self.last_metrics = ScanMetrics()
+        # النتائج المخزنة تظهر فوراً، ثم يعاد فحص ما انتهت صلاحيته فقط في الخلفية
+        with metrics.phase("cache"):
+            cached = self.cache.load(set(protocols), targets)
+            self.pending_rows = []
+            self.pending_removed = set()
+            self.resolver = DeviceResolver()
+            for p in cached:
+                self.resolver.link(p)
+            self.model.reset(self.resolver.devices())
+            scopes = sweep_scopes(protocols, targets)
+            stale = [name for name in protocols if force or not self.cache.is_fresh(scopes[name])]
+        self.all_printers = [p for p in cached if p.get('type') not in stale]
+        if not stale:
+            self.session = None
+            self.progress.setVisible(False)
+            self.display_printers(self.all_printers)
+            return
+        session = self.session = ScanSession(stale, targets, scopes, self)
+        session.device_found.connect(self.on_device_found)
+        session.protocol_finished.connect(self.on_protocol_finished)
+        self.cancel_btn.setVisible(True)
+        self.show_searching(stale)
+        QApplication.processEvents()
+        job = ScanJob(self.scheduler, stale, targets, session.found, session.finish,
+                      known_models={} if force else self.cache.known_models(), cancel=session.token, metrics=metrics)
+        session.generation = job.start()
+
+    def show_searching(self, protocols):
+        # كل البروتوكولات الجارية معاً، بدل أن يغطي آخرها على الباقي
+        self.status.setText("  |  ".join(self.tr['searching_' + name] for name in ('usb', 'snmp', 'network', 'mdns') if name in protocols))
+
+    def on_device_found(self, session_id, p):
+        if self.session and self.session.id == session_id:
+            self.show_found_printer(p)
+
+    def on_protocol_finished(self, session_id, name, printers):
+        # يعمل دائماً في الخيط الرئيسي؛ نتائج جلسة ملغاة أو قديمة تهمل
+        session = self.session
+        if not session or session.id != session_id or session.cancelled:
+            return
+        self.cache.record_sweep(name, printers, session.started, session.scopes[name], session.targets if uses_targets(name) else None)
+        session.changes += self.tracker.update(name, printers, session.targets if uses_targets(name) else None)
+        self.all_printers += printers
+        session.pending.discard(name)
+        if session.pending:
+            self.show_searching(session.pending)
+            return
+        self.session = None
+        self.cancel_btn.setVisible(False)
         self.progress.setValue(100)
         self.progress.setVisible(False)
-        all_printers = printers + net_printers
-        self.display_printers(all_printers)
-        for p in all_printers:
-            entry = f"{p['printer_name']} | {p['driver_name']} | {p['driver_id']} | {p.get('type','-')}"
-            save_to_history(entry)
+        with self.last_metrics.phase("display"):
+            self.show_changes(session.changes)
+        with self.last_metrics.phase("history"):
+            history_store().record_session(self.all_printers, session.started, protocols=list(session.scopes), targets=session.targets)
+
+    def cancel_search(self):
+        if self.session:
+            self.session.cancel()
+            self.session = None
+        self.cancel_btn.setVisible(False)
+        self.progress.setVisible(False)
+        self.status.setText(self.tr['cancelled'])
+
+    def show_found_printer(self, p):
+        # عرض الطابعة فور اكتشافها بدون انتظار انتهاء الفحص، مدمجة مع ما رأته البروتوكولات الأخرى منها
+        device, removed = self.resolver.add(p)
+        self.pending_removed.update(removed)
+        self.pending_rows.append(device)
+        if not self.row_timer.isActive():
+            self.row_timer.start()
+
+    def flush_rows(self):
+        rows, self.pending_rows = self.pending_rows, []
+        removed, self.pending_removed = self.pending_removed, set()
+        self.model.remove({key for key in removed if not self.resolver.is_live(key)})
+        self.model.append_many([p for p in rows if self.resolver.is_live(p["entity"])])
+
+    def show_changes(self, changes):
+        # الجدول فيه أصلاً ما بث أثناء البحث؛ يبقى فقط حذف ما اختفى
+        self.row_timer.stop()
+        self.flush_rows()
+        # الدمج النهائي من نتائج هذا البحث فقط، فالأجهزة المخزنة التي لم تعد موجودة تسقط من الجدول
+        devices = merge_devices(self.all_printers)
+        self.model.retain({row_key(p) for p in devices})
+        self.model.append_many(devices)
+        if not self.model.rowCount():
+            QMessageBox.information(self, self.tr['title'], self.tr['no_printers'])
+        self.update_status()
+        if changes:
+            self.status.setText(self.status.text() + "  " + self.tr['changes'].format(**summarize_changes(changes)))
+        # المهلات والمحاولات التي اختارها المجدول لكل شبكة بعد قياس RTT
+        timing = self.scheduler.timing_stats()
+        self.status.setToolTip("\n".join(self.tr['timing_line'].format(name=name, **s) for name, stats in timing.items() for s in stats))
 
     def display_printers(self, printers):
-        filter_text = self.filter_edit.text().strip().lower()
-        if filter_text:
-            filtered = [p for p in printers if filter_text in p["printer_name"].lower() or filter_text in p["driver_name"].lower()]
-        else:
-            filtered = printers
-        if self.adv_model:
-            filtered = [p for p in filtered if self.adv_model.lower() in p["printer_name"].lower() or self.adv_model.lower() in p["driver_name"].lower()]
-        self.table.setRowCount(0)
-        if not filtered:
+        self.pending_rows = []
+        self.pending_removed = set()
+        self.model.reset(merge_devices(printers))
+        if not self.model.rowCount():
             QMessageBox.information(self, self.tr['title'], self.tr['no_printers'])
-            self.status.setText(self.tr['no_printers'])
-            return
-        self.table.setRowCount(len(filtered))
-        for row, p in enumerate(filtered):
-            self.table.setItem(row, 0, QTableWidgetItem(p["printer_name"]))
-            self.table.setItem(row, 1, QTableWidgetItem(p["driver_name"]))
-            self.table.setItem(row, 2, QTableWidgetItem(str(p["driver_id"])))
-            ttype = self.tr.get(p.get("type"), p.get("type", ""))
-            self.table.setItem(row, 3, QTableWidgetItem(ttype))
-            btn = QPushButton(self.tr['download'])
-            btn.clicked.connect(lambda _, url=p["download_url"]: self.download_driver(url))
-            self.table.setCellWidget(row, 4, btn)
-        self.status.setText(self.tr['found'].format(n=len(filtered)))
+        self.update_status()
+
+    def update_status(self):
+        n = self.model.rowCount()
+        self.status.setText(self.tr['found'].format(n=n) if n else self.tr['no_printers'])
 
     def apply_filter(self):
-        self.display_printers(self.all_printers)
+        self.filter_timer.stop()
+        self.model.set_filter(self.filter_edit.text(), self.adv_model,
+                              self.type_combo.currentData() or "", self.manufacturer_combo.currentData() or "")
+        self.update_status()
+
+    def fill_type_facet(self):
+        current = self.type_combo.currentData()
+        self.type_combo.blockSignals(True)
+        self.type_combo.clear()
+        self.type_combo.addItem(self.tr['all_types'], "")
+        for name in ('usb', 'network', 'snmp', 'mdns'):
+            self.type_combo.addItem(self.tr[name], name)
+        self.type_combo.setCurrentIndex(max(0, self.type_combo.findData(current or "")))
+        self.type_combo.blockSignals(False)
+
+    def update_manufacturer_facet(self, *args):
+        known = {self.manufacturer_combo.itemData(i) for i in range(self.manufacturer_combo.count())}
+        for name in sorted(set(self.model.manufacturers) - known - {""}):
+            self.manufacturer_combo.addItem(name, name)
+
+    def download_row(self, row):
+        self.download_driver(self.model.record(row)["download_url"])
 
     def download_driver(self, url):
+        import webbrowser
         webbrowser.open(url)
 
     def show_about(self):
@@ -620,29 +983,80 @@ class MainWindow(QMainWindow):
         dlg.exec_()
 
     def show_history(self):
-        self.history = load_history()
-        dlg = HistoryDialog(self.history, self.lang, self)
+        dlg = HistoryDialog(history_store(), self.lang, self)
+        dlg.exec_()
+
+    def show_stats(self):
+        dlg = StatsDialog(self.last_metrics, total_metrics(), self.scheduler.timing_stats(), self.lang, self)
         dlg.exec_()
 
     def refresh(self):
-        self.search_printers()
+        self.search_printers(force=True)
+
+    def import_inventory(self):
+        # جرد سابق أو من CMDB يملأ المخزن ولقطة التغييرات ثم يعرض، والبحث التالي يقارن به
+        path, _ = QFileDialog.getOpenFileName(self, self.tr['import'], "", IMPORT_FILTERS)
+        if not path:
+            return
+        try:
+            n = import_inventory(path, self.cache, self.tracker)
+        except (ValueError, ImportError, OSError) as e:
+            QMessageBox.warning(self, self.tr['import'], str(e))
+            return
+        self.monitor_chk.setChecked(False)
+        self.all_printers = self.cache.load()
+        self.display_printers(self.all_printers)
+        self.status.setText(self.status.text() + "  " + self.tr['imported'].format(n=n))
+
+    def toggle_monitor(self, checked):
+        if checked:
+            self.start_monitor()
+        else:
+            self.stop_monitor()
+
+    def start_monitor(self):
+        # الجدول الحالي هو أساس المقارنة، فلا يمس بعدها إلا صف جهاز تغير أو ظهر أو اختفى
+        self.cancel_search()
+        protocols = [name for name in ('usb', 'network', 'snmp', 'mdns') if self.adv_protocols.get(name)]
+        monitor = ScanMonitor(protocols, self.adv_targets, self.monitor_interval, self.cache, self.tracker, history_store(), self.scheduler)
+        updated, removed = monitor.seed(self.all_printers)
+        self.model.retain({row_key(p) for p in updated})
+        self.model.append_many(updated)
+        self.monitor_session = MonitorSession(monitor, self)
+        self.monitor_session.swept.connect(self.on_monitor_sweep)
+        self.monitor_session.start()
+        self.status.setText(self.tr['monitoring'].format(n=self.model.rowCount(), targets="-"))
+
+    def stop_monitor(self):
+        if not self.monitor_session:
+            return
+        self.monitor_session.cancel()
+        self.all_printers = [p for records in self.monitor_session.monitor.records for p in records.values()]
+        self.monitor_session = None
+        self.update_status()
+
+    def on_monitor_sweep(self, monitor_id, sweep):
+        if not self.monitor_session or self.monitor_session.id != monitor_id:
+            return
+        self.model.remove(set(sweep["removed"]))
+        self.model.append_many(sweep["updated"])
+        status = self.tr['monitoring'].format(n=self.model.rowCount(), targets=sweep["targets"] or self.tr['monitor_all'])
+        if sweep["changes"]:
+            status += "  " + self.tr['changes'].format(**summarize_changes(sweep["changes"]))
+        self.status.setText(status)
 
 def main():
     app = QApplication(sys.argv)
-    # شاشة تحميل بيضاء فقط بدون صورة
+    # شاشة تحميل بيضاء فقط بدون صورة، تبقى فقط أثناء بناء النافذة ثم تظهر النافذة فوراً
     splash_pix = QPixmap(400, 300)
     splash_pix.fill(Qt.white)
     splash = QSplashScreen(splash_pix, Qt.WindowStaysOnTopHint)
-    splash.setFont(splash.font())
-    splash.showMessage("Loading... 0%", Qt.AlignBottom | Qt.AlignCenter, Qt.black)
+    splash.showMessage(translations['en']['loading'], Qt.AlignBottom | Qt.AlignCenter, Qt.black)
     splash.show()
-    for i in range(1, 101):
-        QTimer.singleShot(i*10, lambda p=i: splash.showMessage(f"Loading... {p}%", Qt.AlignBottom | Qt.AlignCenter, Qt.black))
-    def start_main():
-        app.main_win = MainWindow()
-        app.main_win.show()
-        splash.finish(app.main_win)
-    QTimer.singleShot(1300, start_main)
+    app.processEvents()
+    app.main_win = MainWindow()
+    app.main_win.show()
+    splash.finish(app.main_win)
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+# Printer Driver Finder - تصدير الجرد والسجل واستيراده بصيغ NDJSON و CSV و Parquet/Arrow
+# جميع الحقوق محفوظة © khalid aldawish 2025
+
+import os
+import sys
+import abc
+import csv
+import json
+import time
+import argparse
+import threading
+
+from printer_discovery import CACHE_FILE, HISTORY_DB, DeviceCache, HistoryStore, device_key
+from printer_inventory import SNAPSHOT_FILE, ChangeTracker
+
+EXPORT_FORMATS = ("ndjson", "csv", "parquet", "arrow")
+EXPORT_EXTENSIONS = {".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv", ".parquet": "parquet",
+                     ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+EXPORT_BATCH = 4096  # صفوف في كل دفعة Arrow وفي كل معاملة SQLite عند الاستيراد
+# أعمدة مسطحة لأنظمة CMDB والجداول، وعمود record يحمل السجل كاملاً حتى يعود الاستيراد بلا فقد
+EXPORT_COLUMNS = ("time", "key", "type", "driver_id", "printer_name", "model", "driver_name", "download_url", "mac", "serial", "agent",
+                  "entity", "record")
+# للقراءة فقط: مخرجات -f json من printer_discovery.py (مستند مفهرس لكل فحص) تقرأ بنفس قارئ NDJSON
+IMPORT_EXTENSIONS = dict(EXPORT_EXTENSIONS, **{".json": "ndjson"})
+EXPORT_FILTERS = "CSV (*.csv);;NDJSON (*.ndjson *.jsonl);;Parquet (*.parquet);;Arrow (*.arrow *.feather)"
+IMPORT_FILTERS = "CSV (*.csv);;NDJSON/JSON (*.ndjson *.jsonl *.json);;Parquet (*.parquet);;Arrow (*.arrow *.feather)"
+RECORD_DEFAULTS = {"type": "network", "printer_name": "", "driver_name": "", "download_url": ""}
+
+def export_format(path, fmt=None, extensions=EXPORT_EXTENSIONS):
+    fmt = fmt or extensions.get(os.path.splitext(path)[1].lower())
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format for {path}; use one of {', '.join(EXPORT_FORMATS)}")
+    return fmt
+
+def require_pyarrow():
+    # pyarrow اختياري مثل zeroconf و pyusb؛ يحمل فقط عند طلب Parquet أو Arrow
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("parquet and arrow need pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+def export_row(p, when=None, key=None):
+    row = {name: None if p.get(name) is None else str(p.get(name)) for name in EXPORT_COLUMNS[2:-1]}
+    row["time"] = when
+    row["key"] = key or device_key(p)
+    row["record"] = json.dumps(p, ensure_ascii=False, separators=(",", ":"))
+    return row
+
+def row_record(row):
+    # السجل الكامل إن وجد، وإلا يبنى من الأعمدة (ملف CSV من CMDB مثلاً)؛ الصف بلا driver_id يهمل
+    if row.get("record"):
+        return json.loads(row["record"])
+    p = {name: row[name] for name in EXPORT_COLUMNS[2:-1] if row.get(name) not in (None, "")}
+    if "driver_id" not in p:
+        return None
+    p.setdefault("printer_name", p.get("model") or p["driver_id"])
+    for name, value in RECORD_DEFAULTS.items():
+        p.setdefault(name, value)
+    return p
+
+class InventoryWriter(abc.ABC):
+    # كاتب متدفق: كل سجل يكتب عند وصوله (أو مع دفعته في Arrow)، وآمن للاستدعاء من خيوط الماسحات
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def write(self, p, when=None, key=None):
+        row = self.row(p, when, key)
+        with self.lock:
+            self.write_row(row)
+            self.count += 1
+
+    def row(self, p, when=None, key=None):
+        return export_row(p, when, key)
+
+    @abc.abstractmethod
+    def write_row(self, row):
+        ...
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class NDJSONWriter(InventoryWriter):
+    # سطر لكل سجل كما هو مع وقته ومفتاحه، بنفس شكل سطور --format ndjson
+    def __init__(self, path):
+        super().__init__(path)
+        self.stream = open(path, "w", encoding="utf-8")
+
+    def row(self, p, when=None, key=None):
+        return dict(p, time=when, key=key or device_key(p)) if when is not None or key else p
+
+    def write_row(self, row):
+        self.stream.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def close(self):
+        self.stream.close()
+
+class CSVWriter(InventoryWriter):
+    def __init__(self, path):
+        super().__init__(path)
+        self.stream = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.stream, EXPORT_COLUMNS)
+        self.writer.writeheader()
+
+    def write_row(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.stream.close()
+
+class ArrowWriter(InventoryWriter):
+    # الصفوف تجمع أعمدة حتى EXPORT_BATCH ثم تكتب كمجموعة صفوف Parquet أو دفعة Arrow IPC، فالذاكرة بقدر دفعة واحدة
+    def __init__(self, path, fmt="parquet", batch=EXPORT_BATCH):
+        super().__init__(path)
+        pa = self.pa = require_pyarrow()
+        self.batch = batch
+        self.schema = pa.schema([("time", pa.float64())] + [(name, pa.string()) for name in EXPORT_COLUMNS[1:]])
+        if fmt == "parquet":
+            import pyarrow.parquet
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+        else:
+            import pyarrow.ipc
+            self.writer = pyarrow.ipc.new_file(path, self.schema)
+        self.columns = {name: [] for name in EXPORT_COLUMNS}
+
+    def write_row(self, row):
+        for name in EXPORT_COLUMNS:
+            self.columns[name].append(row[name])
+        if len(self.columns["key"]) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.columns["key"]:
+            self.writer.write_table(self.pa.Table.from_pydict(self.columns, self.schema))
+            self.columns = {name: [] for name in EXPORT_COLUMNS}
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.writer.close()
+
+def open_writer(path, fmt=None):
+    fmt = export_format(path, fmt)
+    if fmt == "ndjson":
+        return NDJSONWriter(path)
+    if fmt == "csv":
+        return CSVWriter(path)
+    return ArrowWriter(path, fmt)
+
+def line_records(obj):
+    # سطور NDJSON قد تكون سجلات، أو أجهزة مدمجة (sources)، أو مستند فحص (printers)، أو خطوة مراقبة (updated)، أو تغييرات تهمل
+    # خطوة المراقبة تحمل updated و removed معاً، فتفحص قبل سطور removed المنفردة
+    if "updated" in obj:
+        return [p for device in obj["updated"] for p in device.get("sources", [device])]
+    if "change" in obj or "removed" in obj:
+        return []
+    if "printers" in obj:
+        return obj["printers"]
+    if "sources" in obj:
+        return obj["sources"]
+    return [obj]
+
+def read_rows(path, fmt, batch):
+    # دفعات من الصفوف أو السجلات، فملف بعشرات الآلاف من الأجهزة لا يحمل كاملاً
+    if fmt == "ndjson":
+        rows = []
+        document = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                # مستند json.dump بمسافات يبدأ بسطر "{" وينتهي بسطر "}" في أول العمود، فيجمع ثم يقرأ مرة واحدة
+                if document or line.rstrip() == "{":
+                    document.append(line)
+                    if line.rstrip() == "}":
+                        rows += line_records(json.loads("".join(document)))
+                        document = []
+                elif line.strip():
+                    rows += line_records(json.loads(line))
+                if len(rows) >= batch:
+                    yield rows
+                    rows = []
+        yield rows
+    elif fmt == "csv":
+        csv.field_size_limit(1 << 24)
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = []
+            for row in csv.DictReader(f):
+                rows.append(row)
+                if len(rows) >= batch:
+                    yield rows
+                    rows = []
+            yield rows
+    elif fmt == "parquet":
+        require_pyarrow()
+        import pyarrow.parquet
+        for chunk in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch):
+            yield chunk.to_pylist()
+    else:
+        require_pyarrow()
+        import pyarrow.ipc
+        with pyarrow.ipc.open_file(path) as reader:
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).to_pylist()
+
+def read_inventory(path, fmt=None, batch=EXPORT_BATCH):
+    # دفعات من السجلات الجاهزة للمخزن ولقطة التغييرات
+    fmt = export_format(path, fmt, IMPORT_EXTENSIONS)
+    for rows in read_rows(path, fmt, batch):
+        records = []
+        for row in rows:
+            p = row if fmt == "ndjson" else row_record(row)
+            if p and p.get("driver_id") is not None:
+                if fmt == "ndjson":
+                    p = {name: value for name, value in p.items() if name not in ("time", "key")}
+                    for name, value in RECORD_DEFAULTS.items():
+                        p.setdefault(name, value)
+                records.append(p)
+        if records:
+            yield records
+
+def import_inventory(path, cache=None, tracker=None, fmt=None, batch=EXPORT_BATCH, now=None):
+    # جرد سابق (من هذه الأداة أو من CMDB) يصبح مخزن الأجهزة وأساس المقارنة: معاملة SQLite واحدة لكل دفعة
+    # لا يسجل كفحص: البحث التالي يعيد الفحص لكنه يعرض المستورد فوراً ويقارن به
+    now = now or time.time()
+    count = 0
+    for records in read_inventory(path, fmt, batch):
+        if cache:
+            cache.put_many(records, now)
+        if tracker:
+            tracker.seed(records, now)
+        count += len(records)
+    return count
+
+def export_records(records, path, fmt=None):
+    # records: سجلات أو (السجل، الوقت، المفتاح)؛ يعيد عدد الصفوف
+    with open_writer(path, fmt) as writer:
+        for item in records:
+            if isinstance(item, dict):
+                writer.write(item)
+            else:
+                writer.write(*item)
+    return writer.count
+
+def export_cache(cache, path, fmt=None):
+    return export_records(((p, last_seen) for p, last_seen in cache.iter_records()), path, fmt)
+
+def export_history(history, path, fmt=None, since=None, until=None):
+    return export_records(((p, seen, key) for seen, key, p in history.iter_sightings(since, until)), path, fmt)
+
+def export_snapshot(tracker, path, fmt=None):
+    return export_records(((p, None, key) for key, p in tracker.baseline().items()), path, fmt)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="printer_export", description="Export the device cache, change snapshot or history, "
+                                     "or import an inventory into the cache and change snapshot.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="write a store to NDJSON, CSV, Parquet or Arrow")
+    export.add_argument("source", choices=("cache", "snapshot", "history"))
+    export.add_argument("-o", "--output", required=True, help="output file; the format follows the extension unless -f is given")
+    export.add_argument("-f", "--format", choices=EXPORT_FORMATS)
+    export.add_argument("--db", help=f"store to read (default: {CACHE_FILE}, {SNAPSHOT_FILE} or {HISTORY_DB})")
+    export.add_argument("--since", type=float, help="history only: sightings at or after this Unix time")
+    imp = sub.add_parser("import", help="seed the device cache and change snapshot from an inventory file")
+    imp.add_argument("input", help="NDJSON or JSON (records, scan documents or devices), CSV with at least driver_id, Parquet or Arrow")
+    imp.add_argument("-f", "--format", choices=EXPORT_FORMATS)
+    imp.add_argument("--cache", default=CACHE_FILE, help="device cache to fill (default: %(default)s; '' to skip)")
+    imp.add_argument("--changes", default=SNAPSHOT_FILE, help="change snapshot to fill (default: %(default)s; '' to skip)")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    try:
+        if args.command == "export":
+            if args.source == "cache":
+                count = export_cache(DeviceCache(args.db or CACHE_FILE), args.output, args.format)
+            elif args.source == "snapshot":
+                count = export_snapshot(ChangeTracker(args.db or SNAPSHOT_FILE), args.output, args.format)
+            else:
+                count = export_history(HistoryStore(args.db or HISTORY_DB, legacy=None), args.output, args.format, args.since)
+        else:
+            count = import_inventory(args.input, DeviceCache(args.cache) if args.cache else None,
+                                     ChangeTracker(args.changes) if args.changes else None, args.format)
+    except (ValueError, ImportError, OSError) as e:
+        print(f"printer_export: {e}", file=sys.stderr)
+        return 1
+    print(f"{args.command}: {count} records in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+# Printer Driver Finder - هوية الأجهزة ومقارنة نتائج البحث بالبحث السابق
+# جميع الحقوق محفوظة © khalid aldawish 2025
+
+import re
+import json
+import time
+import sqlite3
+import threading
+
+from printer_models import model_matcher
+
+SNAPSHOT_FILE = "printer_snapshot.db"
+CHANGE_KINDS = ("appeared", "disappeared", "ip_changed", "model_changed")
+# معرف IEEE 1284 قد يحمل الرقم التسلسلي في SN أو SERN
+DEVICE_ID_SERIAL = re.compile(r"(?:^|;)\s*(?:SN|SERN|SERIALNUMBER)\s*:([^;]*)", re.I)
+
+def clean_serial(value):
+    value = re.sub(r"\s+", "", str(value or "")).upper()
+    # بعض الأجهزة ترد بأصفار أو نص ثابت بدل الرقم الحقيقي
+    return value if len(value) >= 4 and value.strip("0X?") else None
+
+def device_serial(p):
+    serial = clean_serial(p.get("serial"))
+    if not serial:
+        match = DEVICE_ID_SERIAL.search(p.get("device_id") or "")
+        serial = clean_serial(match.group(1)) if match else None
+    return serial
+
+def device_identifiers(p):
+    # من الأثبت إلى الأضعف: الرقم التسلسلي، ثم MAC، ثم العنوان (IP أو VID:PID) كحل أخير
+    ids = {}
+    serial = device_serial(p)
+    if serial:
+        ids["serial"] = serial
+    if p.get("mac"):
+        ids["mac"] = p["mac"].lower()
+    ids["address"] = str(p.get("driver_id"))
+    return ids
+
+def identity_key(p):
+    # كل بروتوكول يبقى سجلاً منفصلاً لنفس الطابعة، فالنوع جزء من المفتاح
+    ids = device_identifiers(p)
+    for name in ("serial", "mac", "address"):
+        if name in ids:
+            return f"{p.get('type', '-')}/{name}:{ids[name]}"
+
+def model_signature_key(p):
+    return model_matcher().record_signature(p).key or p.get("model") or p.get("printer_name") or ""
+
+def record_fingerprint(p):
+    return json.dumps(p, sort_keys=True, ensure_ascii=False)
+
+class SnapshotDiff:
+    # مقارنة نتيجة بحث بآخر لقطة لنفس النطاق؛ الأجهزة تطابق بالهوية الثابتة لا بالعنوان
+    def __init__(self, baseline):
+        self.baseline = baseline  # key -> record
+        self.by_id = {"serial": {}, "mac": {}, "address": {}}
+        for key, p in baseline.items():
+            for name, value in device_identifiers(p).items():
+                self.by_id[name].setdefault((p.get("type"), value), key)
+
+    def match(self, p, taken):
+        ids = device_identifiers(p)
+        for name in ("serial", "mac"):
+            key = self.by_id[name].get((p.get("type"), ids.get(name)))
+            if key and key not in taken:
+                return key
+        # نفس العنوان يكفي فقط إذا لم تتعارض هوية أقوى: عنوان أعيد توزيعه لجهاز آخر ليس نفس الجهاز
+        key = self.by_id["address"].get((p.get("type"), ids["address"]))
+        if key and key not in taken:
+            old = device_identifiers(self.baseline[key])
+            if not any(name in ids and name in old and ids[name] != old[name] for name in ("serial", "mac")):
+                return key
+        return None
+
+    def compare(self, printers, in_scope=None):
+        # in_scope(record) يحدد أي أجهزة اللقطة السابقة كان يجب أن تظهر في هذا البحث
+        changes, current, taken = [], {}, set()
+        for p in printers:
+            key = identity_key(p)
+            if key in current:
+                continue
+            old_key = self.match(p, taken)
+            current[key] = p
+            if old_key is None:
+                changes.append({"change": "appeared", "key": key, "record": p})
+                continue
+            taken.add(old_key)
+            old = self.baseline[old_key]
+            if str(old.get("driver_id")) != str(p.get("driver_id")):
+                changes.append({"change": "ip_changed", "key": key, "record": p, "before": old.get("driver_id"),
+                                "after": p.get("driver_id")})
+            before, after = model_signature_key(old), model_signature_key(p)
+            if before and after and before != after:
+                changes.append({"change": "model_changed", "key": key, "record": p, "before": old.get("model") or old.get("printer_name"),
+                                "after": p.get("model") or p.get("printer_name")})
+        for key, old in self.baseline.items():
+            if key not in taken and (in_scope is None or in_scope(old)):
+                changes.append({"change": "disappeared", "key": key, "record": old})
+        return changes, current, taken
+
+def summarize_changes(changes):
+    counts = dict.fromkeys(CHANGE_KINDS, 0)
+    for change in changes:
+        counts[change["change"]] += 1
+    return counts
+
+class ChangeTracker:
+    # آخر لقطة لكل جهاز في SQLite ونسخة في الذاكرة؛ بعد كل بحث تكتب فقط السجلات التي تغيرت
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS snapshot (key TEXT PRIMARY KEY, type TEXT, record TEXT, first_seen REAL, "
+                            "changed REAL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS changes (time REAL, change TEXT, key TEXT, before TEXT, after TEXT, record TEXT)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS changes_key ON changes (key, time)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS changes_time ON changes (time)")
+            rows = self.db.execute("SELECT key, record FROM snapshot").fetchall()
+        self.records = {key: json.loads(record) for key, record in rows}
+        self.fingerprints = {key: record for key, record in rows}
+        self.written = 0
+
+    def baseline(self, types=None):
+        with self.lock:
+            return {key: p for key, p in self.records.items() if types is None or p.get("type") in types}
+
+    def diff(self, type_, printers, targets=None):
+        # بدون كتابة: ما الذي تغير في بروتوكول واحد منذ آخر لقطة
+        def in_scope(p):
+            return targets is None or str(p.get("driver_id")) in targets
+        return SnapshotDiff(self.baseline({type_})).compare(printers, in_scope)[0]
+
+    def update(self, type_, printers, targets=None, now=None):
+        # نتيجة فحص كامل لبروتوكول واحد، بنفس قواعد DeviceCache.record_sweep: ما اختفى يحذف فقط من النطاق المفحوص
+        now = now or time.time()
+        def in_scope(p):
+            return targets is None or str(p.get("driver_id")) in targets
+        baseline = self.baseline({type_})
+        changes, current, taken = SnapshotDiff(baseline).compare(printers, in_scope)
+        gone = [change["key"] for change in changes if change["change"] == "disappeared"]
+        # المفتاح القديم قد يختلف عن الجديد (ظهر MAC أو رقم تسلسلي لأول مرة)، فيحذف القديم ويكتب الجديد
+        old_keys = set(baseline) & taken
+        writes = []
+        with self.lock:
+            fingerprints = {key: record_fingerprint(p) for key, p in current.items()}
+            moved = [key for key in old_keys if key not in current]
+            for key, p in current.items():
+                if self.fingerprints.get(key) != fingerprints[key]:
+                    writes.append((key, type_, fingerprints[key], now, now))
+            with self.db:
+                self.db.executemany("DELETE FROM snapshot WHERE key = ?", [(key,) for key in gone + moved])
+                self.db.executemany("INSERT INTO snapshot VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                                    "record = excluded.record, changed = excluded.changed", writes)
+                self.db.executemany("INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?)",
+                                    [(now, c["change"], c["key"], json.dumps(c.get("before")), json.dumps(c.get("after")),
+                                      json.dumps(c["record"], ensure_ascii=False)) for c in changes])
+            for key in gone + moved:
+                self.records.pop(key, None)
+                self.fingerprints.pop(key, None)
+            for key, *_ in writes:
+                self.records[key] = current[key]
+                self.fingerprints[key] = fingerprints[key]
+            self.written = len(writes) + len(gone) + len(moved)
+        for change in changes:
+            change["time"] = now
+        return changes
+
+    def seed(self, printers, now=None):
+        # أساس مقارنة من جرد مستورد: يكتب اللقطة بلا سجل تغييرات، فأول بحث بعده يقارن بالجرد لا بلقطة فارغة
+        now = now or time.time()
+        current = {}
+        for p in printers:
+            current.setdefault(identity_key(p), p)
+        with self.lock:
+            fingerprints = {key: record_fingerprint(p) for key, p in current.items()}
+            writes = [(key, p.get("type"), fingerprints[key], now, now) for key, p in current.items()
+                      if self.fingerprints.get(key) != fingerprints[key]]
+            with self.db:
+                self.db.executemany("INSERT INTO snapshot VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                                    "record = excluded.record, changed = excluded.changed", writes)
+            for key, *_ in writes:
+                self.records[key] = current[key]
+                self.fingerprints[key] = fingerprints[key]
+        return len(writes)
+
+    def history(self, key=None, since=None, until=None, limit=None):
+        clauses, params = [], []
+        for clause, value in (("key = ?", key), ("time >= ?", since), ("time < ?", until)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        sql = "SELECT time, change, key, before, after, record FROM changes"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY time DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [{"time": t, "change": change, "key": k, "before": json.loads(before), "after": json.loads(after),
+                 "record": json.loads(record)} for t, change, k, before, after, record in rows]
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM snapshot")
+            self.db.execute("DELETE FROM changes")
+            self.records.clear()
+            self.fingerprints.clear()
+
+# دمج السجلات القادمة من عدة بروتوكولات لنفس الطابعة في جهاز واحد
+# ترتيب المصادر عند اختيار العنوان ونوع الصف: الفحص الشبكي أولاً لأن عنوانه هو ما يطبع عليه المستخدم
+SOURCE_PRIORITY = ("network", "snmp", "mdns", "usb")
+# عند اختيار الاسم: إعلان mDNS ومعرف USB يحملان الموديل كما يسميه المصنع، ووصف SNMP غالباً أطول وأقل دقة
+NAME_PRIORITY = ("mdns", "usb", "snmp", "network")
+# جودة مطابقة التعريف في driver_catalog: مطابقة الموديل أو VID:PID أفضل من الشركة أو لغة الطباعة
+MATCH_RANK = {"usb": 5, "model": 5, "fuzzy": 4, "manufacturer": 2, "command_set": 1}
+MERGED_FIELDS = ("printer_name", "model", "driver_name", "download_url", "driver_match", "driver_id", "mac", "serial", "device_id")
+
+def source_rank(order, p):
+    type_ = p.get("type")
+    return order.index(type_) if type_ in order else len(order)
+
+def source_key(p):
+    # سجل بروتوكول واحد من وكيل واحد؛ الفحص التالي لنفس المصدر يحل محله
+    return (p.get("agent"), p.get("type"), str(p.get("driver_id")))
+
+def merge_identifiers(p):
+    # الرقم التسلسلي و MAC يربطان أي مصدرين؛ عنوان IP رابط ضعيف لأنه قد ينتقل لجهاز آخر، ولا عنوان لسجلات USB
+    ids = device_identifiers(p)
+    keys = [(name, ids[name]) for name in ("serial", "mac") if name in ids]
+    if p.get("type") != "usb":
+        keys.append(("ip", ids["address"]))
+    return keys
+
+class DeviceResolver:
+    # اتحاد-بحث تزايدي على السجلات: كل سجل يضاف مرة واحدة ويرتبط بمن يشاركه معرفاً عبر فهرس (نوع، قيمة)
+    # فالتكلفة خطية تقريباً في عدد السجلات، ويمكن تغذيته أثناء البحث سجلاً بسجل
+    def __init__(self):
+        self.records = []
+        self.parent = []
+        self.members = {}  # root -> [nodes]
+        self.strong = {}  # root -> {"serial": set, "mac": set}
+        self.signatures = {}  # root -> توقيع موديل فيه رموز، إن وجد
+        self.index = {}  # (kind, value) -> node
+        self.sources = {}  # (agent, type, driver_id) -> node
+        self.entities = {}  # root -> آخر مفتاح جهاز أعطي لهذه المجموعة
+        self.live = {}  # مفتاح الجهاز -> root
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def conflicts(self, a, b):
+        # رابط ضعيف (نفس IP) لا يدمج جهازين يختلفان في الرقم التسلسلي أو MAC أو في الموديل
+        for name in ("serial", "mac"):
+            if self.strong[a][name] and self.strong[b][name] and not self.strong[a][name] & self.strong[b][name]:
+                return True
+        sig_a, sig_b = self.signatures.get(a), self.signatures.get(b)
+        return bool(sig_a and sig_b) and not model_matcher().compatible(sig_a, sig_b)
+
+    def union(self, a, b, weak):
+        a, b = self.find(a), self.find(b)
+        if a == b or weak and self.conflicts(a, b):
+            return a, None
+        if len(self.members[a]) < len(self.members[b]):
+            a, b = b, a
+        self.parent[b] = a
+        self.members[a] += self.members.pop(b)
+        for name in ("serial", "mac"):
+            self.strong[a][name] |= self.strong[b][name]
+        del self.strong[b]
+        if a not in self.signatures and b in self.signatures:
+            self.signatures[a] = self.signatures[b]
+        self.signatures.pop(b, None)
+        old = self.entities.pop(b, None)
+        if old and self.live.get(old) == b:
+            del self.live[old]
+        return a, old
+
+    def link(self, p):
+        # يضيف السجل ويربطه بمجموعته؛ يعيد جذر المجموعة ومفاتيح الأجهزة التي اندمجت فيها
+        # سجلات الوكلاء البعيدين تحمل اسم الوكيل: طابعتا USB بنفس VID:PID في موقعين جهازان مختلفان
+        source = source_key(p)
+        node = self.sources.get(source)
+        if node is None:
+            node = self.sources[source] = len(self.records)
+            self.records.append(p)
+            self.parent.append(node)
+            self.members[node] = [node]
+            self.strong[node] = {"serial": set(), "mac": set()}
+        else:
+            # نفس الجهاز من نفس البروتوكول مرة أخرى (نتيجة مخزنة ثم فحص جديد): السجل الأحدث يحل محل القديم
+            self.records[node] = p
+        root = self.find(node)
+        ids = merge_identifiers(p)
+        for kind, value in ids:
+            if kind in self.strong[root]:
+                self.strong[root][kind].add(value)
+        sig = model_matcher().record_signature(p)
+        if sig.codes and root not in self.signatures:
+            self.signatures[root] = sig
+        removed = []
+        for kind, value in ids:
+            other = self.index.setdefault((kind, value), node)
+            if other != node:
+                root, old = self.union(root, other, kind == "ip")
+                if old:
+                    removed.append(old)
+        return root, removed
+
+    def add(self, p):
+        # يعيد الجهاز المدمج بعد إضافة السجل، ومفاتيح الأجهزة التي لم تعد موجودة (اندمجت أو تغير مفتاحها)
+        root, removed = self.link(p)
+        old = self.entities.get(root)
+        device = self.publish(root)
+        if old and old != device["entity"]:
+            removed.append(old)
+        return device, [key for key in removed if key != device["entity"]]
+
+    def publish(self, root):
+        device = self.device(root)
+        old = self.entities.get(root)
+        if old and old != device["entity"] and self.live.get(old) == root:
+            del self.live[old]
+        self.entities[root] = device["entity"]
+        self.live[device["entity"]] = root
+        return device
+
+    def entity_key(self, root, records):
+        # المفتاح من أثبت معرف في المجموعة حتى يبقى الصف نفسه مهما كان ترتيب وصول البروتوكولات
+        for name in ("serial", "mac"):
+            if self.strong[root][name]:
+                return f"{name}:{min(self.strong[root][name])}"
+        # مجموعتان على نفس IP لم تدمجا لتعارض الموديل، فالثانية تأخذ مفتاح سجلها الأساسي
+        ip = [p for p in records if p.get("type") != "usb"]
+        if ip:
+            key = f"ip:{ip[0].get('driver_id')}"
+            if self.find(self.live.get(key, root)) == root:
+                return key
+        key = f"{records[0].get('type', '-')}:{records[0].get('driver_id')}"
+        return f"{records[0]['agent']}/{key}" if records[0].get("agent") else key
+
+    def device(self, root):
+        records = sorted((self.records[n] for n in self.members[root]), key=lambda p: source_rank(SOURCE_PRIORITY, p))
+        primary = records[0]
+        matcher = model_matcher()
+        named = min(records, key=lambda p: (not matcher.record_signature(p).codes, source_rank(NAME_PRIORITY, p)))
+        driver = min(records, key=lambda p: (-MATCH_RANK.get(p.get("driver_match"), 0), p is not named, source_rank(SOURCE_PRIORITY, p)))
+        device = {}
+        for p in records:
+            for field, value in p.items():
+                device.setdefault(field, value)
+        provenance = {}
+        def take(field, candidates):
+            for p in candidates:
+                if p.get(field) not in (None, ""):
+                    device[field] = p[field]
+                    provenance[field] = p.get("type")
+                    return
+        take("printer_name", [named] + records)
+        take("model", [named] + records)
+        for field in ("driver_name", "download_url", "driver_match"):
+            take(field, [driver])
+        for field in ("driver_id", "mac", "serial", "device_id"):
+            take(field, records)
+        device["type"] = primary.get("type")
+        # السجلات الأصلية كاملة حتى يعيد التصدير والاستيراد كل مصدر كما رآه بروتوكوله
+        device["sources"] = records
+        device["provenance"] = provenance
+        device["entity"] = self.entity_key(root, records)
+        return device
+
+    def devices(self):
+        return [self.publish(root) for root in list(self.members)]
+
+    def is_live(self, key):
+        return key in self.live
+
+def merge_devices(records):
+    # دفعة كاملة: جهاز واحد لكل طابعة فعلية مهما كان عدد البروتوكولات التي رأتها
+    resolver = DeviceResolver()
+    for p in records:
+        resolver.link(p)
+    return resolver.devices()
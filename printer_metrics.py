@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Printer Driver Finder - قياسات البحث: زمن كل مرحلة، عدد المجسات والمهلات والأخطاء والنتائج لكل بروتوكول
+# جميع الحقوق محفوظة © khalid aldawish 2025
+
+import re
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+
+METRIC_PREFIX = "printer_scan"
+METRIC_HELP = {
+    "probes": "Probes sent (TCP connects, SNMP requests, USB control transfers)",
+    "timeouts": "Probes that got no answer before their timeout",
+    "hits": "Devices or live hosts found",
+    "errors": "Exceptions caught and ignored by the scanners",
+}
+
+# المقاييس الحالية تمر عبر contextvars: المجدول يربطها بخيط العمل و asyncio.run ينسخها لكل المهام
+# فلا حاجة لتمرير كائن القياس عبر كل دالة فحص
+_current = contextvars.ContextVar("scan_metrics", default=None)
+_protocol = contextvars.ContextVar("scan_protocol", default="-")
+
+class ScanMetrics:
+    # عدادات لبحث واحد، وزمن كل مرحلة بالنسبة لبداية البحث حتى يظهر التداخل بين البروتوكولات
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = defaultdict(int)  # (name, protocol, where) -> value
+        self.phases = {}  # name -> {"start": ثوان من البداية, "seconds": المدة}
+
+    def count(self, name, n=1, protocol=None, where=""):
+        key = (name, protocol or _protocol.get(), where)
+        with self.lock:
+            self.counters[key] += n
+
+    def add_phase(self, name, start, seconds):
+        with self.lock:
+            phase = self.phases.setdefault(name, {"start": round(start - self.started, 4), "seconds": 0.0})
+            phase["seconds"] = round(phase["seconds"] + seconds, 4)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_phase(name, start, time.time() - start)
+
+    def merge(self, other):
+        # المجموع التراكمي لكل عمليات البحث، وأزمنة المراحل تجمع كذلك
+        with other.lock:
+            counters = dict(other.counters)
+            phases = {name: dict(phase) for name, phase in other.phases.items()}
+        with self.lock:
+            for key, value in counters.items():
+                self.counters[key] += value
+            for name, phase in phases.items():
+                total = self.phases.setdefault(name, {"start": 0.0, "seconds": 0.0})
+                total["seconds"] = round(total["seconds"] + phase["seconds"], 4)
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            phases = {name: dict(phase) for name, phase in self.phases.items()}
+        protocols = defaultdict(lambda: dict.fromkeys(("probes", "timeouts", "hits", "errors"), 0))
+        errors = defaultdict(int)
+        for (name, protocol, where), value in counters.items():
+            protocols[protocol][name] = protocols[protocol].get(name, 0) + value
+            if name == "errors":
+                errors[f"{protocol}:{where}"] += value
+        for stats in protocols.values():
+            stats["hit_rate"] = round(stats["hits"] / stats["probes"], 4) if stats["probes"] else None
+        return {"started": self.started, "phases": phases, "protocols": dict(protocols), "errors": dict(errors)}
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent, ensure_ascii=False)
+
+    def to_prometheus(self):
+        # صيغة النص في Prometheus: عدادات _total بتسميات protocol و where، ومدة كل مرحلة بالثواني
+        with self.lock:
+            counters = sorted(self.counters.items())
+            phases = sorted(self.phases.items())
+        lines = []
+        for metric in METRIC_HELP:
+            rows = [(key, value) for key, value in counters if key[0] == metric]
+            if not rows:
+                continue
+            name = f"{METRIC_PREFIX}_{metric}_total"
+            lines.append(f"# HELP {name} {METRIC_HELP[metric]}")
+            lines.append(f"# TYPE {name} counter")
+            merged = defaultdict(int)
+            for (_, protocol, where), value in rows:
+                merged[(protocol, where if metric == "errors" else "")] += value
+            for (protocol, where), value in sorted(merged.items()):
+                labels = f'protocol="{prometheus_escape(protocol)}"'
+                if where:
+                    labels += f',where="{prometheus_escape(where)}"'
+                lines.append(f"{name}{{{labels}}} {value}")
+        if phases:
+            name = f"{METRIC_PREFIX}_phase_seconds_total"
+            lines.append(f"# HELP {name} Wall time spent in each scan phase")
+            lines.append(f"# TYPE {name} counter")
+            for phase, values in phases:
+                lines.append(f'{name}{{phase="{prometheus_escape(phase)}"}} {values["seconds"]}')
+        return "\n".join(lines) + "\n"
+
+def prometheus_escape(value):
+    return re.sub(r'(["\\])', r"\\\1", str(value)).replace("\n", "\\n")
+
+_totals = ScanMetrics()
+
+def total_metrics():
+    # كل ما سجل منذ بدء البرنامج، ومنه أيضاً ما يحدث خارج أي بحث (مثل مراقب USB أو متصفح mDNS)
+    return _totals
+
+def current_metrics():
+    return _current.get() or _totals
+
+@contextmanager
+def bind_metrics(metrics, protocol):
+    # كل ما يسجل داخل هذا السياق يحسب للبحث metrics وللبروتوكول protocol
+    tokens = (_current.set(metrics), _protocol.set(protocol))
+    try:
+        yield metrics
+    finally:
+        _current.reset(tokens[0])
+        _protocol.reset(tokens[1])
+
+def count(name, n=1):
+    current_metrics().count(name, n)
+
+def swallowed(where):
+    # يستدعى من كتل except Exception التي تتجاهل الخطأ عمداً، حتى تظهر في الإحصاءات بدل أن تضيع
+    current_metrics().count("errors", 1, where=where)
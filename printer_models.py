@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# Printer Driver Finder - توحيد أسماء الموديلات وتجميعها
+# جميع الحقوق محفوظة © khalid aldawish 2025
+
+import re
+import threading
+from collections import namedtuple, defaultdict, Counter
+
+MANUFACTURER_ALIASES = {
+    'hp': "HP", 'hewlett-packard': "HP", 'hewlett packard': "HP", 'hewlett': "HP", 'brother': "Brother", 'canon': "Canon",
+    'epson': "Epson", 'seiko epson': "Epson", 'xerox': "Xerox", 'fuji xerox': "Xerox", 'fujifilm': "Fujifilm",
+    'lexmark': "Lexmark", 'ricoh': "Ricoh", 'nrg': "Ricoh", 'lanier': "Ricoh", 'savin': "Ricoh", 'kyocera': "Kyocera",
+    'kyocera mita': "Kyocera", 'samsung': "Samsung", 'konica': "Konica Minolta", 'konica minolta': "Konica Minolta",
+    'konica-minolta': "Konica Minolta", 'minolta': "Konica Minolta", 'sharp': "Sharp", 'oki': "OKI", 'okidata': "OKI",
+    'oki data': "OKI", 'dell': "Dell", 'toshiba': "Toshiba", 'zebra': "Zebra", 'panasonic': "Panasonic", 'pantum': "Pantum",
+}
+# اختصارات شائعة في sysDescr ومعرفات USB، بالتهجئة المعتمدة للعرض
+MODEL_TOKEN_ALIASES = {
+    'lj': "LaserJet", 'laserjet': "LaserJet", 'clj': "Color LaserJet", 'dj': "DeskJet", 'deskjet': "DeskJet",
+    'oj': "OfficeJet", 'officejet': "OfficeJet", 'pagewide': "PageWide", 'envy': "ENVY", 'designjet': "DesignJet",
+    'pixma': "PIXMA", 'imageclass': "imageCLASS", 'imagerunner': "imageRUNNER", 'ir': "imageRUNNER", 'maxify': "MAXIFY",
+    'workcentre': "WorkCentre", 'workcenter': "WorkCentre", 'versalink': "VersaLink", 'altalink': "AltaLink",
+    'ecosys': "ECOSYS", 'taskalfa': "TASKalfa", 'bizhub': "bizhub", 'colour': "Color", 'color': "Color",
+    'workforce': "WorkForce", 'ecotank': "EcoTank", 'stylus': "Stylus",
+}
+PHRASE_ALIASES = {
+    ('laser', 'jet'): 'laserjet', ('desk', 'jet'): 'deskjet', ('office', 'jet'): 'officejet', ('page', 'wide'): 'pagewide',
+    ('image', 'class'): 'imageclass', ('image', 'runner'): 'imagerunner', ('work', 'centre'): 'workcentre',
+    ('work', 'center'): 'workcentre', ('work', 'force'): 'workforce', ('eco', 'tank'): 'ecotank',
+}
+NOISE_WORDS = {
+    'series', 'printer', 'printers', 'driver', 'inc', 'co', 'ltd', 'corp', 'corporation', 'mfp', 'aio', 'all', 'in', 'one',
+    'network', 'usb', 'pcl', 'pcl6', 'pcl5', 'pcl5e', 'ps', 'ps3', 'postscript', 'xl', 'r', 'tm', 'the', 'multifunction',
+}
+MEMO_SIZE = 65536
+# أسماء بديلة يولدها البرنامج عند غياب الاسم الحقيقي، لا تحمل أي معلومة عن الموديل
+PLACEHOLDER_NAME = re.compile(r"^(Vendor:|Network Printer \(|SNMP Printer \()")
+
+ModelSignature = namedtuple("ModelSignature", "manufacturer families codes key display")
+
+def split_words(text):
+    # رموز الموديل المفصولة بشرطة تفصل: HL-L2340DW -> hl, l2340dw
+    return re.findall(r"[0-9A-Za-z]+", str(text or ""))
+
+def model_code(word):
+    # الجزء المميز من رمز الموديل: M401dne -> m401، CP1025nw -> cp1025؛ اللواحق dn/dw/nw نسخ من نفس الموديل
+    match = re.match(r"[a-z]*\d+", word)
+    return match.group(0) if match else None
+
+def is_strong_code(code):
+    return not code.isdigit() or len(code) >= 4
+
+def canonical_manufacturer(text):
+    return MANUFACTURER_ALIASES.get(" ".join(split_words(text)).lower()) if text else None
+
+class ModelMatcher:
+    # يحول الأسماء الخام إلى توقيع (شركة، عائلة، رموز موديل)، ويجمع دفعة كاملة من السجلات حسب الموديل الحقيقي
+    # التوقيع يحسب مرة واحدة لكل نص، والمقارنة تقتصر على المجموعات التي تشترك في رمز موديل عبر فهرس معكوس
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.memo = {}
+
+    def signature(self, text, manufacturer=None):
+        memo_key = (text, manufacturer)
+        sig = self.memo.get(memo_key)
+        if sig is None:
+            sig = self.compute_signature(text, manufacturer)
+            with self.lock:
+                if len(self.memo) >= MEMO_SIZE:
+                    self.memo.clear()
+                self.memo[memo_key] = sig
+        return sig
+
+    def compute_signature(self, text, manufacturer=None):
+        if PLACEHOLDER_NAME.match(text or ""):
+            return ModelSignature(canonical_manufacturer(manufacturer), frozenset(), frozenset(), "", text)
+        words = split_words(text)
+        lower = [w.lower() for w in words]
+        found = None
+        # اسم الشركة قد يتكرر أو يأتي بعد كلمات أخرى: "HEWLETT-PACKARD HP LaserJet"
+        i = 0
+        kept = []
+        while i < len(lower):
+            pair = " ".join(lower[i:i + 2])
+            if i + 1 < len(lower) and pair in MANUFACTURER_ALIASES:
+                found = found or MANUFACTURER_ALIASES[pair]
+                i += 2
+                continue
+            if lower[i] in MANUFACTURER_ALIASES:
+                found = found or MANUFACTURER_ALIASES[lower[i]]
+                i += 1
+                continue
+            if tuple(lower[i:i + 2]) in PHRASE_ALIASES:
+                kept.append((PHRASE_ALIASES[tuple(lower[i:i + 2])], None))
+                i += 2
+                continue
+            kept.append((lower[i], words[i]))
+            i += 1
+        manufacturer = found or canonical_manufacturer(manufacturer)
+        families, codes, display, key = set(), set(), [], []
+        for word, original in kept:
+            if word in NOISE_WORDS:
+                continue
+            alias = MODEL_TOKEN_ALIASES.get(word)
+            if alias:
+                for part in alias.lower().split():
+                    families.add(part)
+                    key.append(part)
+                display.append(alias)
+                continue
+            code = model_code(word)
+            if code:
+                codes.add(code)
+                key.append(code)
+            else:
+                families.add(word)
+                key.append(word)
+            display.append(original or word)
+        if manufacturer:
+            display.insert(0, manufacturer)
+            key.insert(0, manufacturer.lower())
+        return ModelSignature(manufacturer, frozenset(families), frozenset(codes), " ".join(key), " ".join(display))
+
+    def record_signature(self, p):
+        manufacturer = None
+        device_id = p.get("device_id") or ""
+        match = re.search(r"(?:^|;)\s*(?:MFG|MANUFACTURER)\s*:([^;]*)", device_id, re.I)
+        if match:
+            manufacturer = match.group(1)
+        text = p.get("model") or p.get("printer_name") or ""
+        return self.signature(text, manufacturer)
+
+    @staticmethod
+    def compatible(a, b):
+        if not a.codes or not b.codes:
+            return False
+        if a.manufacturer != b.manufacturer:
+            # شركة مجهولة في أحد الطرفين تقبل فقط مع تطابق كامل للرموز
+            if a.manufacturer and b.manufacturer or a.codes != b.codes:
+                return False
+        if not (a.codes <= b.codes or b.codes <= a.codes):
+            return False
+        if not any(is_strong_code(code) for code in a.codes & b.codes):
+            return False
+        return not (a.families and b.families) or bool(a.families & b.families)
+
+    def group(self, records):
+        # تجميع على ثلاث مراحل: توقيع لكل سجل، دمج التواقيع المتطابقة، ثم مقارنة المجموعات التي تشترك في رمز قوي فقط
+        signatures = [self.record_signature(p) for p in records]
+        exact = defaultdict(list)
+        for i, sig in enumerate(signatures):
+            if sig.codes:
+                exact[(sig.manufacturer, sig.families, sig.codes)].append(i)
+        keys = list(exact)
+        parent = list(range(len(keys)))
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+        by_code = defaultdict(list)
+        for k, (manufacturer, families, codes) in enumerate(keys):
+            for code in codes:
+                if is_strong_code(code):
+                    by_code[code].append(k)
+        representative = [signatures[exact[key][0]] for key in keys]
+        for members in by_code.values():
+            for pos, a in enumerate(members):
+                for b in members[pos + 1:]:
+                    if find(a) != find(b) and self.compatible(representative[a], representative[b]):
+                        parent[find(a)] = find(b)
+        clusters = defaultdict(list)
+        for k, key in enumerate(keys):
+            clusters[find(k)].extend(exact[key])
+        groups = []
+        grouped = set()
+        for indices in clusters.values():
+            indices.sort()
+            grouped.update(indices)
+            groups.append(self.make_group([records[i] for i in indices], [signatures[i] for i in indices]))
+        # السجلات بدون رمز موديل (مثل "Network Printer (ip)") تبقى كل واحد في مجموعته
+        for i, p in enumerate(records):
+            if i not in grouped:
+                groups.append(self.make_group([p], [signatures[i]]))
+        return groups
+
+    @staticmethod
+    def make_group(records, signatures):
+        # الاسم الأكثر تكراراً، وعند التساوي الأكثر تفصيلاً
+        counts = Counter(sig.display for sig in signatures)
+        name = max(counts, key=lambda display: (counts[display], len(display.split()), display))
+        manufacturer = next((sig.manufacturer for sig in signatures if sig.manufacturer), None)
+        return {"model": name, "manufacturer": manufacturer, "key": min(sig.key for sig in signatures), "count": len(records),
+                "records": records}
+
+    def annotate(self, records):
+        # يضيف manufacturer و model_group لكل سجل؛ السجلات تبقى منفصلة لأنها أجهزة مختلفة
+        groups = self.group(records)
+        for group in groups:
+            for p in group["records"]:
+                if group["manufacturer"]:
+                    p["manufacturer"] = group["manufacturer"]
+                p["model_group"] = group["model"]
+        return groups
+
+_matcher = ModelMatcher()
+
+def model_matcher():
+    return _matcher
+
+def manufacturer_of(p):
+    return _matcher.record_signature(p).manufacturer or ""
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+# Printer Driver Finder - فحص موزع: وكيل في كل موقع يشغل الماسحات محلياً، ومنسق يوزع النطاقات ويجمع النتائج
+# جميع الحقوق محفوظة © khalid aldawish 2025
+
+import os
+import sys
+import hmac
+import json
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import functools
+from collections import Counter
+
+from printer_discovery import (DEFAULT_TARGETS, SCANNERS, TargetSet, CancelToken, ScanScheduler, HistoryStore, RecordWriter, run_scan,
+                               uses_targets, load_scanner_plugins, SCAN_RATE_LIMIT)
+from printer_inventory import DeviceResolver
+from printer_metrics import ScanMetrics
+
+# بروتوكول النقل: سطر JSON مضغوط لكل رسالة فوق TCP (NDJSON)
+# الوكيل يبدأ بـ hello، والمنسق يرسل طلب scan واحداً، ثم يبث الوكيل found و progress حتى done أو error
+WIRE_VERSION = 1
+AGENT_PORT = 9740
+AGENT_TOKEN_ENV = "PRINTER_AGENT_TOKEN"
+AGENT_CONNECT_TIMEOUT = 5.0
+AGENT_HEARTBEAT = 5.0  # الوكيل يرسل progress على الأقل بهذا المعدل حتى أثناء مهلات SNMP الطويلة
+AGENT_IDLE_TIMEOUT = 3 * AGENT_HEARTBEAT
+AGENT_LINE_LIMIT = 1 << 20
+AGENT_PREFIX = 24  # وحدة التوزيع على الوكلاء
+AGENT_MIN_BLOCK = 28  # نطاق صغير يقسم حتى هذا الحد إذا كانت شبكاته /24 أقل من عدد الوكلاء
+
+def encode(message):
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+
+async def send(writer, message):
+    writer.write(encode(message))
+    await writer.drain()
+
+async def receive(reader, timeout):
+    line = await asyncio.wait_for(reader.readline(), timeout)
+    if not line:
+        raise ConnectionError("connection closed")
+    return json.loads(line)
+
+def parse_address(text, port=AGENT_PORT):
+    host, _, value = text.rpartition(":")
+    if not host:
+        return text, port
+    return host.strip("[]"), int(value)
+
+class ScanAgent:
+    # وكيل موقع واحد: يستقبل طلبات المنسق ويشغل run_scan بنفس المجدول، فتبقى تقديرات RTT بين الطلبات
+    # sites تحدد النطاقات التي يصل إليها هذا الوكيل؛ ما خارجها لا يفحص مهما طلب المنسق
+    def __init__(self, name, sites=None, token=None, rate=SCAN_RATE_LIMIT):
+        self.name = name
+        self.sites = sites
+        self.token = token
+        self.scheduler = ScanScheduler(rate=rate or None, on_progress=self.progress)
+        self.sink = None
+        self.busy = None
+        self.last_progress = 0
+
+    def progress(self, value):
+        self.last_progress = value
+        if self.sink:
+            self.sink({"event": "progress", "value": value})
+
+    def hello(self):
+        return {"event": "hello", "version": WIRE_VERSION, "agent": self.name, "sites": str(self.sites) if self.sites else None,
+                "protocols": sorted(SCANNERS)}
+
+    async def serve(self, host="127.0.0.1", port=AGENT_PORT):
+        self.busy = asyncio.Lock()
+        return await asyncio.start_server(self.handle, host, port, limit=AGENT_LINE_LIMIT)
+
+    async def handle(self, reader, writer):
+        try:
+            await send(writer, self.hello())
+            request = await receive(reader, AGENT_IDLE_TIMEOUT)
+            error = self.check(request)
+            if not error:
+                try:
+                    protocols, targets = self.scope(request)
+                except ValueError as e:
+                    error = str(e)
+            if error:
+                await send(writer, {"event": "error", "message": error})
+                return
+            # طلب واحد في كل مرة: المجدول وحدود الحزم مشتركة لكل ما يفحصه الوكيل
+            async with self.busy:
+                await self.scan(protocols, targets, reader, writer)
+        except (ConnectionError, OSError, asyncio.TimeoutError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def check(self, request):
+        if self.token and not hmac.compare_digest(str(request.get("token") or ""), self.token):
+            return "unauthorized"
+        if request.get("op") != "scan":
+            return f"unknown op: {request.get('op')}"
+        unknown = set(request.get("protocols") or ()) - set(SCANNERS)
+        if unknown:
+            return f"unknown protocols: {', '.join(sorted(unknown))}"
+        return None
+
+    def scope(self, request):
+        targets = TargetSet(request["targets"]) if request.get("targets") else None
+        if targets and self.sites:
+            targets = targets.intersection(self.sites)
+        protocols = [name for name in request.get("protocols") or () if targets or not uses_targets(name)]
+        return protocols, targets
+
+    async def scan(self, protocols, targets, reader, writer):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        token = CancelToken()
+        metrics = ScanMetrics()
+        def push(message):
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+        def found(p):
+            push({"event": "found", "record": p})
+        started = time.time()
+        future = None
+        if protocols:
+            self.sink = push
+            future = loop.run_in_executor(None, functools.partial(run_scan, protocols, targets, force=True, on_found=found, cancel=token,
+                                                                  scheduler=self.scheduler, metrics=metrics))
+            future.add_done_callback(lambda f: queue.put_nowait(None))
+        else:
+            queue.put_nowait(None)
+        watcher = asyncio.ensure_future(self.watch(reader, token))
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), AGENT_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    message = {"event": "progress", "value": self.last_progress}
+                if message is None:
+                    break
+                await send(writer, message)
+            printers = future.result() if future else []
+            await send(writer, {"event": "done", "count": len(printers), "targets": str(targets) if targets else None, "protocols": protocols,
+                                "seconds": round(time.time() - started, 3), "metrics": metrics.snapshot(),
+                                "timing": self.scheduler.timing_stats()})
+        finally:
+            self.sink = None
+            watcher.cancel()
+            if future and not future.done():
+                # المنسق انقطع أو ألغى: الفحص يتوقف ولا ينتظر مهلاته
+                token.cancel()
+                await asyncio.wait([future])
+
+    async def watch(self, reader, token):
+        # أثناء الفحص يقرأ الوكيل سطر cancel أو انقطاع الاتصال
+        try:
+            while not token.cancelled:
+                line = await reader.readline()
+                if not line or json.loads(line).get("op") == "cancel":
+                    break
+        except (ConnectionError, OSError, ValueError):
+            pass
+        token.cancel()
+
+class AgentLink:
+    # اتصال المنسق بوكيل واحد وما أسند إليه وما عاد منه
+    def __init__(self, address, name=None):
+        self.address = address
+        self.alias = name  # اسم يفرضه المنسق (اسم مكرر، أو إعادة الفحص) ولا يغيره hello التالي
+        self.name = name or "%s:%d" % address
+        self.sites = None
+        self.protocols = []
+        self.targets = None
+        self.found = 0
+        self.status = "pending"
+        self.progress = 0
+        self.seconds = None
+        self.metrics = None
+        self.timing = None
+
+    def apply_hello(self, hello):
+        if hello.get("event") != "hello" or hello.get("version") != WIRE_VERSION:
+            raise ConnectionError(f"unexpected hello from {self.name}")
+        self.name = self.alias or hello.get("agent") or self.name
+        self.sites = TargetSet(hello["sites"]) if hello.get("sites") else None
+        self.protocols = hello.get("protocols") or []
+
+    def stats(self):
+        stats = {"agent": self.name, "address": "%s:%d" % self.address, "targets": str(self.targets) if self.targets else None,
+                 "found": self.found, "status": self.status, "seconds": self.seconds}
+        if self.timing:
+            stats["timing"] = self.timing
+        if self.metrics:
+            stats["metrics"] = self.metrics
+        return stats
+
+def assign_targets(targets, links, prefix=AGENT_PREFIX):
+    # كل شبكة /24 تذهب للوكيل الذي يصل إليها (sites) والأقل حملاً؛ ما لا يغطيه أي وكيل يذهب للوكلاء بلا sites
+    # والباقي يعاد كنطاق لم يسند لأحد
+    load = {link: 0 for link in links}
+    parts = {link: [] for link in links}
+    unassigned = []
+    sited = [link for link in links if link.sites]
+    open_links = [link for link in links if not link.sites]
+    while targets and prefix < AGENT_MIN_BLOCK and sum(1 for _ in targets.subnets(prefix)) < len(links):
+        prefix += 1
+    for block in targets.subnets(prefix) if targets else ():
+        remaining = block
+        for link in sorted(sited, key=load.get):
+            part = remaining.intersection(link.sites)
+            if part:
+                parts[link] += part.ranges
+                load[link] += len(part)
+                remaining = remaining.difference(part)
+                if remaining is None:
+                    break
+        if remaining is not None:
+            if open_links:
+                link = min(open_links, key=load.get)
+                parts[link] += remaining.ranges
+                load[link] += len(remaining)
+            else:
+                unassigned += remaining.ranges
+    return {link: TargetSet.from_ranges(ranges) for link, ranges in parts.items()}, TargetSet.from_ranges(unassigned)
+
+class Coordinator:
+    # يوزع النطاقات على الوكلاء ويجمع نتائجهم المتدفقة في مخزون واحد مدمج؛ وكيل يسقط أثناء الفحص يعاد نطاقه لوكيل آخر
+    def __init__(self, agents, token=None, connect_timeout=AGENT_CONNECT_TIMEOUT, idle_timeout=AGENT_IDLE_TIMEOUT):
+        self.addresses = [parse_address(agent) if isinstance(agent, str) else agent for agent in agents]
+        self.token = token
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.links = []
+        self.unassigned = None
+
+    async def connect(self, link):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(*link.address, limit=AGENT_LINE_LIMIT), self.connect_timeout)
+        try:
+            link.apply_hello(await receive(reader, self.connect_timeout))
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def probe(self, address):
+        link = AgentLink(address)
+        try:
+            reader, writer = await self.connect(link)
+            writer.close()
+        except (OSError, ConnectionError, asyncio.TimeoutError, ValueError) as e:
+            link.status = f"unreachable: {e or type(e).__name__}"
+        return link
+
+    async def scan(self, targets, protocols, on_found=None, on_progress=None, cancel=None):
+        # يعيد كل السجلات الخام (كل سجل يحمل اسم وكيله في agent)؛ الدمج في self.devices()
+        self.resolver = DeviceResolver()
+        self.links = list(await asyncio.gather(*(self.probe(address) for address in self.addresses)))
+        live = [link for link in self.links if not link.status.startswith("unreachable")]
+        if not live:
+            raise ConnectionError("no agent reachable")
+        # الاسم الافتراضي هو اسم الجهاز، فوكيلان بنفس الاسم يضاف إليهما عنوانهما حتى لا تنسب سجلات أحدهما للآخر
+        names = Counter(link.name for link in live)
+        for link in live:
+            if names[link.name] > 1:
+                link.alias = link.name = f"{link.name}@{link.address[0]}:{link.address[1]}"
+        plan, self.unassigned = assign_targets(targets, live)
+        printers = []
+        def found(p, link):
+            p["agent"] = link.name
+            link.found += 1
+            printers.append(p)
+            self.resolver.add(p)
+            if on_found:
+                on_found(p)
+        def progress():
+            if on_progress:
+                on_progress(int(sum(link.progress for link in live) / len(live)))
+        async def run(link, assigned):
+            link.targets = assigned
+            wanted = [name for name in protocols if name in link.protocols and (assigned or not uses_targets(name))]
+            if not wanted:
+                link.status = "idle"
+                link.progress = 100
+                return None
+            try:
+                await self.run_agent(link, assigned, wanted, found, progress, cancel)
+                return None
+            except (OSError, ConnectionError, asyncio.TimeoutError, ValueError) as e:
+                link.status = f"failed: {e or type(e).__name__}"
+                link.progress = 100
+                return assigned
+        failed = await asyncio.gather(*(run(link, plan[link]) for link in live))
+        # نطاق وكيل سقط يعاد مرة واحدة لوكيل آخر نجح؛ السجلات المكررة تدمج بالهوية
+        healthy = [link for link in live if link.status == "done"]
+        for link, assigned in zip(live, failed):
+            if assigned and healthy and not (cancel and cancel.cancelled):
+                backup = min(healthy, key=lambda l: len(l.targets) if l.targets else 0)
+                retry = AgentLink(backup.address, backup.name)
+                retry.protocols = backup.protocols
+                retry.status = f"retry for {link.name}"
+                self.links.append(retry)
+                if await run(retry, assigned) is None:
+                    link.status += f" (rescanned by {retry.name})"
+        return printers
+
+    async def run_agent(self, link, targets, protocols, found, progress, cancel):
+        reader, writer = await self.connect(link)
+        started = time.time()
+        try:
+            await send(writer, {"op": "scan", "targets": str(targets) if targets else None, "protocols": protocols, "token": self.token})
+            link.status = "scanning"
+            last_seen = time.time()
+            while True:
+                if cancel and cancel.cancelled:
+                    await send(writer, {"op": "cancel"})
+                    link.status = "cancelled"
+                    return
+                # مهلة قصيرة حتى يصل الإلغاء بسرعة؛ الوكيل الصامت أطول من idle_timeout يعتبر ساقطاً
+                try:
+                    message = await receive(reader, 0.5)
+                except asyncio.TimeoutError:
+                    if time.time() - last_seen > self.idle_timeout:
+                        raise
+                    continue
+                last_seen = time.time()
+                event = message.get("event")
+                if event == "found":
+                    found(message["record"], link)
+                elif event == "progress":
+                    link.progress = message.get("value", link.progress)
+                    progress()
+                elif event == "error":
+                    raise ConnectionError(message.get("message", "agent error"))
+                elif event == "done":
+                    link.status = "done"
+                    link.progress = 100
+                    link.seconds = round(time.time() - started, 3)
+                    link.metrics = message.get("metrics")
+                    link.timing = message.get("timing")
+                    progress()
+                    return
+        finally:
+            writer.close()
+
+    def devices(self):
+        return self.resolver.devices()
+
+    def stats(self):
+        return [link.stats() for link in self.links]
+
+def agent_main(args):
+    sites = TargetSet(",".join(args.sites)) if args.sites else None
+    agent = ScanAgent(args.name or socket.gethostname(), sites, args.token or os.environ.get(AGENT_TOKEN_ENV), args.rate)
+    host, port = parse_address(args.listen)
+    async def main():
+        server = await agent.serve(host, port)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except NotImplementedError:
+                # ويندوز: لا معالجات إشارات في حلقة asyncio، و Ctrl+C يصل KeyboardInterrupt إلى asyncio.run
+                pass
+        print(f"agent {agent.name} listening on {host}:{port}" + (f" for {sites}" if sites else ""), file=sys.stderr)
+        async with server:
+            await stop.wait()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def coordinator_main(args):
+    targets = TargetSet(",".join(args.targets or [DEFAULT_TARGETS]))
+    coordinator = Coordinator(args.agent, args.token or os.environ.get(AGENT_TOKEN_ENV))
+    stream = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    writer = RecordWriter(stream, args.format)
+    cancel = CancelToken()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: cancel.cancel())
+    started = time.time()
+    try:
+        printers = asyncio.run(coordinator.scan(targets, args.protocols, writer.found, cancel=cancel))
+        writer.scan_done(printers, targets, args.protocols, started, agents=coordinator.stats())
+        if args.history:
+            HistoryStore(args.history, legacy=None).record_session(printers, started, protocols=args.protocols, targets=targets)
+    except ConnectionError as e:
+        print(f"printer_remote: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    if coordinator.unassigned:
+        print(f"printer_remote: no agent covers {coordinator.unassigned}", file=sys.stderr)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="printer_remote", description="Distributed printer discovery: site agents and a coordinator.")
+    parser.add_argument("--plugin", action="append", default=[], help="import this module to register extra scanners (repeatable)")
+    parser.add_argument("--token", help=f"shared secret between coordinator and agents (default: ${AGENT_TOKEN_ENV})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    agent = sub.add_parser("agent", help="run the local scanners for a coordinator")
+    agent.add_argument("--listen", default=f"127.0.0.1:{AGENT_PORT}", help="address:port to listen on (default: %(default)s)")
+    agent.add_argument("--name", help="agent name in the merged inventory (default: host name)")
+    agent.add_argument("--sites", action="append", help="ranges this agent can reach; requests outside them are not scanned")
+    agent.add_argument("--rate", type=int, default=SCAN_RATE_LIMIT, help="packets per second for all protocols (0 = unlimited)")
+    coordinate = sub.add_parser("coordinate", help="split the targets over agents and merge their results")
+    coordinate.add_argument("-a", "--agent", action="append", required=True, help="agent host:port (repeatable)")
+    coordinate.add_argument("-t", "--targets", action="append", help=f"CIDR, range or address (default: {DEFAULT_TARGETS})")
+    coordinate.add_argument("-p", "--protocols", default="network,snmp", help="comma separated protocols (default: %(default)s)")
+    coordinate.add_argument("-f", "--format", choices=("json", "ndjson"), default="json")
+    coordinate.add_argument("-o", "--output", help="write to this file instead of stdout")
+    coordinate.add_argument("--history", help="SQLite history store; the merged scan is recorded as one session")
+    args = parser.parse_args(argv)
+    try:
+        load_scanner_plugins(args.plugin)
+    except ImportError as e:
+        parser.error(f"cannot load scanner plugin: {e}")
+    try:
+        if args.command == "agent":
+            return agent_main(args)
+        args.protocols = [name.strip() for name in args.protocols.split(",") if name.strip()]
+        return coordinator_main(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    sys.exit(main())
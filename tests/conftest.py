@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# الاختبارات تعمل من جذر المستودع: python -m pytest -q
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+FAKE_HOSTS = 254
+FAKE_PRINTERS = 40
+FAKE_SNMP_PORT = 1161
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # ملفات SQLite الافتراضية تكتب في المجلد الحالي، فكل اختبار في مجلد مؤقت
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture(scope="session")
+def fake_network():
+    # نفس شبكة الطابعات الوهمية التي تبنيها benchmarks/bench_scanners.py على 127.0.3.x
+    from bench_scanners import FakePrinters
+    printers = FakePrinters(FAKE_HOSTS, FAKE_PRINTERS, FAKE_SNMP_PORT).start()
+    yield printers
+    printers.stop()
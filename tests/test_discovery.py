@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import runpy
+import types
+import socket
+import struct
+import asyncio
+import threading
+
+import pytest
+
+import printer_discovery
+
+from conftest import ROOT, FAKE_HOSTS, FAKE_PRINTERS
+from printer_discovery import (SCANNERS, Scanner, HistoryStore, TargetSet, USBPrinterRegistry, ScanScheduler, RTTEstimator, TCP_RTO_INITIAL,
+                               TCP_RTO_MIN, TCP_RTO_MAX, TCP_RETRIES, ber_decode_oid, ber_int, ber_oid, ber_read, ber_tlv,
+                               build_ipp_get_printer_attributes, build_snmp_get, dechunk_http_body, for_each_bounded, ipp_attribute,
+                               model_from_device_id, parse_ieee1284_id, parse_ipp_attributes, parse_pjl_id, parse_snmp_response, run_scan,
+                               wait_rtt)
+from printer_metrics import ScanMetrics, bind_metrics
+
+def test_scanner_base_is_abstract():
+    with pytest.raises(TypeError):
+        Scanner()
+    class Partial(Scanner):
+        name = "partial"
+    with pytest.raises(TypeError):
+        Partial()
+    for cls in SCANNERS.values():
+        assert cls(TargetSet("127.0.0.1")).scan
+
+def test_rto_floor_and_minimum_retry():
+    rtt = RTTEstimator(TCP_RTO_INITIAL, TCP_RTO_MIN, TCP_RTO_MAX, TCP_RETRIES)
+    for _ in range(50):
+        rtt.sample("10.0.0.5", 0.0005)
+    assert rtt.timeout("10.0.0.5") >= TCP_RTO_MIN
+    assert rtt.retries("10.0.0.5") >= 1
+
+def test_refusal_is_not_an_rtt_sample():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    rtt = RTTEstimator(TCP_RTO_INITIAL, TCP_RTO_MIN, TCP_RTO_MAX, TCP_RETRIES)
+    async def connect():
+        try:
+            await wait_rtt(asyncio.open_connection("127.0.0.1", port), rtt, "127.0.0.1")
+        except ConnectionRefusedError:
+            pass
+    asyncio.run(connect())
+    assert not rtt.sampled("127.0.0.1")
+
+def test_network_scan_recall(fake_network):
+    # المقدر يبقى مع المجدول بين عمليات البحث، فالبحث الثاني والثالث يجب ألا يفقدا طابعات بعد تعلم RTT
+    scheduler = ScanScheduler()
+    targets = TargetSet(f"127.0.3.1-127.0.3.{FAKE_HOSTS}")
+    try:
+        found = [len(run_scan(["network"], targets, force=True, scheduler=scheduler)) for _ in range(3)]
+    finally:
+        scheduler.shutdown()
+    assert found == [FAKE_PRINTERS] * 3
+
+def test_cache_load_is_scoped_to_targets():
+    from printer_discovery import DeviceCache, network_printer_record
+    cache = DeviceCache("cache.db")
+    usb = {"printer_name": "USB", "driver_name": "", "driver_id": "03f0:1234", "download_url": "", "type": "usb"}
+    cache.put_many([network_printer_record("10.0.0.5"), network_printer_record("10.0.1.5"), usb])
+    loaded = cache.load({"network", "usb"}, TargetSet("10.0.0.0/24"))
+    assert sorted(p["driver_id"] for p in loaded) == ["03f0:1234", "10.0.0.5"]
+    assert len(cache.load({"network"})) == 2
+
+def test_fresh_scope_returns_only_its_range():
+    from printer_discovery import DeviceCache, network_printer_record, sweep_scopes
+    cache = DeviceCache("cache.db")
+    a, b = TargetSet("10.0.0.0/24"), TargetSet("10.0.1.0/24")
+    cache.record_sweep("network", [network_printer_record("10.0.1.5")], 1, sweep_scopes(["network"], b)["network"], b)
+    cache.record_sweep("network", [network_printer_record("10.0.0.5")], 1, sweep_scopes(["network"], a)["network"], a)
+    cache.mark_swept(sweep_scopes(["network"], a)["network"])
+    assert [p["driver_id"] for p in run_scan(["network"], a, cache)] == ["10.0.0.5"]
+
+def test_run_scan_returns_when_discovery_fails(monkeypatch):
+    # الاكتشاف المعطوب لا يعلق البحث ولا يرجع إلى فحص كل الأهداف بلا تصفية
+    async def broken(*args, **kwargs):
+        raise OSError("no route to host")
+    monkeypatch.setattr(printer_discovery, "discover_live_hosts", broken)
+    metrics = ScanMetrics()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(run_scan(["network", "snmp"], TargetSet("127.0.3.1-127.0.3.4"), force=True,
+                                                                    metrics=metrics)), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert result == [[]]
+    assert metrics.snapshot()["errors"] == {"discovery:discovery.scan": 1}
+
+def test_bounded_task_errors_are_counted():
+    async def worker(item):
+        if item % 2:
+            raise ValueError(item)
+    metrics = ScanMetrics()
+    with bind_metrics(metrics, "test"):
+        asyncio.run(for_each_bounded(range(10), worker, limit=3))
+    assert metrics.snapshot()["errors"] == {"test:bounded.worker": 5}
+
+def snmp_response(request_id, varbinds):
+    pdu = ber_int(request_id) + ber_int(0) + ber_int(0) + ber_tlv(0x30, b"".join(ber_tlv(0x30, ber_oid(oid) + value)
+                                                                             for oid, value in varbinds))
+    return ber_tlv(0x30, ber_int(1) + ber_tlv(0x04, b"public") + ber_tlv(0xA2, pdu))
+
+def test_snmp_ber_round_trip():
+    long_name = "HP LaserJet Pro M404dn " * 10
+    data = snmp_response(-7, [("1.3.6.1.2.1.25.3.2.1.3.1", ber_tlv(0x04, long_name.encode() + b"\x00")),
+                              ("1.3.6.1.2.1.1.2.0", ber_oid("1.3.6.1.4.1.2435.2.3.9.1")),
+                              ("1.3.6.1.2.1.1.3.0", ber_tlv(0x43, (300000).to_bytes(3, "big"))),
+                              ("1.3.6.1.2.1.43.5.1.1.17.1", b"\x05\x00")])
+    request_id, status, index, values = parse_snmp_response(data)
+    assert (request_id, status, index) == (-7, 0, 0)
+    assert values == {"1.3.6.1.2.1.25.3.2.1.3.1": long_name.strip(), "1.3.6.1.2.1.1.2.0": "1.3.6.1.4.1.2435.2.3.9.1",
+                      "1.3.6.1.2.1.1.3.0": "300000"}
+    assert ber_decode_oid(ber_read(ber_oid("1.3.6.1.4.1.2435.2.3.9.1"), 0)[1]) == "1.3.6.1.4.1.2435.2.3.9.1"
+    request = build_snmp_get(42, ["1.3.6.1.2.1.1.1.0", "1.3.6.1.2.1.1.5.0"])
+    tag, message, end = ber_read(request, 0)
+    assert tag == 0x30 and end == len(request)
+    with pytest.raises(ValueError):
+        parse_snmp_response(request)
+
+def test_ieee1284_device_id():
+    device_id = "MANUFACTURER:Hewlett-Packard;COMMAND SET:PJL,PCL;MODEL:HP LaserJet 1020;SN:CNB1234567;MDL:ignored;"
+    assert parse_ieee1284_id(device_id) == {"MFG": "Hewlett-Packard", "CMD": "PJL,PCL", "MDL": "HP LaserJet 1020", "SN": "CNB1234567"}
+    assert model_from_device_id("MFG:Brother;MDL:HL-2270DW;") == "Brother HL-2270DW"
+    assert model_from_device_id("MFG:HP;MDL:HP LaserJet 1020;") == "HP LaserJet 1020"
+    assert model_from_device_id("MFG:Canon;CMD:CAPT;") is None
+    assert parse_ieee1284_id(None) == {}
+
+def test_pjl_and_ipp_parsers():
+    assert parse_pjl_id(b'@PJL INFO ID\r\n"HP LaserJet 4250"\r\n\x0c') == "HP LaserJet 4250"
+    assert parse_pjl_id(b"@PJL INFO ID\r\n\x0c") is None
+    response = (struct.pack(">BBHI", 1, 1, 0, 1) + b"\x01" + ipp_attribute(0x47, b"attributes-charset", b"utf-8") + b"\x04"
+                + ipp_attribute(0x41, b"printer-make-and-model", b"Brother HL-L2340D series")
+                + ipp_attribute(0x41, b"", b"second value is ignored")
+                + ipp_attribute(0x41, b"printer-device-id", b"MFG:Brother;MDL:HL-L2340D series;") + b"\x03")
+    assert parse_ipp_attributes(response) == {"attributes-charset": "utf-8", "printer-make-and-model": "Brother HL-L2340D series",
+                                              "printer-device-id": "MFG:Brother;MDL:HL-L2340D series;"}
+    assert parse_ipp_attributes(response[:40]) == {"attributes-charset": "utf-8"}
+    assert build_ipp_get_printer_attributes("ipp://10.0.0.5/ipp/print").endswith(b"\x03")
+    assert dechunk_http_body(b"5\r\nhello\r\n6;x=1\r\n world\r\n0\r\n\r\n") == b"hello world"
+
+def test_target_set_parsing():
+    assert list(TargetSet("192.168.1.0/30")) == ["192.168.1.1", "192.168.1.2"]
+    assert list(TargetSet("192.168.1.7/32")) == ["192.168.1.7"]
+    assert TargetSet("10.0.0.8-10.0.0.5").ranges == TargetSet("10.0.0.5-8").ranges
+    targets = TargetSet("10.0.0.1-5, 10.0.0.4-9;10.0.0.20")
+    assert len(targets) == 10 and len(targets.ranges) == 2
+    assert "10.0.0.9" in targets and "10.0.0.10" not in targets and "printer.local" not in targets
+    for spec in ("", " , ", "10.0.0.0/8", "10.0.0.300"):
+        with pytest.raises(ValueError):
+            TargetSet(spec)
+
+def test_target_set_algebra():
+    a, b = TargetSet("10.0.0.1-100"), TargetSet("10.0.0.50-150")
+    assert list(a.intersection(b)) == [f"10.0.0.{n}" for n in range(50, 101)]
+    assert str(a.difference(b)) == "10.0.0.1-10.0.0.49"
+    assert a.difference(TargetSet("10.0.0.0/24")) is None
+    assert TargetSet.from_ranges([]) is None
+    parts = [str(part) for part in TargetSet("10.0.0.250-10.0.1.5").subnets(24)]
+    assert parts == ["10.0.0.250-10.0.0.255", "10.0.1.0-10.0.1.5"]
+
+def test_history_store():
+    history = HistoryStore("history.db", legacy=None)
+    a = {"type": "network", "driver_id": "10.0.0.5", "printer_name": "HP", "driver_name": "Generic"}
+    b = {"type": "snmp", "driver_id": "10.0.0.6", "printer_name": "Brother", "driver_name": "Generic"}
+    assert history.record_session([a, b, a], 100, 101, ("network", "snmp"), TargetSet("10.0.0.0/24"))
+    assert history.record_session([a], 200, 201)
+    assert history.count() == 2 and history.count(since=150) == 1
+    assert [row[0] for row in history.page()] == ["network:10.0.0.5", "snmp:10.0.0.6"]
+    assert history.page(limit=1, offset=1)[0][4] == 1
+    assert [seen for seen, _, _ in history.device_history("network:10.0.0.5")] == [101, 201]
+    # المراقبة: لا جلسة إن لم يتغير شيء ولم تمض مدة التحديث
+    assert history.record_session([a], 300, 301, changed_only=True, refresh=1000) is None
+    assert history.record_session([dict(a, printer_name="HP LaserJet")], 400, 401, changed_only=True, refresh=1000)
+    assert len(list(history.iter_sightings(batch=1))) == 4
+    assert [key for _, key, _ in history.iter_sightings(since=300)] == ["network:10.0.0.5"]
+
+def test_headless_entry_point_needs_no_qt(monkeypatch, capsys):
+    # PyQt5 غير موجود: --headless يجب أن يعمل قبل أي استيراد من Qt
+    monkeypatch.setitem(sys.modules, "PyQt5", None)
+    monkeypatch.setattr(sys, "argv", ["printer_driver_finder.py", "--headless", "-p", "network", "-t", "127.0.0.1", "-f", "ndjson"])
+    with pytest.raises(SystemExit) as exit:
+        runpy.run_path(os.path.join(ROOT, "printer_driver_finder.py"), run_name="__main__")
+    assert exit.value.code == 0
+
+class FakeUSBPrinter(list):
+    # جهاز pyusb بإعداد واحد وواجهة طابعة واحدة؛ transfers يعد طلبات GET_DEVICE_ID
+    def __init__(self, n):
+        super().__init__([[types.SimpleNamespace(bInterfaceClass=7, bInterfaceNumber=0, bAlternateSetting=0)]])
+        self.idVendor, self.idProduct, self.bus, self.address = 0x03f0, 0x2b17 + n, 1, n + 2
+        self.iManufacturer = self.iProduct = self.iSerialNumber = 0
+        self.device_id = f"MFG:HP;MDL:LaserJet 10{n}0;SN:USB{n:06d};".encode()
+        self.transfers = 0
+
+    def ctrl_transfer(self, request_type, request, value, index, length, timeout=None):
+        self.transfers += 1
+        return bytes([0, len(self.device_id) + 2]) + self.device_id
+
+def test_usb_registry_reads_each_device_once(monkeypatch):
+    devices = [FakeUSBPrinter(n) for n in range(3)]
+    usb = types.ModuleType("usb")
+    usb.core = types.ModuleType("usb.core")
+    usb.core.find = lambda find_all=False, **kw: list(devices)
+    monkeypatch.setitem(sys.modules, "usb", usb)
+    monkeypatch.setitem(sys.modules, "usb.core", usb.core)
+    monkeypatch.setitem(sys.modules, "pyudev", None)
+    registry = USBPrinterRegistry()
+    assert sorted(p["model"] for p in registry.find()) == ["HP LaserJet 1000", "HP LaserJet 1010", "HP LaserJet 1020"]
+    devices.append(FakeUSBPrinter(3))
+    # بدون udev يعاد التعداد عند كل بحث فقط: الجهاز الجديد يظهر، والمعروفة لا يرسل لها أي طلب
+    assert len(registry.find()) == 4
+    assert [device.transfers for device in devices] == [1, 1, 1, 1]
+    assert not any(thread.name == "usb-hotplug" for thread in threading.enumerate())
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import random
+
+import pytest
+
+from bench_device_merge import make_records
+from conftest import FAKE_HOSTS, FAKE_PRINTERS
+from printer_discovery import TargetSet, DeviceCache, ScanScheduler, ScanMonitor, RecordWriter, device_key
+from printer_inventory import ChangeTracker, merge_devices, source_key
+from printer_export import EXPORT_FORMATS, InventoryWriter, export_cache, export_records, import_inventory, line_records, read_inventory
+
+def unique_records(n=300):
+    records, _ = make_records(n, random.Random(7))
+    return {device_key(p): p for p in records}
+
+@pytest.mark.parametrize("fmt", EXPORT_FORMATS)
+def test_cache_round_trip(fmt):
+    if fmt in ("parquet", "arrow"):
+        pytest.importorskip("pyarrow")
+    records = unique_records()
+    cache = DeviceCache("cache.db")
+    cache.put_many(list(records.values()))
+    path = "inventory." + fmt
+    assert export_cache(cache, path) == len(records)
+    target = DeviceCache("imported.db")
+    tracker = ChangeTracker("snapshot.db")
+    assert import_inventory(path, target, tracker, batch=64) == len(records)
+    assert {device_key(p): p for p in target.load()} == records
+    assert sorted(map(device_key, tracker.baseline().values())) == sorted(records)
+
+def test_writer_base_is_abstract():
+    with pytest.raises(TypeError):
+        InventoryWriter("inventory.out")
+
+def test_cmdb_csv_without_record_column():
+    with open("cmdb.csv", "w", encoding="utf-8", newline="") as f:
+        f.write("driver_id,model,serial\n10.0.0.7,HP LaserJet Pro M404dn,SN1\n,orphan row,SN2\n")
+    [records] = list(read_inventory("cmdb.csv"))
+    assert records == [{"driver_id": "10.0.0.7", "model": "HP LaserJet Pro M404dn", "serial": "SN1", "type": "network",
+                        "printer_name": "HP LaserJet Pro M404dn", "driver_name": "", "download_url": ""}]
+
+def test_merged_devices_keep_full_sources():
+    records = list(unique_records(50).values())
+    devices = merge_devices(records)
+    sources = [p for device in devices for p in device["sources"]]
+    assert sorted(map(source_key, sources)) == sorted(map(source_key, records))
+    assert all(p in records for p in sources)
+
+def test_monitor_line_imports_updated_devices():
+    records = list(unique_records(50).values())
+    line = {"time": 1.0, "updated": merge_devices(records), "removed": ["ip:10.0.0.1"], "changes": []}
+    assert sorted(map(source_key, line_records(json.loads(json.dumps(line))))) == sorted(map(source_key, records))
+    assert line_records({"removed": "ip:10.0.0.1", "time": 1.0}) == []
+    assert line_records({"change": "appeared", "key": "ip:10.0.0.1"}) == []
+
+@pytest.mark.parametrize("fmt", ("json", "ndjson"))
+def test_monitor_output_round_trip(fake_network, fmt):
+    # مخرجات --monitor بصيغتيها تستورد كما هي: كل سجل رأته المراقبة يعود إلى المخزن
+    stream = io.StringIO()
+    writer = RecordWriter(stream, fmt, compact=True)
+    exported = []
+    def on_sweep(sweep):
+        writer.sweep_done(sweep)
+        exported.extend(p for device in sweep["updated"] for p in device["sources"])
+    scheduler = ScanScheduler()
+    monitor = ScanMonitor(["network"], TargetSet(f"127.0.3.1-127.0.3.{FAKE_HOSTS}"), 0, scheduler=scheduler, prefix=26,
+                          on_sweep=on_sweep)
+    try:
+        for index in range(len(monitor.parts)):
+            monitor.sweep(index)
+    finally:
+        scheduler.shutdown()
+    seen = {source_key(p): p for records in monitor.records for p in records.values()}
+    assert len(seen) == FAKE_PRINTERS
+    assert {source_key(p): p for p in exported} == seen
+    with open("monitor.ndjson", "w", encoding="utf-8") as f:
+        f.write(stream.getvalue())
+    cache = DeviceCache("imported.db")
+    assert import_inventory("monitor.ndjson", cache) == FAKE_PRINTERS
+    assert {source_key(p): p for p in cache.load()} == seen
+    assert export_records(exported, "monitor.csv") == FAKE_PRINTERS
+
+def test_indented_json_scan_documents_import():
+    # مخرجات -f json العادية: مستند مفهرس لكل فحص، وعدة فحوص متتالية في نفس الملف
+    records = list(unique_records(40).values())
+    with open("scan.json", "w", encoding="utf-8") as f:
+        writer = RecordWriter(f, "json")
+        writer.scan_done(records[:25], TargetSet("10.0.0.0/24"), ["network", "snmp"], 1.0)
+        writer.scan_done(records[25:], TargetSet("10.0.0.0/24"), ["network", "snmp"], 2.0)
+    cache = DeviceCache("imported.db")
+    assert import_inventory("scan.json", cache) == len(records)
+    assert {device_key(p) for p in cache.load()} == {device_key(p) for p in records}
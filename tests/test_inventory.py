@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import random
+
+from bench_device_merge import make_records
+from printer_models import model_matcher
+from printer_inventory import (ChangeTracker, DeviceResolver, SnapshotDiff, clean_serial, device_serial, identity_key, merge_devices,
+                               summarize_changes)
+
+def printer(type_, ip, name, **fields):
+    return dict({"type": type_, "driver_id": ip, "printer_name": name, "model": name, "driver_name": "Generic", "download_url": ""},
+                **fields)
+
+def kinds(changes):
+    return sorted((change["change"], change["key"]) for change in changes)
+
+def test_serial_sources():
+    assert clean_serial(" vnb 3k12345 ") == "VNB3K12345"
+    assert clean_serial("0000000") is None
+    assert clean_serial("???") is None
+    assert device_serial({"device_id": "MFG:HP;MDL:LaserJet 1020;SN:CNB1234567;"}) == "CNB1234567"
+    assert identity_key(printer("snmp", "10.0.0.5", "HP LaserJet Pro M404dn", serial="PHB1234")) == "snmp/serial:PHB1234"
+    assert identity_key(printer("network", "10.0.0.5", "x", mac="00:11:22:AA:BB:CC")) == "network/mac:00:11:22:aa:bb:cc"
+    assert identity_key(printer("network", "10.0.0.5", "x")) == "network/address:10.0.0.5"
+
+def test_snapshot_diff_matches_by_identity():
+    old = printer("snmp", "10.0.0.5", "HP LaserJet Pro M404dn", serial="PHB1234")
+    diff = SnapshotDiff({identity_key(old): old})
+    moved = printer("snmp", "10.0.0.9", "HP LaserJet Pro M404dn", serial="PHB1234")
+    changes, current, taken = diff.compare([moved])
+    assert kinds(changes) == [("ip_changed", "snmp/serial:PHB1234")]
+    assert changes[0]["before"] == "10.0.0.5" and changes[0]["after"] == "10.0.0.9"
+    # عنوان أعيد توزيعه لجهاز برقم تسلسلي آخر: جهاز جديد واختفاء القديم، لا تغيير عنوان
+    other = printer("snmp", "10.0.0.5", "Brother HL-L2340D", serial="U63A000111")
+    assert kinds(diff.compare([other])[0]) == [("appeared", "snmp/serial:U63A000111"), ("disappeared", "snmp/serial:PHB1234")]
+
+def test_change_tracker_update_and_scope():
+    tracker = ChangeTracker("snapshot.db")
+    a = printer("snmp", "10.0.0.5", "HP LaserJet Pro M404dn", serial="PHB1234")
+    b = printer("snmp", "10.0.1.7", "Kyocera ECOSYS P2135dn", serial="LV91000042")
+    assert summarize_changes(tracker.update("snmp", [a, b]))["appeared"] == 2
+    assert tracker.update("snmp", [a, b]) == [] and tracker.written == 0
+    swapped = printer("snmp", "10.0.0.5", "HP Color LaserJet Pro M454dn", serial="PHB1234")
+    assert kinds(tracker.update("snmp", [swapped], targets={"10.0.0.5"})) == [("model_changed", "snmp/serial:PHB1234")]
+    # b خارج النطاق المفحوص فلا يعد مختفياً، ويبقى في اللقطة بعد إعادة فتحها
+    reopened = ChangeTracker("snapshot.db")
+    assert sorted(reopened.baseline()) == ["snmp/serial:LV91000042", "snmp/serial:PHB1234"]
+    assert kinds(reopened.update("snmp", [])) == [("disappeared", "snmp/serial:LV91000042"), ("disappeared", "snmp/serial:PHB1234")]
+    assert [change["change"] for change in reopened.history(key="snmp/serial:PHB1234")] == ["disappeared", "model_changed", "appeared"]
+
+def test_change_tracker_seed_is_a_silent_baseline():
+    tracker = ChangeTracker("snapshot.db")
+    a = printer("network", "10.0.0.5", "Network Printer (10.0.0.5)", mac="00:11:22:33:44:55")
+    assert tracker.seed([a]) == 1
+    assert tracker.history() == []
+    assert tracker.update("network", [a]) == []
+
+def test_resolver_merges_protocols_of_one_printer():
+    records = [printer("network", "10.0.0.5", "Network Printer (10.0.0.5)", mac="00:11:22:33:44:55"),
+               printer("snmp", "10.0.0.5", "HEWLETT-PACKARD HP LaserJet Pro M404n", serial="PHB1234"),
+               printer("mdns", "10.0.0.5", "HP LaserJet Pro M404dn"),
+               printer("usb", "03f0:2b17", "HP LaserJet Pro M404dn", serial="PHB1234")]
+    [device] = merge_devices(records)
+    assert device["type"] == "network" and device["driver_id"] == "10.0.0.5"
+    assert device["printer_name"] == "HP LaserJet Pro M404dn" and device["provenance"]["printer_name"] == "mdns"
+    assert device["entity"] == "serial:PHB1234"
+    assert sorted(p["type"] for p in device["sources"]) == ["mdns", "network", "snmp", "usb"]
+
+def test_resolver_keeps_conflicting_models_apart():
+    records = [printer("snmp", "10.0.0.5", "HP LaserJet Pro M404dn", serial="PHB1234"),
+               printer("mdns", "10.0.0.5", "Brother HL-L2340D")]
+    assert len(merge_devices(records)) == 2
+
+def test_resolver_incremental_add_reports_merged_keys():
+    resolver = DeviceResolver()
+    first, removed = resolver.add(printer("network", "10.0.0.5", "Network Printer (10.0.0.5)"))
+    assert first["entity"] == "ip:10.0.0.5" and removed == []
+    device, removed = resolver.add(printer("snmp", "10.0.0.5", "HP LaserJet Pro M404dn", serial="PHB1234"))
+    assert device["entity"] == "serial:PHB1234" and removed == ["ip:10.0.0.5"]
+    assert resolver.is_live("serial:PHB1234") and not resolver.is_live("ip:10.0.0.5")
+
+def test_merge_never_mixes_printers():
+    records, truth = make_records(2000, random.Random(3))
+    owner = {(p["type"], p["driver_id"]): t for p, t in zip(records, truth)}
+    devices = merge_devices(records)
+    assert all(len({owner[(p["type"], p["driver_id"])] for p in device["sources"]}) == 1 for device in devices)
+    assert len(set(truth)) <= len(devices) <= len(set(truth)) * 1.02
+
+def test_model_signature_groups():
+    matcher = model_matcher()
+    assert matcher.signature("HEWLETT-PACKARD HP LaserJet Pro M404n").key == matcher.signature("hp LJ Pro M404dw").key
+    names = ["HP LaserJet Pro M404dn", "HEWLETT-PACKARD HP LaserJet Pro M404n", "hp LJ Pro M404dw", "Brother HL-L2340D series",
+             "Network Printer (10.0.0.1)", "Xerox Phaser 3020", "Epson WorkForce 3020"]
+    groups = {group["model"]: group["count"] for group in matcher.group([{"model": name} for name in names])}
+    assert groups == {"HP LaserJet Pro M404n": 3, "Brother HL L2340D": 1, "Network Printer (10.0.0.1)": 1, "Xerox Phaser 3020": 1,
+                      "Epson WorkForce 3020": 1}
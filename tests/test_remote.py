@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from conftest import FAKE_HOSTS, FAKE_PRINTERS
+from printer_discovery import TargetSet
+from printer_remote import ScanAgent, Coordinator, assign_targets, AgentLink
+
+async def serve_agents(agents):
+    servers = [await agent.serve("127.0.0.1", 0) for agent in agents]
+    return servers, [server.sockets[0].getsockname()[:2] for server in servers]
+
+def test_assign_targets_follows_sites():
+    near, far, anywhere = AgentLink(("10.0.0.1", 1)), AgentLink(("10.0.0.2", 1)), AgentLink(("10.0.0.3", 1))
+    near.sites, far.sites = TargetSet("10.1.0.0/16"), TargetSet("10.2.0.0/16")
+    plan, unassigned = assign_targets(TargetSet("10.1.5.0/24,10.2.7.0/24,10.3.0.1-10"), [near, far, anywhere])
+    assert str(plan[near]) == "10.1.5.1-10.1.5.254" and str(plan[far]) == "10.2.7.1-10.2.7.254"
+    assert str(plan[anywhere]) == "10.3.0.1-10.3.0.10" and unassigned is None
+    plan, unassigned = assign_targets(TargetSet("10.3.0.1-10"), [near, far])
+    assert str(unassigned) == "10.3.0.1-10.3.0.10"
+
+def test_agents_with_the_same_name_stay_apart(fake_network):
+    # الاسم الافتراضي هو اسم الجهاز: وكيلان بنفس الاسم يجب ألا تنسب سجلات أحدهما للآخر
+    async def main():
+        servers, addresses = await serve_agents([ScanAgent("printhost"), ScanAgent("printhost")])
+        coordinator = Coordinator(addresses)
+        try:
+            printers = await coordinator.scan(TargetSet(f"127.0.3.1-127.0.3.{FAKE_HOSTS}"), ["network"])
+        finally:
+            for server in servers:
+                server.close()
+        return coordinator, addresses, printers
+    coordinator, addresses, printers = asyncio.run(main())
+    names = [f"printhost@{host}:{port}" for host, port in addresses]
+    assert len(printers) == FAKE_PRINTERS
+    assert {p["agent"] for p in printers} == set(names)
+    assert sorted(stats["agent"] for stats in coordinator.stats()) == sorted(names)
+    assert sum(stats["found"] for stats in coordinator.stats()) == FAKE_PRINTERS